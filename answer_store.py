@@ -0,0 +1,266 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Optional, Callable
+from lexical_index import normalize
+from embedding_cache import content_hash
+from domain_questions import all_questions
+from latency_budget import UNLIMITED_BUDGET_MS
+
+DEFAULT_ANSWER_STORE = "./answer_store.sqlite3"
+
+# Ruta reportada en las respuestas servidas desde el store
+PRECOMPUTED = "precomputed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    question TEXT NOT NULL,
+    question_type TEXT,
+    response TEXT NOT NULL,
+    chunks TEXT NOT NULL,
+    index_version TEXT,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def question_key(question: str, collection: str) -> str:
+    """Clave de búsqueda: colección + pregunta normalizada (sin tildes, signos ni mayúsculas)"""
+    words = re.findall(r"[a-z0-9#+.]+", normalize(question))
+    return f"{collection}\x1f{' '.join(word.strip('.') for word in words)}"
+
+
+class AnswerStore:
+    def __init__(self, path: str = DEFAULT_ANSWER_STORE):
+        """Respuestas precalculadas de las preguntas más frecuentes, con los chunks que las originaron
+
+        Cada entrada guarda id y hash del texto de sus chunks de origen: si una reconstrucción
+        del índice cambia o elimina alguno, la entrada deja de servirse y se borra. El archivo se
+        abre recién cuando existe (lo crea el job offline), así que el servidor puede arrancar antes.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["AnswerStore"]:
+        """Store configurado en CODEHELPER_ANSWER_STORE (None solo si se desactiva con "0")"""
+        path = os.environ.get("CODEHELPER_ANSWER_STORE", DEFAULT_ANSWER_STORE)
+        if path == "0":
+            return None
+        return cls(path)
+
+    def _connection(self, create: bool = False) -> Optional[sqlite3.Connection]:
+        """Conexión abierta a demanda (llamar con el lock tomado); None si el archivo no existe"""
+        if self._conn is None:
+            if not create and not os.path.exists(self.path):
+                return None
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+        return self._conn
+
+    def put(self, question: str, collection: str, result: Dict[str, Any], index_version: str = None):
+        chunks = [
+            {"id": chunk["id"], "score": float(chunk["score"]), "content_hash": content_hash(chunk["content"])}
+            for chunk in result["chunks"]
+        ]
+        with self._lock:
+            conn = self._connection(create=True)
+            conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (question_key(question, collection), collection, question, result.get("question_type"),
+                 result["response"], json.dumps(chunks, separators=(",", ":")), index_version, time.time())
+            )
+            conn.commit()
+
+    def get(self, question: str, collection: str, get_collection: Callable) -> Optional[Dict[str, Any]]:
+        """Respuesta vigente para la pregunta o None
+
+        Valida el hash del texto de los chunks de origen contra la colección actual; las
+        entradas desactualizadas se borran en el momento.
+        """
+        key = question_key(question, collection)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT question_type, response, chunks FROM answers WHERE key = ?", (key,)
+            ).fetchone() if conn is not None else None
+        if row is None:
+            self._count(misses=1)
+            return None
+
+        question_type, response, chunks = row[0], row[1], json.loads(row[2])
+        current = self.current_chunks(get_collection(collection), [chunk["id"] for chunk in chunks])
+        if self.changed(chunks, current):
+            self.delete([key])
+            self._count(misses=1, stale=1)
+            return None
+
+        self._count(hits=1)
+        return {
+            "response": response,
+            "question_type": question_type,
+            "chunks": [
+                {"id": chunk["id"], "content": current[chunk["id"]][0],
+                 "score": chunk["score"], "metadata": current[chunk["id"]][1]}
+                for chunk in chunks
+            ]
+        }
+
+    @staticmethod
+    def changed(chunks: List[Dict[str, Any]], current: Dict[str, tuple]) -> bool:
+        """Algún chunk de origen desapareció o su texto actual ya no tiene el hash guardado
+        (se hashea el documento, no la metadata: los índices viejos no tienen content_hash)"""
+        return any(
+            chunk["id"] not in current or content_hash(current[chunk["id"]][0] or "") != chunk["content_hash"]
+            for chunk in chunks
+        )
+
+    @staticmethod
+    def current_chunks(collection, ids: List[str]) -> Dict[str, tuple]:
+        if not ids:
+            return {}
+        fetched = collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            chunk_id: (document, metadata or {})
+            for chunk_id, document, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+        }
+
+    def delete(self, keys: List[str]):
+        with self._lock:
+            conn = self._connection()
+            if conn is None or not keys:
+                return
+            conn.executemany("DELETE FROM answers WHERE key = ?", [(key,) for key in keys])
+            conn.commit()
+
+    def purge_stale(self, get_collection: Callable) -> int:
+        """Borrar las entradas cuyos chunks cambiaron (llamar tras reconstruir o cambiar el índice)"""
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute("SELECT key, collection, chunks FROM answers").fetchall() if conn is not None else []
+
+        stale = []
+        by_collection: Dict[str, list] = {}
+        for key, collection, chunks in rows:
+            by_collection.setdefault(collection, []).append((key, json.loads(chunks)))
+        for collection, entries in by_collection.items():
+            try:
+                target = get_collection(collection)
+            except Exception:
+                # La colección ya no existe en el índice nuevo (ValueError del IndexManager
+                # o el error propio de ChromaDB según la versión)
+                stale.extend(key for key, _ in entries)
+                continue
+            ids = sorted({chunk["id"] for _, chunks in entries for chunk in chunks})
+            current = self.current_chunks(target, ids)
+            for key, chunks in entries:
+                if self.changed(chunks, current):
+                    stale.append(key)
+
+        self.delete(stale)
+        self._count(stale=len(stale))
+        return len(stale)
+
+    def _count(self, hits: int = 0, misses: int = 0, stale: int = 0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.stale += stale
+
+    def __len__(self) -> int:
+        with self._lock:
+            conn = self._connection()
+            return conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] if conn is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_removed": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+def curated_questions() -> List[str]:
+    """Preguntas por tema de domain_questions.py (representativas del tráfico real)"""
+    return all_questions()
+
+
+def mine_questions(path: str, top: int) -> List[str]:
+    """Preguntas más frecuentes de un log: texto (una por línea), el log de consultas del
+    servidor (query_log.py) o JSONL con 'query'/'message'"""
+    counts: Counter = Counter()
+    originals: Dict[str, str] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                # Del log del servidor solo interesan las preguntas de /chat
+                if record.get("k", "chat") != "chat":
+                    continue
+                line = record.get("q") or record.get("query") or record.get("message") or ""
+            if line:
+                key = question_key(line, "")
+                counts[key] += 1
+                originals.setdefault(key, line)
+    return [originals[key] for key, _ in counts.most_common(top)]
+
+
+def build_answers(chatbot, store: AnswerStore, questions: Iterable[str], collection: str = None) -> Dict[str, int]:
+    """Correr el pipeline completo para cada pregunta y guardar las respuestas con sus chunks"""
+    collection = collection or chatbot.index_manager.default_collection
+    report = {"stored": 0, "skipped": 0}
+    for question in questions:
+        # Sin presupuesto de latencia: lo que se precalcula debe ser la respuesta completa
+        result = chatbot.chat_detailed(question, collection=collection, use_answer_store=False,
+                                       latency_budget_ms=UNLIMITED_BUDGET_MS)
+        # Las respuestas fijas del router, las que no encontraron contexto y las degradadas
+        # (sin re-ranking, generación o traducción) no se guardan
+        if not result["chunks"] or result["degradations"]:
+            report["skipped"] += 1
+            continue
+        store.put(question, collection, result, chatbot.index_version)
+        report["stored"] += 1
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcular respuestas de las preguntas más frecuentes")
+    parser.add_argument("--store", default=os.environ.get("CODEHELPER_ANSWER_STORE", DEFAULT_ANSWER_STORE))
+    parser.add_argument("--log", help="Log de consultas del que extraer las más frecuentes")
+    parser.add_argument("--top", type=int, default=300, help="Preguntas a tomar del log")
+    parser.add_argument("--no-curated", action="store_true", help="No incluir las preguntas por tema")
+    parser.add_argument("--collection")
+    args = parser.parse_args()
+
+    from rag_chatbot import RAGChatbot
+
+    questions = [] if args.no_curated else curated_questions()
+    if args.log:
+        questions += mine_questions(args.log, args.top)
+
+    chatbot = RAGChatbot()
+    store = AnswerStore(args.store)
+    removed = store.purge_stale(lambda name: chatbot.index_manager.get(name).collection)
+    start = time.perf_counter()
+    report = build_answers(chatbot, store, questions, args.collection)
+    print(f"✅ {report['stored']} respuestas guardadas en {args.store} "
+          f"({report['skipped']} sin contexto o degradadas, {removed} desactualizadas borradas) "
+          f"en {time.perf_counter() - start:.1f} s")
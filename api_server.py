@@ -4,11 +4,14 @@ Servidor API para CodeHelperNET
 Expone el chatbot RAG como una API REST
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, stream_with_context
 from flask_cors import CORS
 import sys
 import os
+import time
+import hmac
 import logging
+import threading
 from datetime import datetime
 
 # Agregar el directorio actual al path para importar módulos
@@ -16,6 +19,10 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Importar el chatbot
 from rag_chatbot import RAGChatbot
+from request_profiler import RequestProfiler
+from warmup import warm_up
+from wire_format import encode_payload, choose_encoding, compress, MIN_COMPRESS_BYTES
+from query_log import QueryLog
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +34,24 @@ CORS(app)  # Habilitar CORS para el frontend
 # Inicializar el chatbot
 chatbot = None
 
+RESPONSE_SHAPES = ('text', 'ids', 'full')
+
+# Límites de /search: consultas por petición y consultas por bloque en streaming
+SEARCH_MAX_QUERIES = int(os.environ.get('CODEHELPER_SEARCH_MAX_QUERIES', 64))
+SEARCH_MAX_TOP_K = 50
+SEARCH_STREAM_BATCH = 8
+
+# Readiness: el chatbot solo recibe tráfico después del warm-up
+chatbot_ready = False
+warmup_report = None
+first_request_ms = None
+
+# Perfilado opcional (CODEHELPER_PROFILE_EVERY o /admin/profiling)
+profiler = RequestProfiler()
+
+# Log de consultas muestreado para reproducir tráfico real (CODEHELPER_QUERY_LOG)
+query_log = QueryLog.from_env()
+
 def initialize_chatbot():
     """Inicializar el chatbot RAG"""
     global chatbot
@@ -39,22 +64,165 @@ def initialize_chatbot():
         logger.error(f"Error inicializando chatbot: {e}")
         return False
 
+def run_warmup():
+    """Calentar todas las etapas y luego marcar el servidor como listo"""
+    global chatbot_ready, warmup_report
+    try:
+        logger.info("Warm-up: ejecutando consultas representativas...")
+        warmup_report = warm_up(chatbot)
+        logger.info(f"Warm-up completado en {warmup_report['warmup_ms']:.0f} ms "
+                    f"(etapas: {warmup_report['stages_ms']})")
+    except Exception as e:
+        # Un warm-up fallido no debe dejar el servidor fuera de servicio
+        logger.error(f"Error en el warm-up: {e}")
+    finally:
+        chatbot_ready = True
+
+def start_warmup():
+    """Warm-up en segundo plano (CODEHELPER_WARMUP=0 lo desactiva)"""
+    global chatbot_ready
+    if os.environ.get('CODEHELPER_WARMUP', '1') == '0':
+        chatbot_ready = True
+        return
+    threading.Thread(target=run_warmup, daemon=True).start()
+
+def respond(payload) -> Response:
+    """Respuesta en JSON compacto o MessagePack según el header Accept"""
+    body, mimetype = encode_payload(payload, request.headers.get('Accept', ''))
+    return Response(body, mimetype=mimetype)
+
+@app.after_request
+def compress_response(response):
+    """Comprimir con brotli o gzip según Accept-Encoding (respuestas grandes, no streaming)"""
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.content_length is None or response.content_length < MIN_COMPRESS_BYTES):
+        return response
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding != 'identity':
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def chunk_view(chunk, shape: str):
+    """Chunk en la forma pedida: 'ids' (id, score y hash), 'refs' (además título y archivo)
+    o 'full' (además el texto)"""
+    metadata = chunk.get('metadata') or {}
+    view = {
+        'id': chunk['id'],
+        'score': float(chunk['score']),
+        'content_hash': metadata.get('content_hash')
+    }
+    if shape in ('refs', 'full'):
+        view.update({
+            'title': metadata.get('title'),
+            'file': metadata.get('file')
+        })
+    if shape == 'full':
+        view['content'] = chunk['content']
+    return view
+
+def parse_flag(data, field: str, default: bool) -> bool:
+    """Booleano de JSON (también "true"/"false" en texto); cualquier otro valor es un error"""
+    value = data.get(field, default)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    raise ValueError(f'"{field}" debe ser true o false')
+
+def parse_search_options(data) -> dict:
+    """Validar las opciones de /search (ValueError con el mensaje para el cliente)"""
+    queries = data.get('queries')
+    if queries is None and data.get('query'):
+        queries = [data['query']]
+    if not isinstance(queries, list) or not queries or \
+            not all(isinstance(query, str) and query.strip() for query in queries):
+        raise ValueError('Debes enviar "query" o una lista no vacía de textos en "queries"')
+    if len(queries) > SEARCH_MAX_QUERIES:
+        raise ValueError(f'Máximo {SEARCH_MAX_QUERIES} consultas por petición')
+
+    try:
+        top_k = int(data.get('top_k', 5))
+        threshold = data.get('threshold')
+        threshold = float(threshold) if threshold is not None else None
+    except (TypeError, ValueError):
+        raise ValueError('"top_k" y "threshold" deben ser numéricos')
+    if not 1 <= top_k <= SEARCH_MAX_TOP_K:
+        raise ValueError(f'"top_k" debe estar entre 1 y {SEARCH_MAX_TOP_K}')
+
+    where = data.get('where')
+    if where is not None and not isinstance(where, dict):
+        raise ValueError('"where" debe ser un filtro de metadatos de ChromaDB, p. ej. {"file": "linq.txt"}')
+
+    return {
+        'queries': [query.strip() for query in queries],
+        'top_k': top_k,
+        'where': where,
+        'rerank': parse_flag(data, 'rerank', True),
+        'threshold': threshold,
+        'collection': data.get('collection'),
+        'include_content': parse_flag(data, 'include_content', False),
+        'stream': parse_flag(data, 'stream', False)
+    }
+
+def invalid_where(error: ValueError) -> dict:
+    return {
+        'error': 'Opciones de búsqueda inválidas',
+        'message': f'"where" no es un filtro válido de ChromaDB: {error}'
+    }
+
+def overloaded_response():
+    """503 cuando el limitador de concurrencia no admitió la petición a tiempo"""
+    response = respond({
+        'error': 'Servidor saturado',
+        'message': 'Hay demasiadas peticiones en curso, intenta de nuevo en unos segundos.'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(chatbot.runtime.admit_timeout_s)))
+    return response
+
+def admin_authorized() -> bool:
+    """Validar el token de administración; sin ADMIN_TOKEN configurado los endpoints quedan cerrados"""
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode('utf-8'), token.encode('utf-8'))
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Endpoint de salud del servidor"""
-    return jsonify({
+    """Endpoint de salud del servidor (liveness: 200 también durante el warm-up)"""
+    return respond({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'chatbot_ready': chatbot is not None
+        'chatbot_ready': chatbot is not None and chatbot_ready,
+        'warmup_ms': warmup_report['warmup_ms'] if warmup_report else None,
+        'first_request_ms': first_request_ms
     })
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 503 hasta terminar el warm-up (para balanceadores y orquestadores)"""
+    ready = chatbot is not None and chatbot_ready
+    return respond({
+        'status': 'ready' if ready else 'warming_up',
+        'timestamp': datetime.now().isoformat(),
+        'warmup_ms': warmup_report['warmup_ms'] if warmup_report else None
+    }), 200 if ready else 503
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """Endpoint principal para el chat"""
+    global first_request_ms
+    arrival = time.time()
+    logged = query_log is not None and query_log.should_log()
+    user_message = collection = session_id = None
     try:
-        # Verificar que el chatbot esté inicializado
-        if chatbot is None:
-            return jsonify({
+        # Verificar que el chatbot esté inicializado y caliente
+        if chatbot is None or not chatbot_ready:
+            return respond({
                 'error': 'Chatbot no inicializado',
                 'message': 'El servidor está iniciando, por favor espera un momento.'
             }), 503
@@ -62,47 +230,298 @@ def chat():
         # Obtener el mensaje del request
         data = request.get_json()
         if not data or 'message' not in data:
-            return jsonify({
+            return respond({
                 'error': 'Mensaje requerido',
                 'message': 'Debes enviar un mensaje en el campo "message"'
             }), 400
 
         user_message = data['message'].strip()
         if not user_message:
-            return jsonify({
+            return respond({
                 'error': 'Mensaje vacío',
                 'message': 'El mensaje no puede estar vacío'
             }), 400
 
+        # Colección (base de conocimiento) opcional; por defecto la principal
+        collection = data.get('collection')
+        try:
+            chatbot.index_manager.get(collection)
+        except ValueError as e:
+            return respond({
+                'error': 'Colección no encontrada',
+                'message': str(e)
+            }), 404
+
+        # Presupuesto de latencia opcional (por defecto CHAT_LATENCY_BUDGET_MS)
+        latency_budget_ms = data.get('latency_budget_ms')
+        if latency_budget_ms is not None:
+            try:
+                latency_budget_ms = float(latency_budget_ms)
+            except (TypeError, ValueError):
+                return respond({
+                    'error': 'Presupuesto inválido',
+                    'message': 'El campo "latency_budget_ms" debe ser numérico'
+                }), 400
+            if latency_budget_ms < 0:
+                return respond({
+                    'error': 'Presupuesto inválido',
+                    'message': 'El campo "latency_budget_ms" no puede ser negativo'
+                }), 400
+
+        # Forma de la respuesta: 'text' (por defecto), 'ids' o 'full'
+        shape = data.get('shape', 'text')
+        if shape not in RESPONSE_SHAPES:
+            return respond({
+                'error': 'Forma de respuesta inválida',
+                'message': f'El campo "shape" debe ser uno de {list(RESPONSE_SHAPES)}'
+            }), 400
+
         logger.info(f"Mensaje recibido: {user_message[:100]}...")
 
-        # Procesar el mensaje con el chatbot
-        response = chatbot.chat(user_message)
+        # Sesión opcional: "session_id": "" crea una nueva y la devuelve en la respuesta
+        session_id = data.get('session_id')
+        if session_id == '':
+            session_id = chatbot.sessions.get_or_create().session_id
+
+        # Procesar el mensaje con el chatbot (perfilado si la petición fue muestreada)
+        with chatbot.runtime.admit() as admitted:
+            if not admitted:
+                if logged:
+                    query_log.record(arrival, 'chat', user_message, collection, session_id, error=503)
+                return overloaded_response()
+            with profiler.profile('chat') as capture:
+                result = chatbot.chat_detailed(
+                    user_message,
+                    collection=collection,
+                    latency_budget_ms=latency_budget_ms,
+                    session_id=session_id
+                )
+        response = result['response']
+        if logged:
+            query_log.record(arrival, 'chat', user_message, collection, session_id,
+                             result['route'], result['total_ms'], result['timings_ms'])
+        if capture:
+            logger.info(f"Perfil guardado en {capture['path']}")
+        if first_request_ms is None:
+            first_request_ms = result['total_ms']
+            logger.info(f"Latencia de la primera petición: {first_request_ms:.0f} ms")
         
         logger.info(f"Respuesta generada: {len(response)} caracteres")
+        if result['degradations']:
+            logger.info(f"Degradaciones aplicadas: {', '.join(result['degradations'])}")
 
-        return jsonify({
+        payload = {
             'response': response,
+            'session_id': result['session_id'],
+            'follow_up': result['follow_up'],
+            'degradations': result['degradations'],
+            'route': result['route'],
+            'timings_ms': result['timings_ms'],
             'timestamp': datetime.now().isoformat()
-        })
+        }
+
+        # 'ids': solo los chunks que entraron al contexto (el cliente los tiene en caché); el texto
+        # se omite únicamente si es extraído de esos chunks, no si viene del router, del LLM o
+        # de la traducción
+        if shape == 'ids':
+            if result['extractive']:
+                del payload['response']
+            payload['question_type'] = result['question_type']
+        if shape in ('ids', 'full'):
+            by_id = {chunk['id']: chunk for chunk in result['chunks']}
+            payload['chunks'] = [
+                chunk_view(by_id[chunk_id], shape) for chunk_id in result['context_chunk_ids'] if chunk_id in by_id
+            ]
+
+        return respond(payload)
 
     except Exception as e:
         logger.error(f"Error procesando mensaje: {e}")
-        return jsonify({
+        if logged and user_message:
+            query_log.record(arrival, 'chat', user_message, collection, session_id,
+                             total_ms=(time.time() - arrival) * 1000.0, error=500)
+        return respond({
             'error': 'Error interno del servidor',
             'message': 'Ocurrió un error procesando tu mensaje. Por favor, intenta de nuevo.',
             'details': str(e)
         }), 500
 
+def log_search(arrival: float, queries, collection: str = None, result: dict = None, error: int = None):
+    """Registrar las consultas de /search (una entrada por consulta del lote) en el log"""
+    total_ms = (time.time() - arrival) * 1000.0
+    for query in queries:
+        query_log.record(arrival, 'search', query, collection, total_ms=total_ms,
+                         timings_ms=result['timings_ms'] if result else None, error=error)
+
+@app.route('/search', methods=['POST'])
+def search():
+    """Solo recuperación: chunks ordenados con sus scores, sin generar ni traducir respuesta"""
+    arrival = time.time()
+    logged = query_log is not None and query_log.should_log()
+    if chatbot is None or not chatbot_ready:
+        return respond({
+            'error': 'Chatbot no inicializado',
+            'message': 'El servidor está iniciando, por favor espera un momento.'
+        }), 503
+
+    data = request.get_json(silent=True) or {}
+    try:
+        options = parse_search_options(data)
+    except ValueError as e:
+        return respond({
+            'error': 'Opciones de búsqueda inválidas',
+            'message': str(e)
+        }), 400
+
+    try:
+        chatbot.index_manager.get(options['collection'])
+    except ValueError as e:
+        return respond({
+            'error': 'Colección no encontrada',
+            'message': str(e)
+        }), 404
+
+    shape = 'full' if options.pop('include_content') else 'refs'
+    stream = options.pop('stream')
+    queries = options.pop('queries')
+
+    def run_batch(batch):
+        result = chatbot.search(batch, **options)
+        return [
+            {'query': query, 'chunks': [chunk_view(chunk, shape) for chunk in chunks]}
+            for query, chunks in zip(batch, result['results'])
+        ], result
+
+    # Streaming NDJSON: una línea por consulta a medida que se resuelve cada bloque
+    accept = request.headers.get('Accept', '')
+    if stream or 'application/x-ndjson' in accept:
+        def generate():
+            for start in range(0, len(queries), SEARCH_STREAM_BATCH):
+                with chatbot.runtime.admit() as admitted:
+                    batch = queries[start:start + SEARCH_STREAM_BATCH]
+                    if not admitted:
+                        if logged:
+                            log_search(arrival, queries[start:], options['collection'], error=503)
+                        yield encode_payload({'error': 'Servidor saturado'})[0] + b'\n'
+                        return
+                    try:
+                        lines, result = run_batch(batch)
+                    except Exception as e:
+                        bad_where = isinstance(e, ValueError) and options['where'] is not None
+                        if logged:
+                            log_search(arrival, queries[start:], options['collection'], error=400 if bad_where else 500)
+                        if not bad_where:
+                            raise
+                        yield encode_payload(invalid_where(e))[0] + b'\n'
+                        return
+                if logged:
+                    log_search(arrival, batch, result['collection'], result)
+                for line in lines:
+                    yield encode_payload(line)[0] + b'\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    try:
+        with chatbot.runtime.admit() as admitted:
+            if not admitted:
+                if logged:
+                    log_search(arrival, queries, options['collection'], error=503)
+                return overloaded_response()
+            results, result = run_batch(queries)
+    except Exception as e:
+        # ChromaDB valida el filtro al consultar: un "where" mal formado es error del cliente
+        if isinstance(e, ValueError) and options['where'] is not None:
+            if logged:
+                log_search(arrival, queries, options['collection'], error=400)
+            return respond(invalid_where(e)), 400
+        logger.error(f"Error en búsqueda: {e}")
+        if logged:
+            log_search(arrival, queries, options['collection'], error=500)
+        return respond({
+            'error': 'Error interno del servidor',
+            'message': 'Ocurrió un error en la búsqueda. Por favor, intenta de nuevo.',
+            'details': str(e)
+        }), 500
+
+    if logged:
+        log_search(arrival, queries, result['collection'], result)
+
+    payload = {
+        'collection': result['collection'],
+        'timings_ms': result['timings_ms'],
+        'timestamp': datetime.now().isoformat()
+    }
+    # Una sola consulta ('query'): respuesta plana; lote ('queries'): lista de resultados
+    if 'queries' in data:
+        payload['results'] = results
+    else:
+        payload.update(results[0])
+    return respond(payload)
+
+@app.route('/chunks', methods=['POST'])
+def get_chunks():
+    """Texto de chunks por id, para clientes que cachean el corpus y reciben solo ids"""
+    if chatbot is None:
+        return respond({
+            'error': 'Chatbot no inicializado'
+        }), 503
+
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return respond({
+            'error': 'Ids requeridos',
+            'message': 'Debes enviar una lista de ids en el campo "ids"'
+        }), 400
+
+    try:
+        index = chatbot.index_manager.get(data.get('collection'))
+    except ValueError as e:
+        return respond({
+            'error': 'Colección no encontrada',
+            'message': str(e)
+        }), 404
+
+    fetched = index.collection.get(ids=ids, include=['documents', 'metadatas'])
+    chunks = [
+        {
+            'id': chunk_id,
+            'content': document,
+            'content_hash': (metadata or {}).get('content_hash'),
+            'title': (metadata or {}).get('title'),
+            'file': (metadata or {}).get('file')
+        }
+        for chunk_id, document, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas'])
+    ]
+    found = set(fetched['ids'])
+
+    return respond({
+        'chunks': chunks,
+        'missing': [chunk_id for chunk_id in ids if chunk_id not in found]
+    })
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Cerrar una sesión de conversación"""
+    if chatbot is None:
+        return respond({
+            'error': 'Chatbot no inicializado'
+        }), 503
+
+    return respond({
+        'session_id': session_id,
+        'deleted': chatbot.sessions.delete(session_id)
+    })
+
 @app.route('/info', methods=['GET'])
 def get_info():
     """Endpoint para obtener información del chatbot"""
     if chatbot is None:
-        return jsonify({
+        return respond({
             'error': 'Chatbot no inicializado'
         }), 503
 
-    return jsonify({
+    return respond({
         'name': 'CodeHelperNET',
         'description': 'Asistente especializado en C# y .NET',
         'version': '1.0.0',
@@ -118,13 +537,95 @@ def get_info():
             'Microservices',
             'DevOps'
         ],
-        'documents_count': len(chatbot.collection.get()['documents']) if hasattr(chatbot, 'collection') else 0
+        'documents_count': chatbot.collection.count() if hasattr(chatbot, 'collection') else 0,
+        'index_version': chatbot.index_version,
+        'collections': chatbot.index_manager.list_collections(),
+        'index_residency': chatbot.index_manager.stats(),
+        'active_sessions': len(chatbot.sessions),
+        'warmup': warmup_report,
+        'first_request_ms': first_request_ms
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas del pipeline: tasa de consultas resueltas sin recuperación y costos por etapa"""
+    if chatbot is None:
+        return respond({
+            'error': 'Chatbot no inicializado'
+        }), 503
+
+    return respond({
+        'router': chatbot.router.stats() if chatbot.router is not None else None,
+        'stage_costs_ms': {stage: cost * 1000.0 for stage, cost in chatbot.stage_costs.costs.items()},
+        'active_sessions': len(chatbot.sessions),
+        'inference_runtime': chatbot.runtime.stats(),
+        'answer_store': chatbot.answer_store.stats() if chatbot.answer_store is not None else None,
+        'query_log': query_log.stats() if query_log is not None else None,
+        'first_request_ms': first_request_ms,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/admin/swap-index', methods=['POST'])
+def swap_index():
+    """Cambiar en caliente a una nueva versión del índice sin reiniciar"""
+    if not admin_authorized():
+        return respond({'error': 'No autorizado'}), 403
+
+    if chatbot is None:
+        return respond({
+            'error': 'Chatbot no inicializado'
+        }), 503
+
+    data = request.get_json(silent=True) or {}
+    previous_version = chatbot.index_version
+
+    try:
+        # Sin 'version' se usa la publicada en vector_db/CURRENT
+        version = chatbot.swap_index(data.get('version'))
+    except ValueError as e:
+        return respond({
+            'error': 'Versión de índice inválida',
+            'message': str(e)
+        }), 400
+
+    logger.info(f"Índice cambiado: {previous_version} -> {version}")
+
+    return respond({
+        'previous_version': previous_version,
+        'version': version,
+        'documents_count': chatbot.collection.count(),
+        'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def profiling():
+    """Consultar o cambiar el modo de perfilado sin reiniciar"""
+    if not admin_authorized():
+        return respond({'error': 'No autorizado'}), 403
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(
+                sample_every=data.get('sample_every'),
+                window_s=float(data['window_s']) if data.get('window_s') is not None else None,
+                interval_ms=data.get('interval_ms'),
+                torch_ops=data.get('torch_ops'),
+                output_format=data.get('format')
+            )
+        except (TypeError, ValueError) as e:
+            return respond({
+                'error': 'Configuración de perfilado inválida',
+                'message': str(e)
+            }), 400
+        logger.info(f"Perfilado configurado: {profiler.status()}")
+
+    return respond(profiler.status())
+
 @app.errorhandler(404)
 def not_found(error):
     """Manejar rutas no encontradas"""
-    return jsonify({
+    return respond({
         'error': 'Endpoint no encontrado',
         'message': 'La ruta solicitada no existe'
     }), 404
@@ -132,7 +633,7 @@ def not_found(error):
 @app.errorhandler(500)
 def internal_error(error):
     """Manejar errores internos"""
-    return jsonify({
+    return respond({
         'error': 'Error interno del servidor',
         'message': 'Ocurrió un error inesperado'
     }), 500
@@ -142,6 +643,7 @@ if __name__ == '__main__':
     if not initialize_chatbot():
         logger.error("No se pudo inicializar el chatbot. Saliendo...")
         sys.exit(1)
+    start_warmup()
 
     # Configurar el servidor
     port = int(os.environ.get('PORT', 5000))
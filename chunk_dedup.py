@@ -0,0 +1,138 @@
+import re
+import hashlib
+from typing import List, Dict, Any, Tuple
+import numpy as np
+
+# Primo de Mersenne 2^31 - 1: a * x + b cabe en uint64 sin desbordar
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+class MinHashDeduplicator:
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 42):
+        """Detector de chunks casi duplicados basado en MinHash + LSH"""
+        if num_perm % bands != 0:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Permutaciones universales (a * x + b) mod p, fijas por semilla
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+        self.reset()
+
+    def shingles(self, text: str) -> np.ndarray:
+        """Convertir el texto en hashes de n-gramas de palabras"""
+        words = re.sub(r'\s+', ' ', text.lower()).strip().split(' ')
+        if len(words) < self.shingle_size:
+            grams = [' '.join(words)]
+        else:
+            grams = [' '.join(words[i:i + self.shingle_size])
+                     for i in range(len(words) - self.shingle_size + 1)]
+
+        hashes = {
+            int.from_bytes(hashlib.blake2b(g.encode('utf-8'), digest_size=4).digest(), 'little')
+            for g in grams
+        }
+        return np.fromiter(hashes, dtype=np.uint64, count=len(hashes)) % _MERSENNE_PRIME
+
+    def signature(self, text: str) -> np.ndarray:
+        """Calcular la firma MinHash de un texto"""
+        shingles = self.shingles(text)
+        permuted = (self._a[:, None] * shingles[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def reset(self):
+        """Vaciar el índice LSH para una nueva ingesta"""
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(self.bands)]
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._canonical: Dict[str, Dict[str, Any]] = {}
+        self._duplicates: Dict[str, List[Dict[str, Any]]] = {}
+        self.chunks_seen = 0
+        self.chars_removed = 0
+
+    def offer(self, document: Dict[str, Any]) -> bool:
+        """Registrar un chunk en streaming; False si es casi duplicado de uno anterior"""
+        self.chunks_seen += 1
+        sig = self.signature(document["text"])
+        band_keys = [sig[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+        # LSH: los chunks canónicos que comparten alguna banda son candidatos
+        candidates = []
+        for band, key in enumerate(band_keys):
+            for chunk_id in self._buckets[band].get(key, []):
+                if chunk_id not in candidates:
+                    candidates.append(chunk_id)
+
+        best_id, best_similarity = None, self.threshold
+        for chunk_id in candidates:
+            # Verificar con la similitud de Jaccard estimada
+            similarity = float(np.mean(self._signatures[chunk_id] == sig))
+            if similarity >= best_similarity:
+                best_id, best_similarity = chunk_id, similarity
+
+        if best_id is not None:
+            self._duplicates[best_id].append(document)
+            self.chars_removed += len(document["text"])
+            return False
+
+        # Nuevo chunk canónico (el primero en orden de ingesta)
+        self._signatures[document["id"]] = sig
+        self._canonical[document["id"]] = document
+        self._duplicates[document["id"]] = []
+        for band, key in enumerate(band_keys):
+            self._buckets[band].setdefault(key, []).append(document["id"])
+        return True
+
+    def merged_documents(self) -> List[Dict[str, Any]]:
+        """Chunks canónicos que absorbieron duplicados, con metadatos de origen combinados"""
+        merged = []
+        for chunk_id, duplicates in self._duplicates.items():
+            if not duplicates:
+                continue
+            canonical = self._canonical[chunk_id]
+            members = [canonical] + duplicates
+            files = sorted({doc["metadata"]["file"] for doc in members})
+
+            # ChromaDB solo admite metadatos escalares: combinar como cadenas
+            metadata = dict(canonical["metadata"])
+            metadata["source_files"] = "|".join(files)
+            metadata["duplicate_ids"] = "|".join(doc["id"] for doc in members)
+            metadata["duplicate_count"] = len(members)
+
+            merged.append({"id": chunk_id, "text": canonical["text"], "metadata": metadata})
+        return merged
+
+    def report(self, rerank_pool_size: int = 9) -> Dict[str, Any]:
+        """Cuánto se redujo el índice y cuánto trabajo de re-ranking se ahorra"""
+        before = self.chunks_seen
+        after = len(self._canonical)
+        removed = before - after
+        removed_fraction = removed / before if before else 0.0
+
+        return {
+            "chunks_before": before,
+            "chunks_after": after,
+            "chunks_removed": removed,
+            "duplicate_groups": sum(1 for duplicates in self._duplicates.values() if duplicates),
+            "index_shrink_pct": 100.0 * removed_fraction,
+            "index_chars_removed": self.chars_removed,
+            # Estimación, no medición: supone que los duplicados aparecían en el pool de
+            # re-ranking en la misma proporción que en el índice
+            "rerank_pool_size": rerank_pool_size,
+            "rerank_pairs_saved_per_query_estimate": rerank_pool_size * removed_fraction
+        }
+
+    def deduplicate(self, documents: List[Dict[str, Any]],
+                    rerank_pool_size: int = 9) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Colapsar chunks casi duplicados en uno solo con metadatos de origen combinados"""
+        self.reset()
+        kept = [document for document in documents if self.offer(document)]
+        merged = {document["id"]: document for document in self.merged_documents()}
+        return [merged.get(document["id"], document) for document in kept], self.report(rerank_pool_size)
@@ -0,0 +1,104 @@
+import os
+import re
+from typing import List, Dict, Any
+
+# Módulo liviano (sin modelos): se importa en los procesos de ingesta en paralelo
+
+
+def split_text_semantic(text: str, max_length: int = 500) -> List[str]:
+    """División semántica mejorada del texto"""
+    chunks = []
+
+    # Dividir por secciones principales (títulos con #)
+    sections = re.split(r'\n(?=#+\s)', text)
+
+    for section in sections:
+        if not section.strip():
+            continue
+
+        # Si la sección es pequeña, agregarla completa
+        if len(section) <= max_length:
+            chunks.append(section.strip())
+            continue
+
+        # Dividir secciones grandes por párrafos
+        paragraphs = re.split(r'\n\s*\n', section)
+        current_chunk = ""
+
+        for paragraph in paragraphs:
+            if len(current_chunk) + len(paragraph) <= max_length:
+                current_chunk += paragraph + "\n\n"
+            else:
+                if current_chunk.strip():
+                    chunks.append(current_chunk.strip())
+                current_chunk = paragraph + "\n\n"
+
+        if current_chunk.strip():
+            chunks.append(current_chunk.strip())
+
+    return chunks
+
+
+def classify_content(text: str) -> str:
+    """Clasificar el tipo de contenido"""
+    text_lower = text.lower()
+
+    if any(keyword in text_lower for keyword in ['using ', 'import ', 'namespace ']):
+        return "import_statement"
+    elif any(keyword in text_lower for keyword in ['class ', 'public class', 'private class']):
+        return "class_definition"
+    elif any(keyword in text_lower for keyword in ['public ', 'private ', 'static ', 'async ', 'void ', 'int ', 'string ', 'bool ']) and '(' in text and ')' in text:
+        return "method_definition"
+    elif any(keyword in text_lower for keyword in ['sqlconnection', 'sqldataadapter', 'sqldatareader', 'execute', 'query', 'database']):
+        return "database_operation"
+    elif any(keyword in text_lower for keyword in ['ado.net', 'entity framework', 'linq', 'asp.net']):
+        return "framework_concept"
+    else:
+        return "general_concept"
+
+
+def chunk_document(name: str, content: str, max_length: int = 500) -> List[Dict[str, Any]]:
+    """Generar chunks con metadatos a partir del texto de un documento"""
+    # Dividir el contenido semánticamente
+    chunks = split_text_semantic(content, max_length)
+
+    documents = []
+    for i, chunk in enumerate(chunks):
+        if len(chunk.strip()) < 50:  # Ignorar chunks muy pequeños
+            continue
+
+        # Clasificar el contenido
+        content_type = classify_content(chunk)
+
+        # Extraer título o primera línea como descripción
+        lines = chunk.split('\n')
+        title = lines[0].strip() if lines else "Sin título"
+        if title.startswith('#'):
+            title = title.lstrip('#').strip()
+
+        # Id determinista: nombre del archivo + posición del chunk
+        document = {
+            "id": f"{name}_{i}",
+            "text": chunk,
+            "metadata": {
+                "file": name,
+                "content_type": content_type,
+                "title": title[:100],  # Limitar longitud del título
+                "chunk_index": i,
+                "length": len(chunk)
+            }
+        }
+        documents.append(document)
+
+    return documents
+
+
+def chunk_file(file_path: str) -> List[Dict[str, Any]]:
+    """Leer y dividir un archivo (función de nivel de módulo para poder usarla en procesos)"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        return chunk_document(os.path.basename(file_path), content)
+    except Exception as e:
+        print(f"Error procesando {file_path}: {e}")
+        return []
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+from typing import List, Dict, Any, Tuple, Optional
+import numpy as np
+
+# Tabla de popcount para bytes (distancia de Hamming en modo binario)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class CompactEmbeddingStore:
+    """Índice de embeddings compactos en disco (memory-mapped) con re-scoring a float32"""
+
+    MODES = ("float16", "int8", "binary")
+
+    def __init__(self, path: str, rescore_factor: int = 4, block_size: int = 65536):
+        """Abrir un índice compacto existente"""
+        self.path = path
+        self.rescore_factor = rescore_factor
+        self.block_size = block_size
+
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+
+        self.mode = self.manifest["mode"]
+        self.dim = self.manifest["dim"]
+        self.count = self.manifest["count"]
+
+        # Los códigos compactos se recorren en cada búsqueda; los float32 solo
+        # se leen para el shortlist, así que casi nunca quedan residentes
+        self.codes = np.memmap(os.path.join(path, "codes.bin"), mode="r",
+                               dtype=self._code_dtype(), shape=self._code_shape())
+        self.full = np.memmap(os.path.join(path, "full.f32"), mode="r",
+                              dtype=np.float32, shape=(self.count, self.dim))
+
+        if self.mode == "int8":
+            self.scale = np.asarray(self.manifest["scale"], dtype=np.float32)
+            self.offset = np.asarray(self.manifest["offset"], dtype=np.float32)
+
+    def _code_dtype(self):
+        return {"float16": np.float16, "int8": np.uint8, "binary": np.uint8}[self.mode]
+
+    def _code_shape(self) -> Tuple[int, int]:
+        if self.mode == "binary":
+            return (self.count, (self.dim + 7) // 8)
+        return (self.count, self.dim)
+
+    @staticmethod
+    def normalize(embeddings: np.ndarray) -> np.ndarray:
+        """Normalizar vectores a norma 1 (similitud coseno = producto punto)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    @classmethod
+    def build(cls, path: str, ids: List[str], embeddings: np.ndarray,
+              mode: str = "int8", **kwargs) -> "CompactEmbeddingStore":
+        """Escribir un índice compacto a disco a partir de embeddings float32"""
+        if mode not in cls.MODES:
+            raise ValueError(f"Modo no soportado: {mode} (usa uno de {cls.MODES})")
+
+        os.makedirs(path, exist_ok=True)
+        full = cls.normalize(embeddings)
+        manifest: Dict[str, Any] = {"mode": mode, "dim": int(full.shape[1]), "count": int(full.shape[0])}
+
+        if mode == "float16":
+            codes = full.astype(np.float16)
+        elif mode == "int8":
+            # Cuantización escalar por dimensión al rango [0, 255]
+            low = full.min(axis=0)
+            scale = (full.max(axis=0) - low) / 255.0
+            scale[scale == 0] = 1.0
+            codes = np.clip(np.round((full - low) / scale), 0, 255).astype(np.uint8)
+            manifest["scale"] = scale.tolist()
+            manifest["offset"] = low.tolist()
+        else:
+            codes = np.packbits(full > 0, axis=1)
+
+        codes.tofile(os.path.join(path, "codes.bin"))
+        full.tofile(os.path.join(path, "full.f32"))
+        with open(os.path.join(path, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(list(ids), f)
+        with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        return cls(path, **kwargs)
+
+    def approximate_scores(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Scores aproximados usando solo los códigos compactos de un bloque"""
+        block = self.codes[start:end]
+        if self.mode == "float16":
+            return block.astype(np.float32) @ query
+        if self.mode == "int8":
+            # q·(c * scale + offset) = (q * scale)·c + q·offset
+            return block.astype(np.float32) @ (query * self.scale) + float(query @ self.offset)
+
+        # Binario: menor distancia de Hamming = mayor score
+        query_bits = np.packbits(query > 0)
+        hamming = _POPCOUNT[np.bitwise_xor(block, query_bits)].sum(axis=1, dtype=np.int32)
+        return -hamming.astype(np.float32)
+
+    def search(self, query_embedding, k: int, shortlist: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Buscar con los códigos compactos y re-puntuar el shortlist en float32"""
+        if self.count == 0:
+            return []
+
+        query = self.normalize(query_embedding).reshape(-1)
+        shortlist = min(self.count, shortlist or k * self.rescore_factor)
+
+        # Recorrer el índice por bloques para acotar la memoria temporal
+        candidate_ids = np.empty(0, dtype=np.int64)
+        candidate_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, self.count, self.block_size):
+            end = min(start + self.block_size, self.count)
+            scores = self.approximate_scores(query, start, end)
+            candidate_ids = np.concatenate([candidate_ids, np.arange(start, end)])
+            candidate_scores = np.concatenate([candidate_scores, scores])
+            if len(candidate_ids) > shortlist:
+                keep = np.argpartition(-candidate_scores, shortlist - 1)[:shortlist]
+                candidate_ids, candidate_scores = candidate_ids[keep], candidate_scores[keep]
+
+        # Re-scoring exacto solo sobre las filas del shortlist
+        rows = np.sort(candidate_ids)
+        exact = self.full[rows] @ query
+        order = np.argsort(-exact)[:k]
+        return [(self.ids[rows[i]], float(exact[i])) for i in order]
+
+    def disk_bytes(self) -> int:
+        """Tamaño en disco del índice compacto: códigos, float32 de re-scoring, ids y manifiesto"""
+        return sum(os.path.getsize(os.path.join(self.path, name))
+                   for name in ("codes.bin", "full.f32", "ids.json", "manifest.json"))
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Bytes del modo comparados con float32, contando también la copia float32 de re-scoring
+
+        `code_bytes` es lo que recorre cada búsqueda. `resident_bytes` suma además `full.f32`:
+        el re-scoring lee filas dispersas del shortlist y, con tráfico variado, sus páginas
+        terminan en memoria, así que es la cota a usar para presupuestos. En disco el índice
+        compacto ocupa más que los float32 solos (`disk_bytes`).
+        """
+        code_bytes = int(self.codes.nbytes)
+        rescore_bytes = int(self.full.nbytes)
+        resident_bytes = code_bytes + rescore_bytes
+        float32_bytes = self.count * self.dim * 4
+        return {
+            "mode": self.mode,
+            "vectors": self.count,
+            "code_bytes": code_bytes,
+            "rescore_bytes": rescore_bytes,
+            "resident_bytes": resident_bytes,
+            "disk_bytes": self.disk_bytes(),
+            "bytes_per_vector": resident_bytes / self.count if self.count else 0.0,
+            "float32_bytes": float32_bytes,
+            # Ahorro en lo que se recorre por consulta (no en memoria total ni en disco)
+            "scan_ratio": float32_bytes / code_bytes if code_bytes else 0.0
+        }
+
+
+def exact_top_k(embeddings: np.ndarray, query: np.ndarray, k: int) -> List[int]:
+    """Top-k exacto en float32 (referencia para recall@k)"""
+    scores = CompactEmbeddingStore.normalize(embeddings) @ CompactEmbeddingStore.normalize(query).reshape(-1)
+    return list(np.argsort(-scores)[:k])
+
+
+def benchmark_modes(base_path: str, ids: List[str], embeddings: np.ndarray,
+                    queries: np.ndarray, k: int = 10, modes=CompactEmbeddingStore.MODES) -> List[Dict[str, Any]]:
+    """Reportar memoria, recall@k y latencia de cada modo de almacenamiento"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    reference = [set(ids[i] for i in exact_top_k(embeddings, q, k)) for q in queries]
+
+    results = []
+    for mode in modes:
+        store = CompactEmbeddingStore.build(os.path.join(base_path, mode), ids, embeddings, mode=mode)
+
+        recalls = []
+        start_time = time.time()
+        for query, expected in zip(queries, reference):
+            found = {chunk_id for chunk_id, _ in store.search(query, k)}
+            recalls.append(len(found & expected) / len(expected))
+        elapsed = time.time() - start_time
+
+        report = store.memory_report()
+        report[f"recall@{k}"] = float(np.mean(recalls))
+        report["avg_search_ms"] = 1000.0 * elapsed / max(len(queries), 1)
+        results.append(report)
+
+    return results
+
+
+if __name__ == "__main__":
+    # Benchmark sobre la colección existente
+    from chromadb import PersistentClient
+    from sentence_transformers import SentenceTransformer
+    from index_manager import DEFAULT_COLLECTION
+
+    client = PersistentClient(path="./vector_db")
+    collection = client.get_collection(DEFAULT_COLLECTION)
+    data = collection.get(include=["embeddings"])
+
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+    sample_queries = [
+        "¿Qué es ADO.NET?",
+        "¿Cómo se conecta a una base de datos en C#?",
+        "¿Qué es la inyección de dependencias en .NET?",
+        "¿Cómo usar migrations en EF Core?",
+        "¿Cómo implementar el patrón Repository?",
+        "¿Qué es async/await en C#?",
+        "¿Cómo escribir unit tests en .NET?",
+        "¿Cómo implementar caching en aplicaciones .NET?"
+    ]
+    query_embeddings = model.encode(sample_queries)
+
+    print("📦 Benchmark de almacenamiento compacto de embeddings")
+    for report in benchmark_modes(os.path.join("./vector_db/compact", DEFAULT_COLLECTION), data["ids"], np.asarray(data["embeddings"]),
+                                  query_embeddings, k=10):
+        print(f"   - {report['mode']}: {report['code_bytes'] / 1024:.1f} KiB recorridos por consulta "
+              f"(x{report['scan_ratio']:.1f} menos que float32), "
+              f"{report['resident_bytes'] / 1024:.1f} KiB residentes y "
+              f"{report['disk_bytes'] / 1024:.1f} KiB en disco con el re-scoring, "
+              f"recall@10={report['recall@10']:.3f}, {report['avg_search_ms']:.2f} ms/consulta")
@@ -0,0 +1,97 @@
+import re
+from typing import List, Dict, Any, Callable
+from prompt_templates import count_tokens
+
+
+class PackedContext:
+    def __init__(self, text: str, chunk_ids: List[str], tokens: int, budget: int):
+        """Contexto empaquetado junto con los chunks usados y los tokens consumidos"""
+        self.text = text
+        self.chunk_ids = chunk_ids
+        self.tokens = tokens
+        self.budget = budget
+
+
+# Tokenizer de los conteos guardados por índices construidos antes de registrar 'tokenizer'
+INGEST_TOKENIZER = "all-MiniLM-L6-v2"
+
+
+class ContextPacker:
+    def __init__(self, tokenizer=None, separator: str = "\n\n", tokenizer_name: str = INGEST_TOKENIZER):
+        """Empaquetar chunks completos dentro de un presupuesto de tokens
+        
+        `tokenizer_name` identifica al tokenizer del modelo que consume el contexto: los
+        conteos precalculados en la ingesta solo se usan si se hicieron con ese mismo tokenizer.
+        """
+        self.tokenizer = tokenizer
+        self.separator = separator
+        self.tokenizer_name = tokenizer_name
+
+    def chunk_tokens(self, chunk: Dict[str, Any]) -> int:
+        """Tokens de un chunk: el conteo precalculado en la ingesta (si es del mismo tokenizer)
+        o uno nuevo con el tokenizer del consumidor"""
+        metadata = chunk.get('metadata') or {}
+        if 'token_count' in metadata and metadata.get('tokenizer', INGEST_TOKENIZER) == self.tokenizer_name:
+            return int(metadata['token_count'])
+        return count_tokens(chunk['content'], self.tokenizer)
+
+    def pack(self, chunks: List[Dict[str, Any]], budget_tokens: int,
+             transform: Callable[[str], str] = None) -> PackedContext:
+        """Llenar el presupuesto con los chunks de mayor score sin cortarlos"""
+        selected = []
+        used = 0
+        for chunk in sorted(chunks, key=lambda c: c['score'], reverse=True):
+            tokens = self.chunk_tokens(chunk)
+            if used + tokens > budget_tokens:
+                # Seguir probando: un chunk más corto puede caber todavía
+                continue
+            selected.append(chunk)
+            used += tokens
+
+        parts = [transform(c['content']) if transform else c['content'] for c in selected]
+
+        # Si ni el mejor chunk cabe, recortarlo en un límite de oración o línea
+        if not selected and chunks:
+            best = max(chunks, key=lambda c: c['score'])
+            content = transform(best['content']) if transform else best['content']
+            text = self.pack_text(content, budget_tokens)
+            if text:
+                return PackedContext(text, [best.get('id')], count_tokens(text, self.tokenizer), budget_tokens)
+
+        return PackedContext(self.separator.join(p for p in parts if p),
+                             [c.get('id') for c in selected], used, budget_tokens)
+
+    def pack_text(self, text: str, budget_tokens: int, tokenizer=None) -> str:
+        """Conservar oraciones o líneas completas, en orden, hasta el presupuesto
+        
+        Se mantienen los separadores originales (saltos de línea, sangría del código).
+        """
+        tokenizer = tokenizer or self.tokenizer
+        # Partes alternadas: unidad, separador, unidad, separador...
+        pieces = re.split(r'((?<=[\.\!\?\:;])\s+|\n\s*)', text)
+        units = [(pieces[i], pieces[i - 1] if i else "") for i in range(0, len(pieces), 2)]
+        units = [(unit, separator) for unit, separator in units if unit.strip()]
+
+        kept = []
+        used = 0
+        for unit, separator in units:
+            tokens = count_tokens(unit, tokenizer)
+            if used + tokens > budget_tokens:
+                break
+            kept.append(separator + unit if kept else unit)
+            used += tokens
+
+        # Una sola oración más larga que el presupuesto: cortar por palabras
+        if not kept and units:
+            unit = units[0][0]
+            ends = [match.end() for match in re.finditer(r'\S+', unit)]
+            while ends and count_tokens(unit[:ends[-1]], tokenizer) > budget_tokens:
+                ends = ends[:max(1, int(len(ends) * 0.8))] if len(ends) > 1 else []
+            return unit[:ends[-1]].strip() if ends else ""
+
+        return "".join(kept)
+
+
+def budget_for_window(window_tokens: int, reserved_tokens: int, prompt_tokens: int) -> int:
+    """Tokens disponibles para el contexto dentro de la ventana del modelo"""
+    return max(0, window_tokens - reserved_tokens - prompt_tokens)
@@ -0,0 +1,143 @@
+import os
+import mmap
+import posixpath
+import zlib
+import struct
+import tarfile
+import zipfile
+from typing import List, Dict, Any, Iterator, Tuple, Callable
+from chunking import chunk_document, chunk_file
+
+# Tarea de chunking: (nombre para mostrar, función de nivel de módulo, argumentos)
+ChunkTask = Tuple[str, Callable[..., List[Dict[str, Any]]], tuple]
+
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+# Archivos abiertos por proceso (cada worker mapea el archivo una sola vez)
+_open_archives: Dict[str, "RandomAccessArchive"] = {}
+
+
+def is_corpus_member(name: str) -> bool:
+    return name.endswith('.txt') and not name.endswith('/')
+
+
+def document_name(member: str) -> str:
+    """Id de documento de un miembro: su ruta relativa dentro del archivo, normalizada
+    
+    Con el nombre base, 'a/README.txt' y 'b/README.txt' tendrían los mismos ids de chunk y
+    uno pisaría al otro. Los miembros en la raíz conservan el mismo id que en un directorio.
+    """
+    name = posixpath.normpath(member.replace('\\', '/'))
+    while name.startswith(('./', '/')):
+        name = name[1:] if name.startswith('/') else name[2:]
+    return name
+
+
+class RandomAccessArchive:
+    def __init__(self, path: str):
+        """Archivo .zip o .tar sin comprimir mapeado en memoria (sin extraer a disco)"""
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        if zipfile.is_zipfile(path):
+            self.kind = 'zip'
+            self._zip = zipfile.ZipFile(self._file)
+            self._entries = {info.filename: info for info in self._zip.infolist()}
+        else:
+            self.kind = 'tar'
+            with tarfile.open(path, mode='r:') as tar:
+                self._entries = {member.name: member for member in tar.getmembers() if member.isfile()}
+
+    def members(self) -> List[str]:
+        return sorted(name for name in self._entries if is_corpus_member(name))
+
+    def read_text(self, name: str) -> str:
+        """Leer un miembro evitando copias intermedias de los bytes comprimidos"""
+        entry = self._entries[name]
+        if self.kind == 'tar':
+            # Miembro sin comprimir: se decodifica directo desde el mapa de memoria
+            return str(self._view[entry.offset_data:entry.offset_data + entry.size], 'utf-8')
+
+        header = _ZIP_LOCAL_HEADER.unpack_from(self._mmap, entry.header_offset)
+        name_length, extra_length = header[9], header[10]
+        start = entry.header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length
+        data = self._view[start:start + entry.compress_size]
+
+        if entry.compress_type == zipfile.ZIP_STORED:
+            return str(data, 'utf-8')
+        if entry.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompressobj(-zlib.MAX_WBITS).decompress(data).decode('utf-8')
+        # Otros métodos (bzip2, lzma): usar zipfile
+        return self._zip.read(name).decode('utf-8')
+
+
+def open_archive(path: str) -> RandomAccessArchive:
+    archive = _open_archives.get(path)
+    if archive is None:
+        archive = _open_archives[path] = RandomAccessArchive(path)
+    return archive
+
+
+def chunk_archive_member(archive_path: str, member: str) -> List[Dict[str, Any]]:
+    """Worker: leer un miembro del archivo (abierto en este proceso) y dividirlo"""
+    try:
+        text = open_archive(archive_path).read_text(member)
+        return chunk_document(document_name(member), text)
+    except Exception as e:
+        print(f"Error procesando {archive_path}:{member}: {e}")
+        return []
+
+
+def chunk_member_bytes(name: str, data: bytes) -> List[Dict[str, Any]]:
+    """Worker: dividir un miembro ya descomprimido (archivos de solo lectura secuencial)"""
+    try:
+        return chunk_document(document_name(name), data.decode('utf-8'))
+    except Exception as e:
+        print(f"Error procesando {name}: {e}")
+        return []
+
+
+def open_stream_tar(path: str):
+    """Abrir un tar comprimido en modo streaming (.tar.gz, .tgz, .tar.zst, .tzst)"""
+    if path.endswith(('.tar.zst', '.tzst', '.tar.zstd')):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Para leer archivos .zst instala el paquete opcional 'zstandard'")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return tarfile.open(fileobj=stream, mode='r|')
+    return tarfile.open(path, mode='r|*')
+
+
+def iter_stream_tar_tasks(path: str) -> Iterator[ChunkTask]:
+    """Descomprimir secuencialmente y entregar cada miembro como tarea en memoria"""
+    with open_stream_tar(path) as tar:
+        for member in tar:
+            if not member.isfile() or not is_corpus_member(member.name):
+                continue
+            data = tar.extractfile(member).read()
+            yield f"{path}:{member.name}", chunk_member_bytes, (member.name, data)
+
+
+def iter_chunk_tasks(source: str) -> Iterator[ChunkTask]:
+    """Tareas de chunking para un directorio o un archivo comprimido, en orden determinista"""
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if is_corpus_member(filename):
+                path = os.path.join(source, filename)
+                yield path, chunk_file, (path,)
+        return
+
+    if not os.path.exists(source):
+        return
+
+    if source.endswith(('.tar.gz', '.tgz', '.tar.zst', '.tzst', '.tar.zstd', '.tar.bz2', '.tar.xz')):
+        # Sin acceso aleatorio: el proceso principal descomprime en streaming
+        yield from iter_stream_tar_tasks(source)
+        return
+
+    # .zip y .tar: cada worker lee sus miembros directamente del archivo mapeado
+    for member in open_archive(source).members():
+        yield f"{source}:{member}", chunk_archive_member, (source, member)
@@ -0,0 +1,61 @@
+from typing import List
+
+# Preguntas por tema del corpus (pruebas, warm-up del servidor, router y respuestas precalculadas)
+TEST_QUESTIONS = {
+    "Fundamentos de .NET": [
+        "¿Qué es .NET Core y cuáles son sus características principales?",
+        "¿Cuál es la diferencia entre .NET Framework y .NET Core?",
+        "¿Qué es el Common Language Runtime (CLR)?"
+    ],
+    "ASP.NET Core": [
+        "¿Cómo funciona el middleware en ASP.NET Core?",
+        "¿Qué es la inyección de dependencias en .NET?",
+        "¿Cómo configurar el logging en ASP.NET Core?"
+    ],
+    "Entity Framework": [
+        "¿Qué es Entity Framework Core?",
+        "¿Cómo usar migrations en EF Core?",
+        "¿Cuáles son las mejores prácticas para EF Core?"
+    ],
+    "Patrones y Arquitectura": [
+        "¿Qué es la arquitectura de microservicios?",
+        "¿Cómo implementar el patrón Repository?",
+        "¿Qué son los patrones de diseño más comunes en .NET?"
+    ],
+    "Testing y Calidad": [
+        "¿Cómo escribir unit tests en .NET?",
+        "¿Qué es TDD y cómo aplicarlo?",
+        "¿Cuáles son las mejores prácticas de testing?"
+    ],
+    "DevOps y CI/CD": [
+        "¿Cómo configurar CI/CD para aplicaciones .NET?",
+        "¿Qué herramientas usar para DevOps en .NET?",
+        "¿Cómo hacer deployment de aplicaciones .NET?"
+    ],
+    "Machine Learning": [
+        "¿Cómo usar ML.NET para machine learning?",
+        "¿Qué algoritmos están disponibles en ML.NET?",
+        "¿Cómo integrar modelos de ML en aplicaciones .NET?"
+    ],
+    "Desarrollo Cloud": [
+        "¿Cómo desplegar aplicaciones .NET en Azure?",
+        "¿Qué servicios de Azure son útiles para .NET?",
+        "¿Cómo usar Azure DevOps con .NET?"
+    ]
+}
+
+SPECIFIC_QUESTIONS = [
+    "¿Qué es la serialización JSON en .NET y cómo usarla?",
+    "¿Cómo implementar caching en aplicaciones .NET?",
+    "¿Qué es Blazor y cómo funciona?",
+    "¿Cómo usar .NET MAUI para desarrollo multiplataforma?",
+    "¿Qué son los servicios en segundo plano en .NET?",
+    "¿Cómo implementar internacionalización en .NET?",
+    "¿Qué estrategias de migración existen para .NET?",
+    "¿Cómo optimizar el rendimiento de aplicaciones .NET?"
+]
+
+
+def all_questions() -> List[str]:
+    """Todas las preguntas: las de cada tema y luego las específicas"""
+    return [question for questions in TEST_QUESTIONS.values() for question in questions] + list(SPECIFIC_QUESTIONS)
@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import hashlib
+from typing import List, Dict, Any, Callable
+import numpy as np
+
+KEY_BYTES = 16
+
+
+def content_hash(text: str) -> str:
+    """Hash del texto de un chunk (identifica el contenido, no la posición)"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=KEY_BYTES).hexdigest()
+
+
+class EmbeddingCache:
+    """Caché de embeddings direccionada por contenido, en archivos append-only memory-mapped
+
+    Cada modelo tiene su propio directorio con `keys.bin` (hash de 16 bytes por fila) y
+    `vectors.f32` (embeddings float32 en el mismo orden). Las filas nunca se reescriben.
+    """
+
+    def __init__(self, path: str, model_name: str, dim: int):
+        self.model_name = model_name
+        self.dim = dim
+        self.path = os.path.join(path, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        os.makedirs(self.path, exist_ok=True)
+
+        self.keys_path = os.path.join(self.path, "keys.bin")
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self._check_manifest()
+
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._load()
+
+    def _check_manifest(self):
+        manifest_path = os.path.join(self.path, "manifest.json")
+        manifest = {"model": self.model_name, "dim": self.dim, "dtype": "float32"}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+            if existing != manifest:
+                raise ValueError(f"La caché en {self.path} no corresponde al modelo: {existing}")
+        else:
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+    def _load(self):
+        """Indexar las filas existentes (descartando una escritura final incompleta)"""
+        keys = b""
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as f:
+                keys = f.read()
+        vector_rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        self.count = min(len(keys) // KEY_BYTES, vector_rows)
+
+        self._index: Dict[bytes, int] = {}
+        for row in range(self.count):
+            self._index.setdefault(keys[row * KEY_BYTES:(row + 1) * KEY_BYTES], row)
+
+        # Truncar restos de una escritura interrumpida para que las filas queden alineadas
+        for file_path, row_bytes in ((self.keys_path, KEY_BYTES), (self.vectors_path, 4 * self.dim)):
+            if os.path.exists(file_path) and os.path.getsize(file_path) != self.count * row_bytes:
+                with open(file_path, "r+b") as f:
+                    f.truncate(self.count * row_bytes)
+        self._vectors = None
+
+    def _mapped_vectors(self) -> np.ndarray:
+        # Se re-mapea solo cuando el archivo creció desde el último mapeo
+        if self._vectors is None or self._vectors.shape[0] != self.count:
+            self._vectors = np.memmap(self.vectors_path, mode="r", dtype=np.float32,
+                                      shape=(self.count, self.dim)) if self.count else None
+        return self._vectors
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, text: str) -> bool:
+        return bytes.fromhex(content_hash(text)) in self._index
+
+    def append(self, hashes: List[str], embeddings: np.ndarray):
+        """Agregar embeddings nuevos al final de la caché"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        new_rows = [(bytes.fromhex(h), i) for i, h in enumerate(hashes) if bytes.fromhex(h) not in self._index]
+        if not new_rows:
+            return
+
+        # Primero los vectores y luego las claves: una clave siempre apunta a un vector completo
+        with open(self.vectors_path, "ab") as f:
+            f.write(embeddings[[i for _, i in new_rows]].tobytes())
+        with open(self.keys_path, "ab") as f:
+            f.write(b"".join(key for key, _ in new_rows))
+
+        for key, _ in new_rows:
+            self._index[key] = self.count
+            self.count += 1
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray],
+               hashes: List[str] = None) -> np.ndarray:
+        """Embeddings de `texts`, llamando al modelo solo para los textos no cacheados"""
+        hashes = hashes or [content_hash(text) for text in texts]
+        rows = [self._index.get(bytes.fromhex(h)) for h in hashes]
+
+        # Textos faltantes, sin repetir los que aparecen varias veces en el lote
+        missing: Dict[str, int] = {}
+        for i, (h, row) in enumerate(zip(hashes, rows)):
+            if row is None and h not in missing:
+                missing[h] = i
+        self.misses += len(missing)
+        self.hits += len(texts) - sum(1 for row in rows if row is None)
+
+        if missing:
+            computed = np.asarray(encode_fn([texts[i] for i in missing.values()]), dtype=np.float32)
+            self.append(list(missing), computed)
+            rows = [self._index[bytes.fromhex(h)] for h in hashes]
+
+        return np.array(self._mapped_vectors()[rows], dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": self.count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size_mb": self.count * (4 * self.dim + KEY_BYTES) / (1024 * 1024)
+        }
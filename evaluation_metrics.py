@@ -1,9 +1,12 @@
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 from sentence_transformers import CrossEncoder
 from sklearn.metrics.pairwise import cosine_similarity
+import os
 import time
 import json
+import itertools
+from golden_set import DEFAULT_GOLDEN_SET, iter_golden_set, matched_labels, missing_ids
 
 class RAGEvaluator:
     def __init__(self):
@@ -32,8 +35,13 @@ class RAGEvaluator:
             return 0.0
         return 2 * (precision * recall) / (precision + recall)
     
-    def calculate_ndcg_at_k(self, relevance_scores: List[float], k: int = 5) -> float:
-        """Calcular NDCG@K (Normalized Discounted Cumulative Gain)"""
+    def calculate_ndcg_at_k(self, relevance_scores: List[float], k: int = 5,
+                            ideal_scores: List[float] = None) -> float:
+        """Calcular NDCG@K (Normalized Discounted Cumulative Gain)
+        
+        `ideal_scores` son las relevancias de todos los documentos relevantes conocidos;
+        sin ellas el ideal se calcula solo con los documentos recuperados.
+        """
         if len(relevance_scores) == 0:
             return 0.0
         
@@ -43,7 +51,7 @@ class RAGEvaluator:
             dcg += score / np.log2(i + 2)  # i+2 porque log2(1) = 0
         
         # IDCG (ideal DCG)
-        ideal_scores = sorted(relevance_scores, reverse=True)
+        ideal_scores = sorted(ideal_scores if ideal_scores is not None else relevance_scores, reverse=True)
         idcg = 0.0
         for i, score in enumerate(ideal_scores[:k]):
             idcg += score / np.log2(i + 2)
@@ -61,41 +69,69 @@ class RAGEvaluator:
         end_time = time.time()
         return end_time - start_time
     
-    def evaluate_retrieval_quality(self, test_queries: List[Dict[str, Any]], retrieval_function) -> Dict[str, float]:
-        """Evaluar calidad de recuperación"""
+    def score_ranking(self, query_data: Dict[str, Any], retrieved: List[Any], k: int = 5,
+                      known_relevant: int = None) -> Dict[str, float]:
+        """Precision, recall y NDCG de una lista recuperada, comparando ids de chunk
+        
+        `retrieved` son los dicts de `retrieve_relevant_chunks` (o ids sueltos). Para etiquetas
+        por tema, `known_relevant` es el total de chunks relevantes conocidos para la consulta.
+        """
+        grades = query_data.get('grades', {})
+        seen = set()
+        relevance_scores = []
+        for item in retrieved[:k]:
+            if isinstance(item, dict):
+                labels = matched_labels(query_data, item.get('id'), item.get('content', ''), item.get('metadata'))
+            else:
+                labels = matched_labels(query_data, item)
+            new_labels = labels - seen
+            seen.update(labels)
+            relevance_scores.append(max((float(grades.get(label, 1.0)) for label in new_labels), default=0.0))
+        
+        if 'relevant_ids' in query_data:
+            relevant = query_data['relevant_ids']
+            ideal_scores = [float(grades.get(label, 1.0)) for label in relevant]
+            n_relevant = len(relevant)
+        else:
+            n_relevant = known_relevant if known_relevant is not None else len(seen)
+            ideal_scores = [1.0] * n_relevant
+        
+        hits = sum(1 for score in relevance_scores if score > 0)
+        precision = hits / len(relevance_scores) if relevance_scores else 0.0
+        recall = len(seen) / n_relevant if n_relevant else 0.0
+        ndcg = self.calculate_ndcg_at_k(relevance_scores, k, ideal_scores=ideal_scores)
+        return {'precision': precision, 'recall': recall, 'ndcg': ndcg}
+    
+    def evaluate_retrieval_quality(self, test_queries: Iterable[Dict[str, Any]], retrieval_function,
+                                   k: int = 5) -> Dict[str, float]:
+        """Evaluar calidad de recuperación (acepta un iterador, p. ej. `iter_golden_set`)"""
         precision_scores = []
         recall_scores = []
         f1_scores = []
         ndcg_scores = []
         
         for query_data in test_queries:
-            query = query_data['query']
-            relevant_docs = query_data['relevant_docs']
-            
-            # Obtener documentos recuperados
-            retrieved_docs = retrieval_function(query)
-            
-            # Calcular métricas
-            precision = self.calculate_precision_at_k(relevant_docs, retrieved_docs)
-            recall = self.calculate_recall_at_k(relevant_docs, retrieved_docs)
-            f1 = self.calculate_f1_score(precision, recall)
+            # Obtener chunks recuperados y comparar por id (o por tema en el formato anterior)
+            retrieved = retrieval_function(query_data['query'])
+            scores = self.score_ranking(query_data, retrieved, k)
             
-            precision_scores.append(precision)
-            recall_scores.append(recall)
-            f1_scores.append(f1)
-            
-            # Calcular NDCG (asumiendo scores de relevancia)
-            relevance_scores = [1.0 if doc in relevant_docs else 0.0 for doc in retrieved_docs]
-            ndcg = self.calculate_ndcg_at_k(relevance_scores)
-            ndcg_scores.append(ndcg)
+            precision_scores.append(scores['precision'])
+            recall_scores.append(scores['recall'])
+            f1_scores.append(self.calculate_f1_score(scores['precision'], scores['recall']))
+            ndcg_scores.append(scores['ndcg'])
+        
+        if not precision_scores:
+            raise ValueError("El conjunto de evaluación no tiene consultas")
         
         return {
-            'precision@5': np.mean(precision_scores),
-            'recall@5': np.mean(recall_scores),
-            'f1@5': np.mean(f1_scores),
-            'ndcg@5': np.mean(ndcg_scores),
+            'k': k,
+            f'precision@{k}': np.mean(precision_scores),
+            f'recall@{k}': np.mean(recall_scores),
+            f'f1@{k}': np.mean(f1_scores),
+            f'ndcg@{k}': np.mean(ndcg_scores),
             'std_precision': np.std(precision_scores),
-            'std_recall': np.std(recall_scores)
+            'std_recall': np.std(recall_scores),
+            'queries': len(precision_scores)
         }
     
     def evaluate_response_quality(self, test_queries: List[Dict[str, Any]], rag_function) -> Dict[str, Any]:
@@ -164,15 +200,16 @@ class RAGEvaluator:
     def generate_evaluation_report(self, retrieval_metrics: Dict[str, float], 
                                  response_metrics: Dict[str, Any]) -> str:
         """Generar reporte de evaluación completo"""
+        k = retrieval_metrics.get('k', 5)
         report = """
 📊 REPORTE DE EVALUACIÓN DEL SISTEMA RAG
 =========================================
 
 🔍 MÉTRICAS DE RECUPERACIÓN:
-- Precision@5: {:.3f} ± {:.3f}
-- Recall@5: {:.3f} ± {:.3f}
-- F1@5: {:.3f}
-- NDCG@5: {:.3f}
+- Precision@{k}: {:.3f} ± {:.3f}
+- Recall@{k}: {:.3f} ± {:.3f}
+- F1@{k}: {:.3f}
+- NDCG@{k}: {:.3f}
 
 ⚡ MÉTRICAS DE RESPUESTA:
 - Tiempo promedio de respuesta: {:.2f}s ± {:.2f}s
@@ -180,28 +217,29 @@ class RAGEvaluator:
 - Score de relevancia promedio: {:.3f} ± {:.3f}
 
 📈 INTERPRETACIÓN:
-- Precision@5: Indica qué tan precisos son los primeros 5 resultados
-- Recall@5: Indica qué tan completa es la recuperación
-- F1@5: Balance entre precisión y recall
-- NDCG@5: Calidad del ranking considerando posición
+- Precision@{k}: Indica qué tan precisos son los primeros {k} resultados
+- Recall@{k}: Indica qué tan completa es la recuperación
+- F1@{k}: Balance entre precisión y recall
+- NDCG@{k}: Calidad del ranking considerando posición
 - Tiempo de respuesta: Eficiencia del sistema
 - Relevancia: Qué tan bien responde el modelo a las preguntas
 
 🎯 RECOMENDACIONES:
 """.format(
-            retrieval_metrics['precision@5'], retrieval_metrics['std_precision'],
-            retrieval_metrics['recall@5'], retrieval_metrics['std_recall'],
-            retrieval_metrics['f1@5'],
-            retrieval_metrics['ndcg@5'],
+            retrieval_metrics[f'precision@{k}'], retrieval_metrics['std_precision'],
+            retrieval_metrics[f'recall@{k}'], retrieval_metrics['std_recall'],
+            retrieval_metrics[f'f1@{k}'],
+            retrieval_metrics[f'ndcg@{k}'],
             response_metrics['avg_response_time'], response_metrics['std_response_time'],
             response_metrics['avg_response_length'],
-            response_metrics['avg_relevance_score'], response_metrics['std_relevance_score']
+            response_metrics['avg_relevance_score'], response_metrics['std_relevance_score'],
+            k=k
         )
         
         # Agregar recomendaciones basadas en métricas
-        if retrieval_metrics['precision@5'] < 0.7:
+        if retrieval_metrics[f'precision@{k}'] < 0.7:
             report += "- Mejorar la calidad de embeddings o ajustar parámetros de búsqueda\n"
-        if retrieval_metrics['recall@5'] < 0.6:
+        if retrieval_metrics[f'recall@{k}'] < 0.6:
             report += "- Aumentar el número de resultados recuperados o mejorar chunking\n"
         if response_metrics['avg_response_time'] > 5.0:
             report += "- Optimizar el modelo de generación o usar caching\n"
@@ -210,22 +248,36 @@ class RAGEvaluator:
         
         return report
 
-def run_evaluation(rag_system):
+def run_evaluation(rag_system, golden_set_path: str = None, max_response_queries: int = 20):
     """Ejecutar evaluación completa del sistema RAG"""
     evaluator = RAGEvaluator()
-    test_queries = evaluator.create_test_dataset()
+    golden_set_path = golden_set_path or DEFAULT_GOLDEN_SET
+    
+    # Golden set por ids de chunk si existe; si no, el dataset de ejemplo con temas
+    if os.path.exists(golden_set_path):
+        print(f"📒 Usando el golden set {golden_set_path}")
+        load_queries = lambda: iter_golden_set(golden_set_path)
+        stale = missing_ids(load_queries(), rag_system.index_manager.get().collection)
+        if stale:
+            print(f"⚠️ {len(stale)} etiquetas del golden set no existen o cambiaron de texto en el índice "
+                  f"(p. ej. {stale[0]}); revisar antes de comparar métricas")
+        dataset = golden_set_path
+    else:
+        test_queries = evaluator.create_test_dataset()
+        load_queries = lambda: iter(test_queries)
+        dataset = test_queries
     
     print("🔬 Iniciando evaluación del sistema RAG...")
     
     # Evaluar recuperación
     retrieval_metrics = evaluator.evaluate_retrieval_quality(
-        test_queries, 
+        load_queries(), 
         lambda q: rag_system.retrieve_relevant_chunks(q)
     )
     
-    # Evaluar respuestas
+    # Evaluar respuestas (generación completa: solo sobre las primeras consultas)
     response_metrics = evaluator.evaluate_response_quality(
-        test_queries,
+        list(itertools.islice(load_queries(), max_response_queries)),
         lambda q: rag_system.chat(q)
     )
     
@@ -237,11 +289,11 @@ def run_evaluation(rag_system):
     results = {
         'retrieval_metrics': retrieval_metrics,
         'response_metrics': response_metrics,
-        'test_queries': test_queries
+        'test_queries': dataset
     }
     
     with open('evaluation_results.json', 'w') as f:
-        json.dump(results, f, indent=2)
+        json.dump(results, f, indent=2, default=float)
     
     print("✅ Resultados guardados en 'evaluation_results.json'")
     
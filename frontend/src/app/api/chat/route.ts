@@ -1,8 +1,12 @@
 import { NextRequest, NextResponse } from 'next/server';
+import { CircuitOpenError, postJson } from '@/services/backendClient';
+
+// El cliente del backend usa node:http (agente keep-alive), no disponible en el runtime edge
+export const runtime = 'nodejs';
 
 export async function POST(request: NextRequest) {
   try {
-    const { message } = await request.json();
+    const { message, collection, session_id } = await request.json();
 
     if (!message) {
       return NextResponse.json(
@@ -11,36 +15,47 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // URL del backend de Python (ajusta según tu configuración)
-    const pythonBackendUrl = process.env.PYTHON_BACKEND_URL || 'http://localhost:5000';
-    
-    const response = await fetch(`${pythonBackendUrl}/chat`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({ message }),
-    });
+    // Solo se reenvían los campos opcionales presentes
+    const body: Record<string, unknown> = { message };
+    if (collection !== undefined) body.collection = collection;
+    if (session_id !== undefined) body.session_id = session_id;
 
-    if (!response.ok) {
+    const response = await postJson('/chat', body);
+
+    if (response.status < 200 || response.status >= 300) {
       throw new Error(`Error del backend: ${response.status}`);
     }
 
-    const data = await response.json();
-    
-    return NextResponse.json({ 
-      response: data.response || data.message || 'No se recibió respuesta del servidor'
+    const data = JSON.parse(response.body);
+
+    return NextResponse.json({
+      response: data.response || data.message || 'No se recibió respuesta del servidor',
+      session_id: data.session_id
     });
 
   } catch (error) {
+    if (error instanceof CircuitOpenError) {
+      // Backend saturado: fallar rápido en vez de encolar más peticiones
+      return NextResponse.json(
+        {
+          error: 'El servidor está saturado',
+          details: 'Intenta de nuevo en unos segundos'
+        },
+        {
+          status: 503,
+          headers: { 'Retry-After': Math.ceil(error.retryAfterMs / 1000).toString() }
+        }
+      );
+    }
+
     console.error('Error en la API route:', error);
-    
+
     return NextResponse.json(
-      { 
+      {
         error: 'Error interno del servidor',
         details: error instanceof Error ? error.message : 'Error desconocido'
       },
       { status: 500 }
     );
   }
-} 
\ No newline at end of file
+}
@@ -0,0 +1,192 @@
+import http from 'node:http';
+import https from 'node:https';
+
+// Cliente del backend de Python para las API routes (solo servidor, runtime nodejs).
+// Conexiones keep-alive reutilizadas, timeout, deduplicación de preguntas idénticas en vuelo
+// y circuit breaker para no seguir encolando peticiones cuando el backend está saturado.
+
+export interface BackendResult {
+  status: number;
+  headers: http.IncomingHttpHeaders;
+  body: string;
+}
+
+export class CircuitOpenError extends Error {
+  constructor(public retryAfterMs: number) {
+    super('Backend saturado: circuito abierto');
+  }
+}
+
+const envNumber = (name: string, fallback: number): number => {
+  const value = Number(process.env[name]);
+  return Number.isFinite(value) && value > 0 ? value : fallback;
+};
+
+const config = {
+  baseUrl: process.env.PYTHON_BACKEND_URL || 'http://localhost:5000',
+  maxSockets: envNumber('BACKEND_MAX_SOCKETS', 16),
+  maxFreeSockets: envNumber('BACKEND_MAX_FREE_SOCKETS', 8),
+  timeoutMs: envNumber('BACKEND_TIMEOUT_MS', 30000),
+  breakerThreshold: envNumber('BACKEND_BREAKER_THRESHOLD', 5),
+  breakerCooldownMs: envNumber('BACKEND_BREAKER_COOLDOWN_MS', 10000),
+};
+
+type BreakerState = 'closed' | 'open' | 'half-open';
+
+interface ClientState {
+  agent: http.Agent;
+  inFlight: Map<string, Promise<BackendResult>>;
+  breaker: { state: BreakerState; failures: number; openedAt: number };
+}
+
+// Un solo estado por proceso (sobrevive a las recargas del módulo en desarrollo)
+const globalState = globalThis as typeof globalThis & { __codehelperBackend?: ClientState };
+
+function clientState(): ClientState {
+  if (!globalState.__codehelperBackend) {
+    const options: http.AgentOptions = {
+      keepAlive: true,
+      keepAliveMsecs: 30000,
+      maxSockets: config.maxSockets,
+      maxFreeSockets: config.maxFreeSockets,
+    };
+    globalState.__codehelperBackend = {
+      agent: config.baseUrl.startsWith('https:') ? new https.Agent(options) : new http.Agent(options),
+      inFlight: new Map(),
+      breaker: { state: 'closed', failures: 0, openedAt: 0 },
+    };
+  }
+  return globalState.__codehelperBackend;
+}
+
+function checkBreaker(): void {
+  const { breaker } = clientState();
+  if (breaker.state === 'closed') {
+    return;
+  }
+  const elapsed = Date.now() - breaker.openedAt;
+  if (breaker.state === 'half-open' || elapsed < config.breakerCooldownMs) {
+    // Mientras la petición de prueba está en curso, las demás siguen rechazándose
+    throw new CircuitOpenError(Math.max(config.breakerCooldownMs - elapsed, 1000));
+  }
+  // Pasado el enfriamiento se deja pasar una sola petición de prueba
+  breaker.state = 'half-open';
+}
+
+function recordOutcome(ok: boolean): void {
+  const { breaker } = clientState();
+  if (ok) {
+    breaker.state = 'closed';
+    breaker.failures = 0;
+    return;
+  }
+  breaker.failures += 1;
+  if (breaker.state === 'half-open' || breaker.failures >= config.breakerThreshold) {
+    breaker.state = 'open';
+    breaker.openedAt = Date.now();
+  }
+}
+
+// 502/503/504 y errores de red indican sobrecarga o caída, no un error de la petición
+const isOverloaded = (status: number) => status === 502 || status === 503 || status === 504;
+
+function openRequest(
+  path: string,
+  payload: string,
+  headers: Record<string, string>,
+  onResponse: (response: http.IncomingMessage) => void,
+  onError: (error: Error) => void,
+  retried = false,
+): void {
+  const url = new URL(path, config.baseUrl);
+  const transport = url.protocol === 'https:' ? https : http;
+  const request = transport.request(url, {
+    method: 'POST',
+    agent: clientState().agent,
+    headers: {
+      'Content-Type': 'application/json',
+      'Content-Length': Buffer.byteLength(payload).toString(),
+      ...headers,
+    },
+  });
+
+  request.setTimeout(config.timeoutMs, () => {
+    request.destroy(new Error(`Timeout del backend (${config.timeoutMs} ms)`));
+  });
+  request.on('response', onResponse);
+  request.on('error', (error: NodeJS.ErrnoException) => {
+    // Un socket keep-alive cerrado por el servidor: reintentar una vez con uno nuevo
+    if (!retried && request.reusedSocket && error.code === 'ECONNRESET') {
+      openRequest(path, payload, headers, onResponse, onError, true);
+      return;
+    }
+    onError(error);
+  });
+  request.end(payload);
+}
+
+function sendJson(path: string, body: unknown, headers: Record<string, string>): Promise<BackendResult> {
+  checkBreaker();
+  const payload = JSON.stringify(body);
+
+  return new Promise<BackendResult>((resolve, reject) => {
+    openRequest(
+      path,
+      payload,
+      headers,
+      (response) => {
+        const chunks: Buffer[] = [];
+        response.on('data', (chunk: Buffer) => chunks.push(chunk));
+        response.on('error', (error) => {
+          recordOutcome(false);
+          reject(error);
+        });
+        response.on('end', () => {
+          const status = response.statusCode || 500;
+          recordOutcome(!isOverloaded(status));
+          resolve({ status, headers: response.headers, body: Buffer.concat(chunks).toString('utf-8') });
+        });
+      },
+      (error) => {
+        recordOutcome(false);
+        reject(error);
+      },
+    );
+  });
+}
+
+// POST con respuesta completa. Las preguntas idénticas sin sesión comparten la petición en vuelo.
+export function postJson(
+  path: string,
+  body: Record<string, unknown>,
+  headers: Record<string, string> = {},
+): Promise<BackendResult> {
+  if (body.session_id) {
+    return sendJson(path, body, headers);
+  }
+
+  const { inFlight } = clientState();
+  const key = `${path}\n${JSON.stringify(body)}\n${JSON.stringify(headers)}`;
+  const existing = inFlight.get(key);
+  if (existing) {
+    return existing;
+  }
+
+  const pending = sendJson(path, body, headers).finally(() => inFlight.delete(key));
+  inFlight.set(key, pending);
+  return pending;
+}
+
+export function backendStats() {
+  const { agent, inFlight, breaker } = clientState();
+  const count = (sockets: NodeJS.ReadOnlyDict<unknown[]>) =>
+    Object.values(sockets).reduce((total, list) => total + (list?.length || 0), 0);
+  return {
+    activeSockets: count(agent.sockets),
+    freeSockets: count(agent.freeSockets),
+    queuedRequests: count(agent.requests),
+    inFlightDeduplicated: inFlight.size,
+    breaker: breaker.state,
+    consecutiveFailures: breaker.failures,
+  };
+}
@@ -0,0 +1,133 @@
+import os
+import json
+import argparse
+from typing import List, Dict, Any, Iterable, Iterator, Set
+from embedding_cache import content_hash
+
+# Una consulta por línea:
+# {"query": "...", "relevant_ids": ["archivo.txt_3", ...], "grades": {"archivo.txt_3": 2},
+#  "relevant_hashes": {"archivo.txt_3": "<content_hash del texto>"}}
+# 'grades' es opcional (relevancia graduada para NDCG; por defecto 1).
+# Los ids son los del generador: f"{archivo}_{índice del chunk}". Son posicionales, así que
+# cambian si se re-chunkea; 'relevant_hashes' (opcional) fija cada etiqueta a su texto.
+DEFAULT_GOLDEN_SET = "./golden_set.jsonl"
+
+
+def iter_golden_set(path: str) -> Iterator[Dict[str, Any]]:
+    """Leer el golden set en streaming, validando cada línea"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: JSON inválido ({e})")
+            if not record.get("query") or not isinstance(record.get("relevant_ids"), list):
+                raise ValueError(f"{path}:{line_number}: se requieren 'query' y 'relevant_ids'")
+            if not isinstance(record.get("relevant_hashes", {}), dict):
+                raise ValueError(f"{path}:{line_number}: 'relevant_hashes' debe ser un objeto id -> hash")
+            yield record
+
+
+def write_golden_set(path: str, records: Iterable[Dict[str, Any]]) -> int:
+    """Escribir registros en formato JSONL (uno por línea)"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def covered_ids(chunk_id: str, metadata: Dict[str, Any] = None) -> Set[str]:
+    """Ids que representa un chunk: el propio y los duplicados que absorbió en la ingesta"""
+    ids = {chunk_id}
+    duplicate_ids = (metadata or {}).get("duplicate_ids")
+    if duplicate_ids:
+        ids.update(duplicate_ids.split("|"))
+    return ids
+
+
+def matched_labels(query_data: Dict[str, Any], chunk_id: str, content: str = "",
+                   metadata: Dict[str, Any] = None) -> Set[str]:
+    """Etiquetas relevantes que cubre un chunk recuperado
+
+    Con 'relevant_ids' se comparan ids de chunk; las etiquetas con hash en 'relevant_hashes'
+    se comparan por el texto del chunk (un id que ahora apunta a otro texto no cuenta). Con el
+    formato anterior ('relevant_docs', temas en texto) el chunk cuenta como relevante si algún
+    tema aparece en él.
+    """
+    if "relevant_ids" in query_data:
+        hashes = query_data.get("relevant_hashes") or {}
+        by_id = covered_ids(chunk_id, metadata) & {label for label in query_data["relevant_ids"] if label not in hashes}
+        if not hashes:
+            return by_id
+        chunk_hash = content_hash(content) if content else (metadata or {}).get("content_hash")
+        # Los duplicados absorbidos en la ingesta no tienen texto propio en el índice: cuentan por id
+        absorbed = covered_ids(chunk_id, metadata) - {chunk_id}
+        return by_id | {
+            label for label in query_data["relevant_ids"]
+            if label in hashes and (hashes[label] == chunk_hash or label in absorbed)
+        }
+
+    text = f"{(metadata or {}).get('title', '')} {content}".lower()
+    if any(topic.lower() in text for topic in query_data.get("relevant_docs", [])):
+        return {chunk_id}
+    return set()
+
+
+def missing_ids(records: Iterable[Dict[str, Any]], collection, batch_size: int = 500) -> List[str]:
+    """Ids etiquetados que no existen en la colección o cuyo texto ya no coincide con el hash
+    de la etiqueta (p. ej. tras cambiar el chunker)"""
+    hashes: Dict[str, str] = {}
+    labeled = set()
+    for record in records:
+        labeled.update(record["relevant_ids"])
+        hashes.update(record.get("relevant_hashes") or {})
+    labeled = sorted(labeled)
+
+    current: Dict[str, str] = {}
+    for start in range(0, len(labeled), batch_size):
+        batch = collection.get(ids=labeled[start:start + batch_size], include=["documents"])
+        current.update(zip(batch["ids"], batch["documents"]))
+    return [
+        chunk_id for chunk_id in labeled
+        if chunk_id not in current or (chunk_id in hashes and content_hash(current[chunk_id] or "") != hashes[chunk_id])
+    ]
+
+
+def bootstrap_golden_set(chatbot, questions: Iterable[str], top_k: int = 3,
+                         min_score: float = 0.3) -> Iterator[Dict[str, Any]]:
+    """Etiquetas provisionales con el retriever actual (revisarlas antes de usarlas como verdad)"""
+    for question in questions:
+        chunks = chatbot.retrieve_relevant_chunks(question, n_results=top_k)
+        relevant = [chunk for chunk in chunks if chunk["score"] >= min_score]
+        yield {
+            "query": question,
+            "relevant_ids": [chunk["id"] for chunk in relevant],
+            "relevant_hashes": {chunk["id"]: content_hash(chunk["content"]) for chunk in relevant},
+            "source": "bootstrap",
+            "reviewed": False
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crear un golden set provisional a partir del retriever actual")
+    parser.add_argument("--output", default=DEFAULT_GOLDEN_SET)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--min-score", type=float, default=0.3)
+    args = parser.parse_args()
+
+    from rag_chatbot import RAGChatbot
+    from warmup import warmup_questions
+
+    if os.path.exists(args.output):
+        print(f"❌ {args.output} ya existe; no se sobrescriben etiquetas revisadas")
+    else:
+        chatbot = RAGChatbot()
+        count = write_golden_set(
+            args.output, bootstrap_golden_set(chatbot, warmup_questions(), args.top_k, args.min_score)
+        )
+        print(f"✅ {count} consultas con etiquetas provisionales en {args.output} (revisar 'reviewed')")
@@ -1,173 +1,172 @@
 import os
 import re
 import json
-from typing import List, Dict, Any
+from typing import Iterable, List, Dict, Any
 from sentence_transformers import SentenceTransformer
 from chromadb import PersistentClient
 from chromadb.config import Settings
 import numpy as np
+from chunking import split_text_semantic, classify_content, chunk_file
+from chunk_dedup import MinHashDeduplicator
+from parallel_ingest import iter_chunked_source
+from compact_embeddings import CompactEmbeddingStore
+from embedding_cache import EmbeddingCache, content_hash
+from index_manager import DEFAULT_COLLECTION
+from index_versions import new_version, version_path, publish_version, prune_versions
 
 class ImprovedVectorDBGenerator:
-    def __init__(self, db_path: str = "./vector_db"):
+    def __init__(self, db_path: str = "./vector_db", deduplicate: bool = True,
+                 dedup_threshold: float = 0.85, compact_modes: List[str] = None,
+                 collection_name: str = DEFAULT_COLLECTION, embedding_cache_path: str = None,
+                 use_embedding_cache: bool = True):
         """Inicializar el generador de base vectorial mejorado"""
         self.db_path = db_path
+        self.collection_name = collection_name
         self.client = PersistentClient(path=db_path)
         
+        # Deduplicación de chunks casi idénticos (guías y cheat sheets solapados)
+        self.deduplicator = MinHashDeduplicator(threshold=dedup_threshold) if deduplicate else None
+        self.dedup_report = None
+        
+        # Modos de almacenamiento compacto a exportar (float16, int8, binary)
+        self.compact_modes = compact_modes or []
+        
         # Usar modelo especializado para código (mejor que el multilingüe genérico)
-        self.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.embedding_model_name = "all-MiniLM-L6-v2"
+        self.embedding_model = SentenceTransformer(self.embedding_model_name)
+        
+        # Caché por contenido: fuera de vector_db/ para reutilizarla entre builds y versiones
+        self.embedding_cache = None
+        if use_embedding_cache:
+            self.embedding_cache = EmbeddingCache(
+                embedding_cache_path or os.environ.get("CODEHELPER_EMBEDDING_CACHE", "./embedding_cache"),
+                self.embedding_model_name,
+                self.embedding_model.get_sentence_embedding_dimension()
+            )
         
         # Crear colección con metadatos
         self.collection = self.client.get_or_create_collection(
-            name="codehelper_csharp_improved",
+            name=self.collection_name,
             metadata={"description": "Base de datos vectorial para C# y .NET"}
         )
     
     def split_text_semantic(self, text: str, max_length: int = 500) -> List[str]:
         """División semántica mejorada del texto"""
-        chunks = []
-        
-        # Dividir por secciones principales (títulos con #)
-        sections = re.split(r'\n(?=#+\s)', text)
-        
-        for section in sections:
-            if not section.strip():
-                continue
-                
-            # Si la sección es pequeña, agregarla completa
-            if len(section) <= max_length:
-                chunks.append(section.strip())
-                continue
-            
-            # Dividir secciones grandes por párrafos
-            paragraphs = re.split(r'\n\s*\n', section)
-            current_chunk = ""
-            
-            for paragraph in paragraphs:
-                if len(current_chunk) + len(paragraph) <= max_length:
-                    current_chunk += paragraph + "\n\n"
-                else:
-                    if current_chunk.strip():
-                        chunks.append(current_chunk.strip())
-                    current_chunk = paragraph + "\n\n"
-            
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
-        
-        return chunks
+        return split_text_semantic(text, max_length)
     
     def classify_content(self, text: str) -> str:
         """Clasificar el tipo de contenido"""
-        text_lower = text.lower()
-        
-        if any(keyword in text_lower for keyword in ['using ', 'import ', 'namespace ']):
-            return "import_statement"
-        elif any(keyword in text_lower for keyword in ['class ', 'public class', 'private class']):
-            return "class_definition"
-        elif any(keyword in text_lower for keyword in ['public ', 'private ', 'static ', 'async ', 'void ', 'int ', 'string ', 'bool ']) and '(' in text and ')' in text:
-            return "method_definition"
-        elif any(keyword in text_lower for keyword in ['sqlconnection', 'sqldataadapter', 'sqldatareader', 'execute', 'query', 'database']):
-            return "database_operation"
-        elif any(keyword in text_lower for keyword in ['ado.net', 'entity framework', 'linq', 'asp.net']):
-            return "framework_concept"
-        else:
-            return "general_concept"
+        return classify_content(text)
     
     def process_file(self, file_path: str) -> List[Dict[str, Any]]:
         """Procesar un archivo y generar chunks con metadatos"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            
-            # Dividir el contenido semánticamente
-            chunks = self.split_text_semantic(content)
-            
-            documents = []
-            for i, chunk in enumerate(chunks):
-                if len(chunk.strip()) < 50:  # Ignorar chunks muy pequeños
-                    continue
-                
-                # Clasificar el contenido
-                content_type = self.classify_content(chunk)
-                
-                # Extraer título o primera línea como descripción
-                lines = chunk.split('\n')
-                title = lines[0].strip() if lines else "Sin título"
-                if title.startswith('#'):
-                    title = title.lstrip('#').strip()
-                
-                document = {
-                    "id": f"{os.path.basename(file_path)}_{i}",
-                    "text": chunk,
-                    "metadata": {
-                        "file": os.path.basename(file_path),
-                        "content_type": content_type,
-                        "title": title[:100],  # Limitar longitud del título
-                        "chunk_index": i,
-                        "length": len(chunk)
-                    }
-                }
-                documents.append(document)
-            
-            return documents
-            
-        except Exception as e:
-            print(f"Error procesando {file_path}: {e}")
-            return []
+        return chunk_file(file_path)
+    
+    def add_batch(self, documents: List[Dict[str, Any]]) -> np.ndarray:
+        """Calcular embeddings de un lote de chunks y agregarlo a la colección"""
+        ids = [doc["id"] for doc in documents]
+        texts = [doc["text"] for doc in documents]
+        metadatas = [doc["metadata"] for doc in documents]
+        
+        # Hash del texto: clave de la caché de embeddings y de los artefactos derivados
+        hashes = [content_hash(text) for text in texts]
+        for metadata, text_hash in zip(metadatas, hashes):
+            metadata["content_hash"] = text_hash
+        
+        # Embeddings explícitos con el mismo modelo que usa el chatbot en consultas;
+        # solo se calculan los textos que no estén ya en la caché
+        if self.embedding_cache is not None:
+            embeddings = self.embedding_cache.encode(
+                texts, lambda missing: self.embedding_model.encode(missing, batch_size=len(missing)), hashes
+            )
+        else:
+            embeddings = self.embedding_model.encode(texts, batch_size=len(texts))
+        
+        # Conteo de tokens por chunk para empaquetar contexto sin re-tokenizar
+        token_ids = self.embedding_model.tokenizer(texts, add_special_tokens=False)['input_ids']
+        for metadata, ids_for_chunk in zip(metadatas, token_ids):
+            metadata["token_count"] = len(ids_for_chunk)
+            metadata["tokenizer"] = self.embedding_model_name
+        
+        self.collection.add(
+            ids=ids,
+            embeddings=embeddings.tolist(),
+            documents=texts,
+            metadatas=metadatas
+        )
+        return embeddings
     
-    def generate_vector_db(self):
+    def generate_vector_db(self, data_dir: str = "./data", workers: int = None):
         """Generar la base de datos vectorial completa"""
         print("🚀 Iniciando generación de base vectorial mejorada...")
         
         # Limpiar colección existente
         try:
-            self.client.delete_collection("codehelper_csharp_improved")
+            self.client.delete_collection(self.collection_name)
             self.collection = self.client.create_collection(
-                name="codehelper_csharp_improved",
+                name=self.collection_name,
                 metadata={"description": "Base de datos vectorial para C# y .NET"}
             )
         except:
             pass
         
-        # Procesar archivos en el directorio data
-        data_dir = "./data"
+        # Procesar el directorio data (o un archivo .zip / .tar.gz / .tar.zst sin extraerlo):
+        # lectura y chunking en paralelo, solapados con los embeddings a través de una cola acotada
+        if self.deduplicator is not None:
+            self.deduplicator.reset()
+        
         all_documents = []
+        all_embeddings = []
+        pending = []
+        batch_size = 64
         
-        if os.path.exists(data_dir):
-            for filename in os.listdir(data_dir):
-                if filename.endswith('.txt'):
-                    file_path = os.path.join(data_dir, filename)
-                    print(f"Procesando: {file_path}")
-                    
-                    documents = self.process_file(file_path)
-                    all_documents.extend(documents)
+        print(f"📝 Agregando chunks de {data_dir} a la base vectorial...")
+        for file_path, documents in iter_chunked_source(data_dir, workers=workers):
+            print(f"Procesando: {file_path}")
+            
+            for document in documents:
+                # Colapsar chunks casi duplicados antes de indexar
+                if self.deduplicator is not None and not self.deduplicator.offer(document):
+                    continue
+                pending.append(document)
+            
+            # Agregar en lotes para mejor rendimiento
+            while len(pending) >= batch_size:
+                all_embeddings.append(self.add_batch(pending[:batch_size]))
+                all_documents.extend(pending[:batch_size])
+                pending = pending[batch_size:]
+        
+        if pending:
+            all_embeddings.append(self.add_batch(pending))
+            all_documents.extend(pending)
         
         if not all_documents:
             print("❌ No se encontraron documentos para procesar")
             return
         
-        # Preparar datos para ChromaDB
+        # Los chunks canónicos ya indexados reciben los orígenes de sus duplicados
+        if self.deduplicator is not None:
+            merged = self.deduplicator.merged_documents()
+            if merged:
+                self.collection.update(
+                    ids=[doc["id"] for doc in merged],
+                    metadatas=[doc["metadata"] for doc in merged]
+                )
+            self.dedup_report = self.deduplicator.report()
+            self.print_dedup_report(self.dedup_report)
+        
         ids = [doc["id"] for doc in all_documents]
-        texts = [doc["text"] for doc in all_documents]
-        metadatas = [doc["metadata"] for doc in all_documents]
-        
-        # Generar embeddings y agregar a la base de datos
-        print(f"📝 Agregando {len(all_documents)} chunks a la base vectorial...")
-        
-        # Agregar en lotes para mejor rendimiento
-        batch_size = 10
-        for i in range(0, len(all_documents), batch_size):
-            batch_ids = ids[i:i+batch_size]
-            batch_texts = texts[i:i+batch_size]
-            batch_metadatas = metadatas[i:i+batch_size]
-            
-            self.collection.add(
-                ids=batch_ids,
-                documents=batch_texts,
-                metadatas=batch_metadatas
-            )
+        
+        # Exportar índices compactos para búsqueda con menos memoria
+        for mode in self.compact_modes:
+            self.export_compact_store(ids, np.vstack(all_embeddings), mode)
         
         # Estadísticas finales
         print(f"✅ Base vectorial mejorada creada con {len(all_documents)} chunks")
+        if self.embedding_cache is not None:
+            cache_stats = self.embedding_cache.stats()
+            print(f"💾 Caché de embeddings: {cache_stats['hits']} reutilizados, "
+                  f"{cache_stats['misses']} calculados ({cache_stats['entries']} en {self.embedding_cache.path})")
         
         # Mostrar estadísticas por tipo de contenido
         content_types = {}
@@ -181,6 +180,51 @@ class ImprovedVectorDBGenerator:
         for content_type, count in content_types.items():
             print(f"     * {content_type}: {count}")
 
+    def export_compact_store(self, ids: List[str], embeddings: np.ndarray, mode: str) -> CompactEmbeddingStore:
+        """Exportar los embeddings a un índice compacto memory-mapped"""
+        path = os.path.join(self.db_path, "compact", self.collection_name, mode)
+        store = CompactEmbeddingStore.build(path, ids, embeddings, mode=mode)
+        report = store.memory_report()
+        print(f"🗜️  Índice compacto {mode}: {report['code_bytes'] / 1024:.1f} KiB de códigos "
+              f"(x{report['scan_ratio']:.1f} vs float32) + {report['rescore_bytes'] / 1024:.1f} KiB "
+              f"float32 de re-scoring, {report['disk_bytes'] / 1024:.1f} KiB en disco en {path}")
+        return store
+    
+    def print_dedup_report(self, report: Dict[str, Any]):
+        """Mostrar cuánto se redujo el índice con la deduplicación"""
+        print("🧹 Deduplicación de chunks:")
+        print(f"   - Chunks antes: {report['chunks_before']}")
+        print(f"   - Chunks después: {report['chunks_after']}")
+        print(f"   - Grupos de duplicados: {report['duplicate_groups']}")
+        print(f"   - Reducción del índice: {report['index_shrink_pct']:.1f}% "
+              f"({report['index_chars_removed']} caracteres)")
+        print(f"   - Pares de re-ranking ahorrados por consulta (estimado): "
+              f"~{report['rerank_pairs_saved_per_query_estimate']:.2f} de {report['rerank_pool_size']}")
+
+def build_index_version(base_path: str = "./vector_db", data_dir: str = "./data",
+                        publish: bool = True, keep_versions: int = None, in_use: Iterable[str] = (),
+                        **kwargs) -> str:
+    """Construir el índice en un directorio versionado nuevo y publicarlo al terminar
+
+    Con `keep_versions` se borran las versiones antiguas salvo la publicada y las de
+    `in_use` (las que tiene abiertas el servidor, p. ej. RAGChatbot.versions_in_use()).
+    """
+    version = new_version(base_path)
+    print(f"🔖 Construyendo versión de índice {version}...")
+    
+    generator = ImprovedVectorDBGenerator(db_path=version_path(base_path, version), **kwargs)
+    generator.generate_vector_db(data_dir)
+    
+    # Solo se publica un índice completo; el servidor sigue con el anterior hasta el swap
+    if publish:
+        publish_version(base_path, version)
+        print(f"✅ Versión {version} publicada en {base_path}/CURRENT")
+    if keep_versions:
+        for removed in prune_versions(base_path, keep=keep_versions, in_use=in_use):
+            print(f"🗑️  Versión antigua eliminada: {removed}")
+    
+    return version
+
 if __name__ == "__main__":
     generator = ImprovedVectorDBGenerator()
     generator.generate_vector_db() 
\ No newline at end of file
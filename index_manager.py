@@ -0,0 +1,153 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from chromadb import PersistentClient
+from chromadb.config import Settings
+from compact_embeddings import CompactEmbeddingStore
+
+DEFAULT_COLLECTION = "codehelper_csharp_improved"
+
+# Sobrecosto aproximado por vector del grafo HNSW (enlaces + ids internos)
+_HNSW_BYTES_PER_VECTOR = 16 * 2 * 4 + 64
+
+
+class IndexHandle:
+    def __init__(self, name: str, collection, compact_store: Optional[CompactEmbeddingStore],
+                 estimated_bytes: int):
+        """Colección abierta y residente junto con su índice compacto opcional"""
+        self.name = name
+        self.collection = collection
+        self.compact_store = compact_store
+        self.estimated_bytes = estimated_bytes
+        # Índice léxico de títulos, construido bajo demanda (recuperación especulativa)
+        self.title_index = None
+
+
+class IndexManager:
+    def __init__(self, db_path: str = "./vector_db", memory_budget_mb: float = None,
+                 embedding_dim: int = 384, compact_mode: str = None,
+                 default_collection: str = DEFAULT_COLLECTION):
+        """Administrador de colecciones con residencia LRU bajo un presupuesto de memoria"""
+        self.db_path = db_path
+        self.embedding_dim = embedding_dim
+        self.compact_mode = compact_mode
+        self.default_collection = default_collection
+
+        if memory_budget_mb is None and os.environ.get("CODEHELPER_INDEX_MEMORY_MB"):
+            memory_budget_mb = float(os.environ["CODEHELPER_INDEX_MEMORY_MB"])
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+
+        self.client = self.open_client(db_path)
+        # Índice anterior al último swap: las peticiones en curso pueden seguir leyéndolo
+        self.previous_db_path: Optional[str] = None
+
+        self._resident: "OrderedDict[str, IndexHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def open_client(self, db_path: str) -> PersistentClient:
+        """Abrir un cliente persistente sobre un directorio de índice"""
+        # ChromaDB descarga sus segmentos HNSW con la misma política LRU y presupuesto
+        settings = Settings(anonymized_telemetry=False)
+        if self.memory_budget_bytes:
+            settings = Settings(
+                anonymized_telemetry=False,
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=self.memory_budget_bytes
+            )
+        return PersistentClient(path=db_path, settings=settings)
+
+    def swap(self, db_path: str):
+        """Cambiar en caliente a otro directorio de índice sin recargar modelos"""
+        client = self.open_client(db_path)
+        names = [c if isinstance(c, str) else c.name for c in client.list_collections()]
+        if self.default_collection not in names:
+            raise ValueError(f"La colección {self.default_collection} no existe en {db_path}")
+
+        with self._lock:
+            # Las peticiones en curso terminan con los handles del índice anterior
+            self.client = client
+            self.previous_db_path = self.db_path
+            self.db_path = db_path
+            self._resident = OrderedDict()
+
+    def paths_in_use(self) -> List[str]:
+        """Directorios de índice abiertos: el actual y el anterior al último swap"""
+        with self._lock:
+            return [path for path in (self.db_path, self.previous_db_path) if path]
+
+    def list_collections(self) -> List[str]:
+        """Nombres de todas las colecciones disponibles en disco"""
+        return sorted(
+            collection if isinstance(collection, str) else collection.name
+            for collection in self.client.list_collections()
+        )
+
+    def compact_store_path(self, name: str) -> str:
+        """Ruta del índice compacto de una colección para el modo configurado"""
+        return os.path.join(self.db_path, "compact", name, self.compact_mode)
+
+    def estimate_bytes(self, collection, compact_store: Optional[CompactEmbeddingStore]) -> int:
+        """Estimar la memoria residente de una colección"""
+        count = collection.count()
+        if compact_store is not None:
+            # Códigos compactos más la copia float32 del re-scoring (sus páginas terminan residentes)
+            return compact_store.memory_report()["resident_bytes"] + count * _HNSW_BYTES_PER_VECTOR
+        return count * (self.embedding_dim * 4 + _HNSW_BYTES_PER_VECTOR)
+
+    def resident_bytes(self) -> int:
+        return sum(handle.estimated_bytes for handle in self._resident.values())
+
+    def get(self, name: str = None) -> IndexHandle:
+        """Obtener una colección por nombre, abriéndola bajo demanda"""
+        name = name or self.default_collection
+
+        with self._lock:
+            handle = self._resident.get(name)
+            if handle is not None:
+                # Marcar como usada recientemente
+                self._resident.move_to_end(name)
+                return handle
+
+            if name not in self.list_collections():
+                raise ValueError(f"Colección no encontrada: {name}")
+            collection = self.client.get_collection(name)
+
+            compact_store = None
+            if self.compact_mode and os.path.exists(self.compact_store_path(name)):
+                compact_store = CompactEmbeddingStore(self.compact_store_path(name))
+
+            handle = IndexHandle(name, collection, compact_store,
+                                 self.estimate_bytes(collection, compact_store))
+            self._resident[name] = handle
+            self.evict_cold(keep=name)
+            return handle
+
+    def evict_cold(self, keep: str = None):
+        """Desalojar las colecciones menos usadas hasta respetar el presupuesto"""
+        if self.memory_budget_bytes is None:
+            return
+
+        while self.resident_bytes() > self.memory_budget_bytes and len(self._resident) > 1:
+            name = next(iter(self._resident))
+            if name == keep:
+                self._resident.move_to_end(name)
+                continue
+            # Las peticiones en curso conservan su referencia al handle desalojado
+            del self._resident[name]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado de residencia para monitoreo"""
+        with self._lock:
+            return {
+                'resident': [
+                    {'name': handle.name, 'estimated_bytes': handle.estimated_bytes,
+                     'compact_mode': handle.compact_store.mode if handle.compact_store else None}
+                    for handle in self._resident.values()
+                ],
+                'resident_bytes': self.resident_bytes(),
+                'memory_budget_bytes': self.memory_budget_bytes,
+                'evictions': self.evictions
+            }
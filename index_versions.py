@@ -0,0 +1,98 @@
+import os
+import re
+import shutil
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+VERSIONS_DIR = "versions"
+POINTER_FILE = "CURRENT"
+
+# Nombres de versión válidos: un solo componente de ruta, sin separadores ni '..'
+_VERSION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def versions_root(base_path: str) -> str:
+    return os.path.join(base_path, VERSIONS_DIR)
+
+
+def list_versions(base_path: str) -> List[str]:
+    """Versiones de índice construidas, de la más antigua a la más reciente"""
+    root = versions_root(base_path)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+
+
+def current_version(base_path: str) -> Optional[str]:
+    """Versión publicada actualmente (None si se usa el layout sin versiones)"""
+    pointer = os.path.join(base_path, POINTER_FILE)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def version_path(base_path: str, version: str) -> str:
+    if not isinstance(version, str) or not _VERSION_NAME.match(version):
+        raise ValueError(f"Nombre de versión inválido: {version!r}")
+    return os.path.join(versions_root(base_path), version)
+
+
+def resolve_index_path(base_path: str, version: str = None) -> str:
+    """Ruta del índice a abrir: la versión pedida, la publicada o el directorio base"""
+    version = version or current_version(base_path)
+    if version is None:
+        # Compatibilidad con índices construidos directamente en ./vector_db
+        return base_path
+
+    # Solo versiones existentes bajo versions/ (nunca rutas absolutas ni '../')
+    if version not in list_versions(base_path):
+        raise ValueError(f"Versión de índice no encontrada: {version}")
+    return version_path(base_path, version)
+
+
+def new_version(base_path: str) -> str:
+    """Reservar un directorio vacío para una nueva versión (build blue/green)"""
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    os.makedirs(version_path(base_path, version))
+    return version
+
+
+def publish_version(base_path: str, version: str):
+    """Apuntar CURRENT a una versión de forma atómica"""
+    if not os.path.isdir(version_path(base_path, version)):
+        raise ValueError(f"Versión de índice no encontrada: {version}")
+
+    pointer = os.path.join(base_path, POINTER_FILE)
+    tmp_pointer = pointer + ".tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    # os.replace es atómico: los lectores ven la versión anterior o la nueva, nunca un archivo a medias
+    os.replace(tmp_pointer, pointer)
+
+
+def version_of_path(base_path: str, path: str) -> Optional[str]:
+    """Versión a la que corresponde un directorio de índice (None si no está bajo versions/)"""
+    root = os.path.realpath(versions_root(base_path))
+    parent, name = os.path.split(os.path.realpath(path))
+    return name if parent == root else None
+
+
+def prune_versions(base_path: str, keep: int = 3, in_use: Iterable[str] = ()) -> List[str]:
+    """Borrar versiones antiguas conservando las últimas `keep`, la publicada y las en uso
+
+    `in_use` son las versiones que tiene abiertas algún proceso (p. ej. las de
+    IndexManager.paths_in_use() en el servidor): nunca se borran, aunque sean antiguas.
+    """
+    protected = set(in_use)
+    protected.add(current_version(base_path))
+    versions = list_versions(base_path)
+    removed = []
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version in protected:
+            continue
+        shutil.rmtree(version_path(base_path, version))
+        removed.append(version)
+    return removed
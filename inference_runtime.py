@@ -0,0 +1,291 @@
+import os
+import time
+import json
+import argparse
+import threading
+import functools
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Optional, Set
+from stage_executor import StageExecutor
+from request_profiler import carry_scope
+
+# Etapas con modelos de inferencia (los que compiten por los núcleos) y la búsqueda vectorial
+STAGES = ("embed", "search", "rerank", "translate", "generate")
+
+# Workers por etapa con ejecución por etapas (CODEHELPER_STAGED=1) y sin configuración propia
+STAGED_WORKERS = {"embed": 1, "search": 2, "rerank": 1, "translate": 1, "generate": 1}
+
+
+def parse_cpu_list(spec: Optional[str]) -> Optional[Set[int]]:
+    """'0-3,6' -> {0, 1, 2, 3, 6}"""
+    if not spec:
+        return None
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus or None
+
+
+class StageConfig:
+    def __init__(self, stage: str, threads: int = None, cpus: Set[int] = None, workers: int = None):
+        """Hilos intra-op, núcleos y workers de una etapa
+
+        Hilos y afinidad se fijan por hilo, así que solo aplican con un pool dedicado: si se
+        configura alguno de los dos, la etapa tiene al menos un worker. Sin configuración la
+        etapa corre en el hilo de la petición, como antes.
+        """
+        self.stage = stage
+        self.threads = threads
+        self.cpus = cpus
+        if workers is None:
+            workers = 1 if (threads or cpus) else 0
+        self.workers = workers
+
+    @classmethod
+    def from_env(cls, stage: str) -> "StageConfig":
+        prefix = f"CODEHELPER_{stage.upper()}_"
+        threads = os.environ.get(prefix + "THREADS")
+        workers = os.environ.get(prefix + "WORKERS")
+        if workers:
+            workers = int(workers)
+        elif os.environ.get("CODEHELPER_STAGED") == "1":
+            workers = STAGED_WORKERS[stage]
+        else:
+            workers = None
+        return cls(
+            stage,
+            threads=int(threads) if threads else None,
+            cpus=parse_cpu_list(os.environ.get(prefix + "CPUS")),
+            workers=workers
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "threads": self.threads,
+            "cpus": sorted(self.cpus) if self.cpus else None,
+            "workers": self.workers
+        }
+
+
+def pin_current_thread(threads: int = None, cpus: Set[int] = None):
+    """Fijar hilos de torch y núcleos del hilo actual (inicializador de los workers)"""
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        # En Linux el pid 0 es el hilo que llama, no todo el proceso
+        os.sched_setaffinity(0, cpus)
+
+
+class StageBoundModel:
+    def __init__(self, runtime: "InferenceRuntime", stage: str, model, methods: tuple):
+        """Proxy de un modelo: los métodos indicados (y la llamada directa) corren en el pool
+        de su etapa; el resto de atributos (tokenizer, config...) se delega sin cambios"""
+        self._runtime = runtime
+        self._stage = stage
+        self._model = model
+        self._methods = set(methods)
+
+    def __getattr__(self, name):
+        attr = getattr(self._model, name)
+        if name in self._methods:
+            return functools.partial(self._runtime.run, self._stage, attr)
+        return attr
+
+    def __call__(self, *args, **kwargs):
+        return self._runtime.run(self._stage, self._model, *args, **kwargs)
+
+
+class InferenceRuntime:
+    def __init__(self, configs: Dict[str, StageConfig] = None, interop_threads: int = None,
+                 max_concurrency: int = None, admit_timeout_s: float = 5.0):
+        """Colas y workers por etapa con hilos/afinidad propios y un limitador de concurrencia
+
+        El limitador acota las peticiones en vuelo: con más peticiones que núcleos, torch
+        sobre-suscribe la CPU y el throughput cae en vez de mantenerse.
+        """
+        self.configs = configs or {stage: StageConfig(stage) for stage in STAGES}
+        self.interop_threads = interop_threads
+        if interop_threads:
+            import torch
+            try:
+                torch.set_num_interop_threads(interop_threads)
+            except RuntimeError:
+                # Solo se puede cambiar antes del primer trabajo inter-op
+                pass
+
+        self.pools: Dict[str, StageExecutor] = {}
+        for stage, config in self.configs.items():
+            if config.workers > 0:
+                self.pools[stage] = StageExecutor(
+                    stage,
+                    workers=config.workers,
+                    initializer=pin_current_thread,
+                    initargs=(config.threads, config.cpus)
+                )
+
+        self.max_concurrency = max_concurrency
+        self.admit_timeout_s = admit_timeout_s
+        self._limiter = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "InferenceRuntime":
+        interop = os.environ.get("CODEHELPER_INTEROP_THREADS")
+        max_concurrency = os.environ.get("CODEHELPER_MAX_INFLIGHT")
+        return cls(
+            configs={stage: StageConfig.from_env(stage) for stage in STAGES},
+            interop_threads=int(interop) if interop else None,
+            max_concurrency=int(max_concurrency) if max_concurrency else None,
+            admit_timeout_s=float(os.environ.get("CODEHELPER_ADMIT_TIMEOUT_S", 5.0))
+        )
+
+    def run(self, stage: str, fn: Callable, *args, **kwargs):
+        """Ejecutar en el pool de la etapa (o en el hilo actual si la etapa no tiene pool)"""
+        pool = self.pools.get(stage)
+        if pool is None:
+            return fn(*args, **kwargs)
+        # El worker hereda el perfilado de la petición (si se está perfilando)
+        return pool.submit(carry_scope(fn), *args, **kwargs).result()
+
+    def bind(self, stage: str, model, *methods: str):
+        """Envolver un modelo para que sus llamadas de inferencia usen el pool de la etapa"""
+        if model is None or stage not in self.pools:
+            return model
+        return StageBoundModel(self, stage, model, methods)
+
+    @contextmanager
+    def admit(self):
+        """Reservar un lugar para una petición; produce False si no hubo lugar a tiempo"""
+        if self._limiter is None:
+            yield True
+            return
+        if not self._limiter.acquire(timeout=self.admit_timeout_s):
+            with self._lock:
+                self.rejected += 1
+            yield False
+            return
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield True
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._limiter.release()
+
+    def stage_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Cola y tiempos de servicio de cada etapa con pool propio"""
+        return {stage: pool.stats() for stage, pool in self.pools.items()}
+
+    def reset_stage_stats(self):
+        for pool in self.pools.values():
+            pool.reset_stats()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            limiter = {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "rejected": self.rejected
+            }
+        return {
+            "interop_threads": self.interop_threads,
+            "stages": {stage: config.to_dict() for stage, config in self.configs.items()},
+            "limiter": limiter,
+            "queues": self.stage_stats()
+        }
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def benchmark_clients(request_fn: Callable[[str], Any], questions: List[str],
+                      client_counts: List[int], requests_per_client: int = 8) -> List[Dict[str, Any]]:
+    """Throughput y latencias con N clientes concurrentes (cada uno en su hilo, sin pausas)"""
+    results = []
+    for clients in client_counts:
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def client(offset: int):
+            for i in range(requests_per_client):
+                question = questions[(offset + i) % len(questions)]
+                start = time.perf_counter()
+                request_fn(question)
+                elapsed = (time.perf_counter() - start) * 1000.0
+                with lock:
+                    latencies.append(elapsed)
+
+        threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_s = time.perf_counter() - start
+
+        results.append({
+            "clients": clients,
+            "requests": len(latencies),
+            "throughput_rps": len(latencies) / wall_s if wall_s else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95)
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput vs clientes concurrentes con la configuración de hilos actual")
+    parser.add_argument("--clients", default="1,2,4,8,16", help="Números de clientes separados por comas")
+    parser.add_argument("--requests", type=int, default=8, help="Peticiones por cliente")
+    parser.add_argument("--workload", choices=["chat", "search"], default="chat")
+    parser.add_argument("--output", help="Guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    from rag_chatbot import RAGChatbot
+    from warmup import warmup_questions, warm_up
+
+    chatbot = RAGChatbot()
+    warm_up(chatbot, full_queries=1)
+    questions = warmup_questions()
+
+    def request_fn(question: str):
+        with chatbot.runtime.admit() as admitted:
+            if not admitted:
+                return None
+            if args.workload == "search":
+                return chatbot.search([question])
+            return chatbot.chat_detailed(question)
+
+    client_counts = [int(c) for c in args.clients.split(",") if c.strip()]
+    print(f"⚡ Throughput vs clientes ({args.workload}, {args.requests} peticiones por cliente)")
+    print(f"   Runtime: {json.dumps(chatbot.runtime.stats())}")
+    results = benchmark_clients(request_fn, questions, client_counts, args.requests)
+    for row in results:
+        print(f"   - {row['clients']:>3} clientes: {row['throughput_rps']:.2f} req/s, "
+              f"p50 {row['p50_ms']:.0f} ms, p95 {row['p95_ms']:.0f} ms")
+    print(f"   Rechazadas por el limitador: {chatbot.runtime.stats()['limiter']['rejected']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"runtime": chatbot.runtime.stats(), "results": results}, f, indent=2)
+        print(f"✅ Resultados guardados en {args.output}")
+    chatbot.runtime.shutdown()
@@ -0,0 +1,114 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from request_profiler import stage_scope
+
+# Degradaciones en el orden en que se aplican cuando falta presupuesto
+SKIP_TRANSLATION = "skip_translation"
+SHRINK_RERANK_POOL = "shrink_rerank_pool"
+DENSE_ONLY = "dense_only"
+
+
+class StageCostModel:
+    def __init__(self, alpha: float = 0.2, priors: Dict[str, float] = None):
+        """Costo estimado por etapa (promedio exponencial de tiempos observados, en segundos)"""
+        self.alpha = alpha
+        self.costs = {
+            'embed': 0.02,
+            'search': 0.02,
+            'rerank_pair': 0.01,  # por par (pregunta, chunk)
+            'generate': 0.005,
+            'translate': 0.5
+        }
+        self.costs.update(priors or {})
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, units: int = 1):
+        """Registrar una medición; `units` divide el costo (p. ej. pares del cross-encoder)"""
+        if units <= 0:
+            return
+        per_unit = seconds / units
+        with self._lock:
+            previous = self.costs.get(stage)
+            self.costs[stage] = per_unit if previous is None else (
+                self.alpha * per_unit + (1 - self.alpha) * previous
+            )
+
+    def estimate(self, stage: str, units: int = 1) -> float:
+        return self.costs.get(stage, 0.0) * units
+
+
+# Presupuesto explícito sin límite (a diferencia de None, ignora CHAT_LATENCY_BUDGET_MS)
+UNLIMITED_BUDGET_MS = float('inf')
+
+
+class LatencyBudget:
+    def __init__(self, budget_ms: Optional[float] = None):
+        """Presupuesto de latencia de una petición
+
+        Solo None significa sin límite: 0 es un presupuesto agotado desde el inicio (ranking
+        solo denso, sin traducción) y UNLIMITED_BUDGET_MS da un deadline infinito.
+        """
+        self.budget_ms = budget_ms
+        self.start = time.perf_counter()
+        self.deadline = self.start + budget_ms / 1000.0 if budget_ms is not None else None
+        self.degradations: List[str] = []
+
+    def remaining(self) -> float:
+        """Segundos restantes antes del deadline"""
+        if self.deadline is None:
+            return float('inf')
+        return self.deadline - time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000.0
+
+    def degrade(self, name: str):
+        if name not in self.degradations:
+            self.degradations.append(name)
+
+    def plan_optional_stages(self, costs: StageCostModel, pool_size: int, min_pool: int,
+                             extra_pairs: int = 0) -> Dict[str, object]:
+        """Decidir qué etapas opcionales caben en el presupuesto restante
+
+        Orden de degradación: omitir traducción, reducir el pool de re-ranking
+        y, como último recurso, ranking solo denso. `extra_pairs` son pares que el
+        re-ranking puntúa además del pool (los de la fuente léxica especulativa).
+        """
+        plan = {'translate': True, 'rerank': True, 'pool_size': pool_size}
+        remaining = self.remaining()
+        generate = costs.estimate('generate')
+        rerank = costs.estimate('rerank_pair', pool_size + extra_pairs)
+
+        full_cost = rerank + generate + costs.estimate('translate')
+        if remaining >= full_cost:
+            return plan
+
+        # La traducción se reporta como degradación solo si la respuesta la necesitaba
+        plan['translate'] = False
+        if remaining >= rerank + generate:
+            return plan
+
+        per_pair = costs.estimate('rerank_pair') or 1e-9
+        affordable = int((remaining - generate) / per_pair) - extra_pairs
+        if affordable >= min_pool:
+            plan['pool_size'] = min(affordable, pool_size)
+            self.degrade(SHRINK_RERANK_POOL)
+            return plan
+
+        plan['rerank'] = False
+        self.degrade(DENSE_ONLY)
+        return plan
+
+
+@contextmanager
+def stage_timer(timings: Dict[str, float], stage: str):
+    """Medir una etapa del pipeline en milisegundos"""
+    start = time.perf_counter()
+    try:
+        # Etiqueta la etapa en los tiempos de operadores de torch cuando se perfila
+        with stage_scope(stage):
+            yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000.0
@@ -0,0 +1,111 @@
+import re
+import time
+import math
+import argparse
+import unicodedata
+from collections import defaultdict
+from typing import List, Dict, Tuple, Set
+
+# Palabras sin valor para buscar por título (español e inglés)
+STOPWORDS = {
+    "que", "qué", "como", "cómo", "cual", "cuál", "para", "por", "con", "sin", "una", "uno", "unos",
+    "unas", "los", "las", "del", "entre", "sobre", "este", "esta", "estos", "estas", "explica",
+    "explicame", "dame", "muestra", "muestrame", "ejemplo", "ejemplos", "usar", "uso", "hacer",
+    "es", "son", "en", "el", "la", "de", "un", "y", "o", "the", "and", "for", "with", "what", "how"
+}
+
+_TOKEN = re.compile(r"[a-z0-9#+]+(?:\.[a-z0-9]+)*")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes ('Cómo' -> 'como')"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+_NORMALIZED_STOPWORDS = {normalize(word) for word in STOPWORDS}
+
+
+def tokenize(text: str) -> Set[str]:
+    """Términos de búsqueda: conserva 'c#', 'asp.net', 'ado.net'; descarta stopwords y cortos"""
+    return {
+        token for token in _TOKEN.findall(normalize(text))
+        if len(token) >= 2 and token not in _NORMALIZED_STOPWORDS
+    }
+
+
+class TitleIndex:
+    def __init__(self, entries: List[Tuple[str, str]]):
+        """Índice invertido de títulos de chunk (y nombre de archivo) -> ids, ponderado por IDF
+
+        Es la fuente léxica de la recuperación especulativa: se consulta sin esperar el
+        embedding de la pregunta y devuelve candidatos en microsegundos.
+        """
+        self.postings: Dict[str, List[str]] = defaultdict(list)
+        for chunk_id, text in entries:
+            for token in tokenize(text):
+                self.postings[token].append(chunk_id)
+        total = max(len(entries), 1)
+        self.idf = {token: math.log(1 + total / len(ids)) for token, ids in self.postings.items()}
+        self.size = len(entries)
+
+    @classmethod
+    def from_collection(cls, collection, batch_size: int = 1000) -> "TitleIndex":
+        entries = []
+        offset = 0
+        while True:
+            batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            if not batch["ids"]:
+                break
+            for chunk_id, metadata in zip(batch["ids"], batch["metadatas"]):
+                metadata = metadata or {}
+                file_stem = re.sub(r"\.txt$", "", metadata.get("file", ""))
+                entries.append((chunk_id, f"{metadata.get('title', '')} {file_stem.replace('_', ' ')}"))
+            offset += len(batch["ids"])
+        return cls(entries)
+
+    def match(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """Chunks cuyo título comparte más términos (ponderados por IDF) con la consulta"""
+        scores: Dict[str, float] = defaultdict(float)
+        for token in tokenize(query):
+            weight = self.idf.get(token)
+            if weight is None:
+                continue
+            for chunk_id in self.postings[token]:
+                scores[chunk_id] += weight
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n_results]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latencia de extremo a extremo con y sin recuperación especulativa")
+    parser.add_argument("--repeats", type=int, default=3, help="Pasadas por cada pregunta y modo")
+    args = parser.parse_args()
+
+    from rag_chatbot import RAGChatbot
+    from warmup import warmup_questions, warm_up
+    from inference_runtime import percentile
+
+    chatbot = RAGChatbot()
+    chatbot.speculative = True
+    warm_up(chatbot, full_queries=1)
+    questions = warmup_questions()
+
+    # Peticiones de a una (servidor ocioso), alternando modos para no sesgar por calentamiento
+    latencies = {False: [], True: []}
+    top_ids = {False: {}, True: {}}
+    for _ in range(args.repeats):
+        for question in questions:
+            for speculative in (False, True):
+                chatbot.speculative = speculative
+                start = time.perf_counter()
+                result = chatbot.chat_detailed(question)
+                latencies[speculative].append((time.perf_counter() - start) * 1000.0)
+                top_ids[speculative][question] = [chunk['id'] for chunk in result['chunks']]
+
+    print(f"⚡ Latencia por petición ({len(questions)} preguntas x {args.repeats})")
+    for speculative, label in ((False, "secuencial"), (True, "especulativa")):
+        values = latencies[speculative]
+        print(f"   - {label:<12} p50 {percentile(values, 50):.1f} ms  p95 {percentile(values, 95):.1f} ms")
+    changed = sum(top_ids[False][question] != top_ids[True][question] for question in questions)
+    print(f"   Preguntas con top distinto (candidatos léxicos nuevos): {changed}/{len(questions)}")
@@ -0,0 +1,170 @@
+import os
+import copy
+import time
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+
+# Valor que ponen los tokenizers de Hugging Face cuando el modelo no declara su ventana
+_UNSET_MAX_LENGTH = 10 ** 8
+
+
+def model_window(tokenizer, config, default: int = 1024) -> int:
+    """Ventana de contexto (tokens) que declara el modelo: posiciones de la config o, si no
+    las tiene, el model_max_length del tokenizer"""
+    for attribute in ('n_positions', 'max_position_embeddings', 'n_ctx'):
+        value = getattr(config, attribute, None)
+        if isinstance(value, int) and value > 0:
+            return value
+    length = getattr(tokenizer, 'model_max_length', None)
+    if isinstance(length, int) and 0 < length < _UNSET_MAX_LENGTH:
+        return length
+    return default
+
+
+class LocalGenerator:
+    def __init__(self, model_path: str, max_new_tokens: int = 128, max_input_tokens: int = None,
+                 repetition_penalty: float = 1.1):
+        """Backend de generación en CPU con un LM causal pequeño cargado desde disco
+
+        Sin `max_input_tokens` se usa la ventana que declara el modelo. Los hilos de torch no se
+        fijan aquí: los configura el runtime por etapa (CODEHELPER_GENERATE_THREADS).
+        """
+        self.model_path = model_path
+        self.max_new_tokens = max_new_tokens
+        self.repetition_penalty = repetition_penalty
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        self.model = AutoModelForCausalLM.from_pretrained(
+            model_path, local_files_only=True, torch_dtype=torch.float32
+        )
+        self.model.eval()
+        self.max_input_tokens = max_input_tokens or model_window(self.tokenizer, self.model.config)
+
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        # clave -> (texto del prefijo, cantidad de tokens, KV cache del prefijo)
+        self.prefix_cache: Dict[str, Any] = {}
+
+    def precompute_prefix(self, key: str, prefix_text: str):
+        """Calcular una sola vez el KV cache del prefijo fijo de un template"""
+        prefix_ids = self.tokenizer(prefix_text, return_tensors="pt")["input_ids"]
+        with torch.inference_mode():
+            outputs = self.model(input_ids=prefix_ids, use_cache=True)
+        self.prefix_cache[key] = (prefix_text, prefix_ids.shape[1], outputs.past_key_values)
+
+    def split_prompt(self, prompt: str, prefix_key: Optional[str]):
+        """Separar el prompt en (prefijo cacheado, ids restantes)"""
+        if prefix_key in self.prefix_cache:
+            prefix_text, prefix_len, past = self.prefix_cache[prefix_key]
+            if prompt.startswith(prefix_text):
+                suffix_ids = self.tokenizer(
+                    prompt[len(prefix_text):], return_tensors="pt", add_special_tokens=False
+                )["input_ids"]
+                # El cache se modifica durante la decodificación: trabajar sobre una copia
+                return prefix_len, copy.deepcopy(past), suffix_ids
+
+        input_ids = self.tokenizer(prompt, return_tensors="pt")["input_ids"]
+        return 0, None, input_ids
+
+    def generate(self, prompt: str, prefix_key: str = None, max_new_tokens: int = None) -> str:
+        """Decodificación greedy acotada reutilizando el KV cache del prefijo"""
+        text, _ = self.generate_with_stats(prompt, prefix_key, max_new_tokens)
+        return text
+
+    def generate_with_stats(self, prompt: str, prefix_key: str = None,
+                            max_new_tokens: int = None) -> Tuple[str, Dict[str, Any]]:
+        """Generar y devolver también tokens, tiempos de prefill y tokens/s"""
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        prefix_len, past, input_ids = self.split_prompt(prompt, prefix_key)
+
+        # Conservar el final del prompt (pregunta) si no cabe en la ventana del modelo
+        allowed = self.max_input_tokens - max_new_tokens - prefix_len
+        if input_ids.shape[1] > allowed:
+            input_ids = input_ids[:, -max(allowed, 1):]
+
+        start = time.perf_counter()
+        generated: List[int] = []
+        with torch.inference_mode():
+            attention_mask = torch.ones(1, prefix_len + input_ids.shape[1], dtype=torch.long)
+            outputs = self.model(input_ids=input_ids, past_key_values=past,
+                                 attention_mask=attention_mask, use_cache=True)
+            prefill_time = time.perf_counter() - start
+
+            for _ in range(max_new_tokens):
+                logits = outputs.logits[:, -1, :]
+                if generated and self.repetition_penalty != 1.0:
+                    previous = torch.tensor(sorted(set(generated)))
+                    penalized = logits[0, previous]
+                    logits[0, previous] = torch.where(
+                        penalized > 0, penalized / self.repetition_penalty, penalized * self.repetition_penalty
+                    )
+
+                next_token = int(torch.argmax(logits, dim=-1))
+                if next_token == self.tokenizer.eos_token_id:
+                    break
+                generated.append(next_token)
+
+                attention_mask = torch.cat([attention_mask, torch.ones(1, 1, dtype=torch.long)], dim=1)
+                outputs = self.model(input_ids=torch.tensor([[next_token]]),
+                                     past_key_values=outputs.past_key_values,
+                                     attention_mask=attention_mask, use_cache=True)
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            'prompt_tokens': prefix_len + input_ids.shape[1],
+            'cached_prefix_tokens': prefix_len,
+            'new_tokens': len(generated),
+            'prefill_s': prefill_time,
+            'total_s': elapsed,
+            'tokens_per_s': len(generated) / (elapsed - prefill_time) if elapsed > prefill_time else 0.0
+        }
+        return self.tokenizer.decode(generated, skip_special_tokens=True), stats
+
+    def benchmark(self, prompts: List[str], prefix_key: str = None) -> Dict[str, float]:
+        """Medir tokens/s y tiempo de prefill con y sin el prefijo cacheado"""
+        report = {}
+        for label, key in (('cached_prefix', prefix_key), ('no_cache', None)):
+            total_tokens, total_decode, total_prefill = 0, 0.0, 0.0
+            for prompt in prompts:
+                _, stats = self.generate_with_stats(prompt, key)
+                total_tokens += stats['new_tokens']
+                total_decode += stats['total_s'] - stats['prefill_s']
+                total_prefill += stats['prefill_s']
+            report[f'{label}_tokens_per_s'] = total_tokens / total_decode if total_decode else 0.0
+            report[f'{label}_avg_prefill_ms'] = 1000.0 * total_prefill / max(len(prompts), 1)
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del backend de generación local")
+    parser.add_argument("--model-path", default=os.environ.get("CODEHELPER_LLM_PATH"), required=False)
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("CODEHELPER_GENERATE_THREADS", 4)))
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    if not args.model_path:
+        parser.error("Indica --model-path o define CODEHELPER_LLM_PATH")
+
+    # Proceso dedicado al benchmark: aquí sí se fijan los hilos de todo el proceso
+    torch.set_num_threads(args.threads)
+    generator = LocalGenerator(args.model_path, max_new_tokens=args.max_new_tokens)
+
+    prefix = ("Eres un profesor experto en C# y .NET. Explica el concepto solicitado "
+              "de manera clara y directa.\n\nContexto relevante:\n")
+    generator.precompute_prefix('concept_explanation', prefix)
+    prompts = [
+        prefix + f"{context}\n\nConcepto a explicar: {question}\n\nExplicación:"
+        for context, question in [
+            ("ADO.NET es un conjunto de clases para acceder a datos.", "¿Qué es ADO.NET?"),
+            ("LINQ permite consultar colecciones con sintaxis integrada.", "¿Qué es LINQ?"),
+            ("async/await simplifica la programación asíncrona.", "¿Qué es async/await en C#?")
+        ]
+    ]
+
+    print(f"⚡ Benchmark de generación local ({args.threads} hilos)")
+    for metric, value in generator.benchmark(prompts, prefix_key='concept_explanation').items():
+        print(f"   - {metric}: {value:.2f}")
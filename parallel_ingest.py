@@ -0,0 +1,157 @@
+import os
+import time
+import queue
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Tuple, Callable
+from chunking import chunk_file
+from corpus_sources import ChunkTask, iter_chunk_tasks
+
+_END = object()
+
+
+def list_corpus_files(data_dir: str) -> List[str]:
+    """Archivos .txt del corpus en orden determinista"""
+    if not os.path.exists(data_dir):
+        return []
+    return [
+        os.path.join(data_dir, filename)
+        for filename in sorted(os.listdir(data_dir))
+        if filename.endswith('.txt')
+    ]
+
+
+def iter_chunked_tasks(tasks: Iterable[ChunkTask], workers: int = None,
+                       queue_size: int = 16) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Ejecutar tareas de chunking en un pool de procesos, entregando (nombre, chunks) en orden
+
+    Los resultados pasan por una cola acotada: si la etapa de embeddings va más lenta,
+    el productor se bloquea en vez de acumular todo el corpus en memoria.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        # Ruta serial (sin procesos): mismo orden y mismos ids
+        for name, function, args in tasks:
+            yield name, function(*args)
+        return
+
+    results: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+    def produce():
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Ventana acotada de tareas en vuelo; se consumen en el orden de envío
+                in_flight = deque()
+                for name, function, args in tasks:
+                    in_flight.append((name, pool.submit(function, *args)))
+                    if len(in_flight) >= queue_size:
+                        name, future = in_flight.popleft()
+                        results.put((name, future.result()))
+                while in_flight:
+                    name, future = in_flight.popleft()
+                    results.put((name, future.result()))
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(_END)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    while True:
+        item = results.get()
+        if item is _END:
+            break
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+    producer.join()
+
+
+def iter_chunked_files(paths: List[str], workers: int = None,
+                       queue_size: int = 16) -> Iterator[List[Dict[str, Any]]]:
+    """Leer y dividir archivos en un pool de procesos, entregando los chunks en orden"""
+    tasks = ((path, chunk_file, (path,)) for path in paths)
+    for _, documents in iter_chunked_tasks(tasks, workers=workers, queue_size=queue_size):
+        yield documents
+
+
+def iter_chunked_source(source: str, workers: int = None,
+                        queue_size: int = 16) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Chunks de un directorio o de un archivo .zip / .tar / .tar.gz / .tar.zst sin extraerlo"""
+    return iter_chunked_tasks(iter_chunk_tasks(source), workers=workers, queue_size=queue_size)
+
+
+def build_scaled_corpus(data_dir: str, target_dir: str, scale: int) -> List[str]:
+    """Replicar el corpus `scale` veces (con nombres distintos) para benchmarks"""
+    os.makedirs(target_dir, exist_ok=True)
+    for copy_index in range(scale):
+        for path in list_corpus_files(data_dir):
+            name = f"{copy_index:03d}_{os.path.basename(path)}"
+            shutil.copyfile(path, os.path.join(target_dir, name))
+    return list_corpus_files(target_dir)
+
+
+def time_ingest(paths: List[str], workers: int,
+                consume: Callable[[List[Dict[str, Any]]], None] = None) -> Dict[str, float]:
+    """Medir el tiempo de chunking (y de la etapa consumidora, si se indica)"""
+    start = time.perf_counter()
+    chunks = 0
+    for documents in iter_chunked_files(paths, workers=workers):
+        chunks += len(documents)
+        if consume is not None:
+            consume(documents)
+    elapsed = time.perf_counter() - start
+    return {'workers': workers, 'files': len(paths), 'chunks': chunks, 'seconds': elapsed}
+
+
+def benchmark_ingest(data_dir: str = "./data", scales: List[int] = (10, 100), workers: int = None,
+                     consume: Callable[[List[Dict[str, Any]]], None] = None) -> List[Dict[str, Any]]:
+    """Comparar la ingesta serial contra la paralela sobre el corpus escalado"""
+    workers = workers or os.cpu_count() or 1
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = build_scaled_corpus(data_dir, tmp_dir, scale)
+            serial = time_ingest(paths, 1, consume)
+            parallel = time_ingest(paths, workers, consume)
+            results.append({
+                'scale': scale,
+                'files': len(paths),
+                'chunks': serial['chunks'],
+                'serial_s': serial['seconds'],
+                'parallel_s': parallel['seconds'],
+                'workers': workers,
+                'speedup': serial['seconds'] / parallel['seconds'] if parallel['seconds'] else 0.0
+            })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta paralela")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--with-embeddings", action="store_true",
+                        help="Incluir la etapa de embeddings para medir el solapamiento")
+    args = parser.parse_args()
+
+    consume = None
+    if args.with_embeddings:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer("all-MiniLM-L6-v2")
+
+        def consume(documents):
+            if documents:
+                model.encode([doc["text"] for doc in documents], batch_size=64)
+
+    print("⚙️  Benchmark de ingesta: serial vs paralela")
+    for result in benchmark_ingest(args.data_dir, args.scales, args.workers, consume):
+        print(f"   - x{result['scale']} ({result['files']} archivos, {result['chunks']} chunks): "
+              f"serial {result['serial_s']:.2f}s, paralela {result['parallel_s']:.2f}s "
+              f"con {result['workers']} procesos -> {result['speedup']:.2f}x")
@@ -0,0 +1,77 @@
+from string import Formatter
+from typing import List, Dict, Any
+
+
+class PromptTemplate:
+    def __init__(self, input_variables: List[str], template: str):
+        """Template de prompt precompilado (misma API básica que el PromptTemplate de LangChain)"""
+        self.input_variables = list(input_variables)
+        self.template = template
+
+        # Pre-dividir el template en segmentos estáticos y variables una sola vez.
+        # Formatter().parse corta el texto en cada llave escapada ('{{', '}}') aunque no haya
+        # variable: esos literales se unen al segmento anterior (siempre hay len(fields) + 1)
+        formatter = Formatter()
+        self._segments: List[str] = [""]
+        self._fields: List[str] = []
+        self._renderers: List[Any] = []
+        for literal, field, format_spec, conversion in formatter.parse(template):
+            self._segments[-1] += literal
+            if field is None:
+                continue
+            self._fields.append(field)
+            self._segments.append("")
+            if format_spec or conversion:
+                self._renderers.append(
+                    lambda value, spec=format_spec, conv=conversion:
+                        formatter.format_field(formatter.convert_field(value, conv), spec)
+                )
+            else:
+                self._renderers.append(str)
+
+        unknown = set(self._fields) - set(self.input_variables)
+        if unknown:
+            raise ValueError(f"Variables no declaradas en el template: {sorted(unknown)}")
+
+        # Tokens de los segmentos estáticos por tokenizer (se calculan una vez)
+        self._static_tokens: Dict[int, int] = {}
+
+    @property
+    def prefix(self) -> str:
+        """Texto fijo antes de la primera variable (apto para KV cache)"""
+        return self._segments[0]
+
+    def format(self, **kwargs: Any) -> str:
+        """Renderizar el prompt con un único join"""
+        parts = [self._segments[0]]
+        for field, render, segment in zip(self._fields, self._renderers, self._segments[1:]):
+            parts.append(render(kwargs[field]))
+            parts.append(segment)
+        return "".join(parts)
+
+    def static_token_count(self, tokenizer=None) -> int:
+        """Tokens del texto fijo del template"""
+        key = id(tokenizer)
+        if key not in self._static_tokens:
+            self._static_tokens[key] = sum(count_tokens(segment, tokenizer) for segment in self._segments)
+        return self._static_tokens[key]
+
+    def count_tokens(self, tokenizer=None, **kwargs: Any) -> int:
+        """Tokens del prompt renderizado, sin tokenizar de nuevo la parte fija"""
+        return self.static_token_count(tokenizer) + sum(
+            count_tokens(str(kwargs[field]), tokenizer) for field in self._fields
+        )
+
+    def to_langchain(self):
+        """Convertir a un PromptTemplate de LangChain (dependencia opcional)"""
+        from langchain.prompts import PromptTemplate as LangChainPromptTemplate
+        return LangChainPromptTemplate(input_variables=self.input_variables, template=self.template)
+
+
+def count_tokens(text: str, tokenizer=None) -> int:
+    """Contar tokens con el tokenizer dado o estimarlos (~4 caracteres por token)"""
+    if not text:
+        return 0
+    if tokenizer is None:
+        return max(1, len(text) // 4)
+    return len(tokenizer.encode(text, add_special_tokens=False))
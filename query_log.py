@@ -0,0 +1,158 @@
+import os
+import re
+import json
+import math
+import queue
+import random
+import hashlib
+import threading
+from typing import Dict, Any, Iterator, Optional
+
+# Un registro por línea, claves cortas para que el log ocupe poco:
+# {"t": llegada (epoch s), "k": "chat"|"search", "q": consulta anonimizada, "c": colección,
+#  "s": sesión seudónima, "r": ruta, "ms": total, "st": {etapa: ms}, "e": código de error}
+DEFAULT_QUERY_LOG = "./query_log.jsonl"
+
+
+def _entropy(text: str) -> float:
+    """Entropía de Shannon por carácter"""
+    counts = {char: text.count(char) for char in set(text)}
+    return -sum(count / len(text) * math.log2(count / len(text)) for count in counts.values())
+
+
+def _key_or_keep(match: "re.Match") -> str:
+    """Solo es clave un token largo con clases de caracteres mezcladas y alta entropía
+
+    Hex con letras y dígitos, o mayúsculas y minúsculas en tramos cortos: un
+    identificador en PascalCase o una ruta se parte en palabras largas (≥ 4 caracteres de
+    media), una clave aleatoria en fragmentos de 2-3 caracteres.
+    """
+    token = match.group(0)
+    body = token.rstrip("=")
+    has_digit = any(char.isdigit() for char in body)
+    if re.fullmatch(r"[0-9a-fA-F]+", body) and has_digit and any(char.isalpha() for char in body):
+        return "<key>"
+    if not (any(char.isupper() for char in body) and any(char.islower() for char in body)):
+        return token
+    fragments = re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+|[_+/-]", body)
+    if len(body) / len(fragments) < 4.0 and _entropy(body) >= 3.5:
+        return "<key>"
+    return token
+
+
+# Datos personales o secretos que no deben quedar en el log. Las consultas son preguntas de
+# código: los patrones son estrechos para no alterar identificadores, versiones ni literales
+_SCRUBBERS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b"), "<ip>"),
+    (re.compile(r"(?i)\b(password|pwd|passwd|contraseña|token|apikey|api_key|secret)\s*[=:]\s*\S+"), r"\1=<secret>"),
+    (re.compile(r"\b(?:eyJ[\w-]+\.){2}[\w-]+\b"), "<jwt>"),
+    (re.compile(r"(?<![\w/+-])[A-Za-z0-9+/_-]{32,}={0,2}"), _key_or_keep),
+    (re.compile(r"(?i)(?:[a-z]:\\|/)(?:users|home)[\\/][^\\/\s]+"), "<home>"),
+    # Teléfonos: grupos separados por espacio, punto o guion (o prefijo entre paréntesis) y
+    # al menos 9 dígitos; los números sueltos, versiones y fechas se conservan
+    (re.compile(r"(?<![\w.])(?=(?:\D*\d){9})(?:\+\d{1,3}[\s.-]?)?(?:\(\d{2,4}\)[\s.-]?|\d{2,4}[\s.-])"
+                r"\d{3,4}[\s.-]\d{3,4}(?![\w.])"), "<number>"),
+]
+
+
+def scrub(text: str) -> str:
+    """Reemplazar emails, URLs, IPs, credenciales, claves, rutas de usuario y teléfonos"""
+    for pattern, replacement in _SCRUBBERS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class QueryLog:
+    def __init__(self, path: str = DEFAULT_QUERY_LOG, sample_rate: float = 1.0, max_pending: int = 10000):
+        """Log de consultas muestreado y anonimizado, solo de anexado
+
+        Las peticiones solo encolan el registro; un hilo escribe y hace flush por lotes. Si la
+        cola se llena (disco lento) los registros se descartan y se cuentan, sin frenar /chat.
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self._pending: "queue.Queue" = queue.Queue(max_pending)
+        # Sal por proceso: las sesiones se pueden agrupar en el log pero no reidentificar
+        self._salt = os.urandom(16)
+        self.written = 0
+        self.dropped = 0
+        self._writer = threading.Thread(target=self._write_loop, name="query-log", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls) -> Optional["QueryLog"]:
+        """Log en CODEHELPER_QUERY_LOG (desactivado si no se define)"""
+        path = os.environ.get("CODEHELPER_QUERY_LOG")
+        if not path:
+            return None
+        return cls(path, sample_rate=float(os.environ.get("CODEHELPER_QUERY_LOG_SAMPLE", 1.0)))
+
+    def should_log(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def session_tag(self, session_id: Optional[str]) -> Optional[str]:
+        if not session_id:
+            return None
+        return hashlib.blake2b(session_id.encode("utf-8"), key=self._salt, digest_size=6).hexdigest()
+
+    def record(self, arrival: float, kind: str, query: str, collection: str = None, session_id: str = None,
+               route: str = None, total_ms: float = None, timings_ms: Dict[str, float] = None,
+               error: int = None):
+        entry = {"t": round(arrival, 3), "k": kind, "q": scrub(query)}
+        if collection:
+            entry["c"] = collection
+        if session_id:
+            entry["s"] = self.session_tag(session_id)
+        if route:
+            entry["r"] = route
+        if total_ms is not None:
+            entry["ms"] = round(total_ms, 1)
+        if timings_ms:
+            entry["st"] = {stage: round(ms, 1) for stage, ms in timings_ms.items()}
+        if error:
+            entry["e"] = error
+        try:
+            self._pending.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                entries = [self._pending.get()]
+                # Vaciar lo que haya acumulado y escribir todo con un solo flush
+                while True:
+                    try:
+                        entries.append(self._pending.get_nowait())
+                    except queue.Empty:
+                        break
+                f.write("".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+                                for entry in entries))
+                f.flush()
+                self.written += len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "written": self.written,
+            "pending": self._pending.qsize(),
+            "dropped": self.dropped
+        }
+
+
+def iter_query_log(path: str, kind: str = None) -> Iterator[Dict[str, Any]]:
+    """Leer el log en orden; las líneas incompletas (escrituras cortadas por un reinicio) se ignoran"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if kind is None or entry.get("k") == kind:
+                yield entry
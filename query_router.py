@@ -0,0 +1,121 @@
+import threading
+from typing import List, Dict, Any, Callable
+import numpy as np
+from domain_questions import all_questions
+
+IN_DOMAIN = "in_domain"
+GREETING = "greeting"
+THANKS = "thanks"
+FAREWELL = "farewell"
+OFF_TOPIC = "off_topic"
+
+# Ejemplos por ruta: el router compara la consulta con estos prototipos en el espacio de embeddings
+PROTOTYPES: Dict[str, List[str]] = {
+    GREETING: [
+        "Hola", "Hola, ¿cómo estás?", "Buenos días", "Buenas tardes", "Buenas noches",
+        "Hey, ¿qué tal?", "Saludos", "Hello", "Hi there"
+    ],
+    THANKS: [
+        "Gracias", "Muchas gracias", "Gracias por la ayuda", "Te lo agradezco",
+        "Perfecto, gracias", "Excelente, muchas gracias", "Thanks", "Thank you"
+    ],
+    FAREWELL: [
+        "Adiós", "Hasta luego", "Nos vemos", "Chao", "Hasta la próxima", "Bye", "Goodbye"
+    ],
+    OFF_TOPIC: [
+        "¿Qué tiempo hace hoy?", "Cuéntame un chiste", "¿Quién ganó el partido de fútbol?",
+        "Dame una receta de cocina", "Recomiéndame una película", "¿Cuál es la capital de Francia?",
+        "¿Cuántos años tienes?", "¿Cuál es tu color favorito?", "Escribe un poema de amor",
+        "¿Qué hora es?", "What's the weather like?", "Tell me a joke"
+    ],
+    IN_DOMAIN: [
+        "¿Cómo declarar una variable en C#?", "Explica qué es un array en C#",
+        "Dame un ejemplo de un bucle for en C#", "¿Cómo usar Console.WriteLine?",
+        "Explica qué es ADO.NET", "¿Cómo funciona async y await?", "¿Qué es LINQ?",
+        "¿Cómo manejar excepciones en C#?", "¿Qué es una interfaz en C#?"
+    ] + all_questions()
+}
+
+CANNED_RESPONSES: Dict[str, str] = {
+    GREETING: "¡Hola! Soy CodeHelperNET, tu asistente de C# y .NET. "
+              "¿En qué tema te puedo ayudar hoy?",
+    THANKS: "¡Con gusto! Si tienes otra pregunta sobre C# o .NET, aquí estoy.",
+    FAREWELL: "¡Hasta luego! Vuelve cuando tengas más preguntas sobre C# y .NET.",
+    OFF_TOPIC: "Solo puedo ayudarte con temas de C# y .NET (lenguaje, ASP.NET Core, Entity "
+               "Framework, testing, arquitectura, cloud...). ¿Tienes alguna pregunta sobre eso?"
+}
+
+
+class RouteDecision:
+    def __init__(self, route: str, similarity: float, in_domain_similarity: float):
+        """Ruta elegida para una consulta y las similitudes que la justifican"""
+        self.route = route
+        self.similarity = similarity
+        self.in_domain_similarity = in_domain_similarity
+
+    @property
+    def skip_retrieval(self) -> bool:
+        return self.route != IN_DOMAIN
+
+
+class QueryRouter:
+    def __init__(self, encode: Callable[[List[str]], np.ndarray],
+                 prototypes: Dict[str, List[str]] = None,
+                 min_similarity: float = 0.6, margin: float = 0.05):
+        """Clasificador por prototipos sobre el embedding de la consulta (ya calculado)"""
+        self.min_similarity = min_similarity
+        self.margin = margin
+        prototypes = prototypes or PROTOTYPES
+
+        # Matriz de prototipos normalizados y la ruta de cada fila
+        self.routes: List[str] = []
+        texts: List[str] = []
+        for route, examples in prototypes.items():
+            self.routes.extend([route] * len(examples))
+            texts.extend(examples)
+        embeddings = np.asarray(encode(texts), dtype=np.float32)
+        self.prototypes = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        self._route_rows = {
+            route: np.array([i for i, r in enumerate(self.routes) if r == route])
+            for route in prototypes
+        }
+
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {route: 0 for route in prototypes}
+
+    def route(self, query_embedding: np.ndarray) -> RouteDecision:
+        """Ruta más cercana; ante la duda (similitud baja o margen corto) se recupera"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        similarities = self.prototypes @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        best = {route: float(similarities[rows].max()) for route, rows in self._route_rows.items()}
+
+        in_domain = best.get(IN_DOMAIN, 0.0)
+        candidate = max((route for route in best if route != IN_DOMAIN), key=best.get)
+        if best[candidate] >= self.min_similarity and best[candidate] - in_domain >= self.margin:
+            decision = RouteDecision(candidate, best[candidate], in_domain)
+        else:
+            decision = RouteDecision(IN_DOMAIN, in_domain, in_domain)
+
+        with self._lock:
+            self.counts[decision.route] += 1
+        return decision
+
+    def answer(self, decision: RouteDecision) -> str:
+        return CANNED_RESPONSES[decision.route]
+
+    def reset_stats(self):
+        with self._lock:
+            self.counts = {route: 0 for route in self.counts}
+
+    def stats(self) -> Dict[str, Any]:
+        """Tasa de consultas que evitaron búsqueda, re-ranking, generación y traducción"""
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        skipped = total - counts.get(IN_DOMAIN, 0)
+        return {
+            'routed_queries': total,
+            'skipped_retrieval': skipped,
+            'skip_rate': skipped / total if total else 0.0,
+            'routes': counts
+        }
@@ -1,66 +1,136 @@
 import os
 import re
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional
 from sentence_transformers import SentenceTransformer, CrossEncoder
 from chromadb import PersistentClient
-from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
-import torch
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from transformers import pipeline
 import numpy as np
+from index_manager import IndexManager, IndexHandle, DEFAULT_COLLECTION
+from index_versions import resolve_index_path, current_version, version_of_path
+from latency_budget import LatencyBudget, StageCostModel, stage_timer, SKIP_TRANSLATION
+from request_profiler import carry_scope
+from session_store import SessionStore, ChatSession
+from query_router import QueryRouter, IN_DOMAIN
+from local_generator import LocalGenerator
+from prompt_templates import PromptTemplate, count_tokens
+from context_packer import ContextPacker, PackedContext, budget_for_window
+from inference_runtime import InferenceRuntime
+from lexical_index import TitleIndex
+from answer_store import AnswerStore, PRECOMPUTED
+
+# Presupuesto de contexto (tokens) por tipo de pregunta en modo de solo recuperación
+RETRIEVAL_CONTEXT_BUDGETS = {
+    'code_example': 200,
+    'concept_explanation': 150,
+    'syntax_help': 150,
+    'general_help': 150
+}
+FALLBACK_CONTEXT_BUDGET = 75
+
+# Tokens máximos que se envían al traductor por respuesta
+TRANSLATION_BUDGET_TOKENS = 120
 
 class RAGChatbot:
-    def __init__(self, db_path: str = "./vector_db"):
+    def __init__(self, db_path: str = "./vector_db", compact_mode: str = None,
+                 collection_name: str = DEFAULT_COLLECTION, memory_budget_mb: float = None):
         """Inicializar el chatbot RAG completo"""
         self.db_path = db_path
-        self.client = PersistentClient(path=db_path)
+        self.index_version = current_version(db_path)
         
-        # Conectar a la colección mejorada
-        self.collection = self.client.get_collection("codehelper_csharp_improved")
+        # Colecciones abiertas bajo demanda; los modelos se comparten entre todas.
+        # El índice compacto opcional (float16/int8/binary) se usa para la búsqueda densa
+        self.index_manager = IndexManager(
+            db_path=resolve_index_path(db_path),
+            memory_budget_mb=memory_budget_mb,
+            compact_mode=compact_mode or os.environ.get("CODEHELPER_COMPACT_MODE"),
+            default_collection=collection_name
+        )
+        self.client = self.index_manager.client
+        
+        # Conectar a la colección mejorada (falla temprano si no existe)
+        self.index_manager.get()
+        
+        # Pools de inferencia por etapa (hilos, afinidad y límite de concurrencia desde el entorno)
+        self.runtime = InferenceRuntime.from_env()
         
         # Modelo de embeddings para recuperación
-        self.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.embedding_model = self.runtime.bind('embed', SentenceTransformer("all-MiniLM-L6-v2"), 'encode')
         
         # Cross-encoder para re-ranking (mejora la calidad de resultados)
-        self.cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+        self.cross_encoder = self.runtime.bind(
+            'rerank', CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2"), 'predict'
+        )
+        
+        # Empaquetado de contexto por tokens (conteos precalculados en la ingesta); con LLM local
+        # setup_llm lo reemplaza por uno que cuenta con el tokenizer del generador
+        self.context_packer = ContextPacker(tokenizer=self.embedding_model.tokenizer, tokenizer_name="all-MiniLM-L6-v2")
+        
+        # Templates de prompts mejorados (antes del LLM: sus prefijos se precalculan)
+        self.setup_prompts()
         
         # Modelo LLM para generación (usando un modelo más pequeño pero efectivo)
         self.setup_llm()
         
         # Traductor para respuestas
-        self.translator = pipeline("translation_en_to_es", model="Helsinki-NLP/opus-mt-en-es")
+        self.translator = self.runtime.bind(
+            'translate', pipeline("translation_en_to_es", model="Helsinki-NLP/opus-mt-en-es")
+        )
         
-        # Templates de prompts mejorados
-        self.setup_prompts()
+        # Costos observados por etapa para respetar el presupuesto de latencia
+        self.stage_costs = StageCostModel()
+        
+        # Sesiones de conversación para reutilizar contexto en preguntas de seguimiento
+        self.sessions = SessionStore()
+        
+        # Recuperación especulativa: búsqueda por títulos y su re-ranking corren mientras se
+        # calcula el embedding y se hace la búsqueda densa
+        self.speculative = os.environ.get("CODEHELPER_SPECULATIVE") == "1"
+        self._speculative_pool = None
+        self._title_index_lock = threading.Lock()
+        
+        # Respuestas precalculadas de las preguntas frecuentes (las crea `python answer_store.py`)
+        self.answer_store = AnswerStore.from_env()
+        
+        # Router previo a la recuperación: saludos y preguntas fuera de tema van a respuestas fijas
+        self.router = None
+        if os.environ.get("CODEHELPER_ROUTER", "1") != "0":
+            self.router = QueryRouter(lambda texts: self.embedding_model.encode(texts, batch_size=64))
         
     def setup_llm(self):
         """Configurar modelo LLM para generación"""
-        try:
-            # Por ahora, usar solo modo de recuperación para evitar problemas
+        self.generator = None
+        self.model = None
+        self.tokenizer = None
+        
+        # Solo se genera con un modelo local explícito; si no, modo de solo recuperación
+        model_path = os.environ.get("CODEHELPER_LLM_PATH")
+        if not model_path:
             print("Usando modo de solo recuperación para mayor estabilidad...")
-            self.model = None
-            self.tokenizer = None
             return
+        
+        try:
+            self.generator = self.runtime.bind('generate', LocalGenerator(
+                model_path,
+                max_new_tokens=int(os.environ.get("CODEHELPER_LLM_MAX_NEW_TOKENS", 128))
+            ), 'generate', 'generate_with_stats')
+            self.model = self.generator.model
+            self.tokenizer = self.generator.tokenizer
+            # El presupuesto es en tokens del LLM: los conteos de la ingesta (MiniLM) se rehacen
+            self.context_packer = ContextPacker(tokenizer=self.tokenizer, tokenizer_name=model_path)
             
-            # Código original comentado para referencia
-            # model_name = "microsoft/DialoGPT-small"
-            # self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            # self.model = AutoModelForCausalLM.from_pretrained(
-            #     model_name,
-            #     torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            #     device_map="auto" if torch.cuda.is_available() else "cpu"
-            # )
-            # 
-            # if self.tokenizer.pad_token is None:
-            #     self.tokenizer.pad_token = self.tokenizer.eos_token
-            # 
-            # self.model.config.pad_token_id = self.tokenizer.pad_token_id
+            # KV cache del texto fijo de cada template (todo lo anterior a {context})
+            for question_type, prompt_template in self.prompts.items():
+                self.generator.precompute_prefix(question_type, prompt_template.prefix)
             
         except Exception as e:
             print(f"Error cargando modelo LLM: {e}")
             print("Usando modo de solo recuperación...")
+            self.generator = None
             self.model = None
             self.tokenizer = None
+            self.context_packer = ContextPacker(tokenizer=self.embedding_model.tokenizer, tokenizer_name="all-MiniLM-L6-v2")
     
     def setup_prompts(self):
         """Configurar templates de prompts mejorados para respuestas más limpias"""
@@ -175,62 +245,284 @@ Respuesta:"""
         # Por defecto, usar ayuda general
         return 'general_help'
     
-    def retrieve_relevant_chunks(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    def swap_index(self, version: str = None) -> str:
+        """Cambiar a otra versión del índice (por defecto la publicada en CURRENT)"""
+        version = version or current_version(self.db_path)
+        self.index_manager.swap(resolve_index_path(self.db_path, version))
+        self.index_version = version
+        
+        # El índice léxico del índice nuevo se construye ahora, fuera del camino de las peticiones
+        if self.speculative:
+            self.title_index(self.index_manager.get())
+        
+        # Las respuestas precalculadas con chunks que cambiaron dejan de servirse
+        if self.answer_store is not None:
+            self.answer_store.purge_stale(lambda name: self.index_manager.get(name).collection)
+        return version
+    
+    def versions_in_use(self) -> List[str]:
+        """Versiones del índice que este proceso tiene abiertas (no se deben borrar)"""
+        versions = (version_of_path(self.db_path, path) for path in self.index_manager.paths_in_use())
+        return [version for version in versions if version]
+    
+    @property
+    def collection(self):
+        """Colección por defecto"""
+        return self.index_manager.get().collection
+    
+    def dense_candidates(self, query_embedding: np.ndarray, n_candidates: int,
+                         index: IndexHandle = None, where: Dict[str, Any] = None) -> Dict[str, List[Any]]:
+        """Obtener candidatos por búsqueda densa (en el pool de la etapa 'search' si lo hay)"""
+        return self.runtime.run('search', self.query_index, query_embedding, n_candidates,
+                                index or self.index_manager.get(), where)
+    
+    def query_index(self, query_embedding: np.ndarray, n_candidates: int,
+                    index: IndexHandle, where: Dict[str, Any] = None) -> Dict[str, List[Any]]:
+        """Búsqueda densa en el índice compacto o en ChromaDB"""
+        # El índice compacto no filtra por metadatos: con filtro se consulta ChromaDB
+        if index.compact_store is None or where:
+            results = index.collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=n_candidates,
+                where=where or None
+            )
+            return {
+                'ids': results['ids'][0],
+                'documents': results['documents'][0],
+                'metadatas': results['metadatas'][0],
+                # Distancia L2 al cuadrado entre vectores normalizados -> similitud coseno
+                'scores': [1.0 - distance / 2.0 for distance in results['distances'][0]]
+            }
+        
+        # Buscar con códigos compactos + re-scoring float32 y traer el texto de ChromaDB
+        hits = index.compact_store.search(query_embedding, n_candidates)
+        dense_scores = dict(hits)
+        ids = [chunk_id for chunk_id, _ in hits]
+        fetched = index.collection.get(ids=ids, include=['documents', 'metadatas'])
+        by_id = {
+            chunk_id: (doc, metadata)
+            for chunk_id, doc, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas'])
+        }
+        ids = [chunk_id for chunk_id in ids if chunk_id in by_id]
+        return {
+            'ids': ids,
+            'documents': [by_id[chunk_id][0] for chunk_id in ids],
+            'metadatas': [by_id[chunk_id][1] for chunk_id in ids],
+            'scores': [dense_scores[chunk_id] for chunk_id in ids]
+        }
+    
+    def rerank_candidates(self, query: str, candidates: Dict[str, List[Any]], n_results: int,
+                          pool_size: int = None, threshold: float = 0.3) -> List[Dict[str, Any]]:
+        """Re-ranking con cross-encoder sobre los mejores `pool_size` candidatos densos"""
+        pool_size = pool_size or len(candidates['documents'])
+        documents = candidates['documents'][:pool_size]
+        if len(documents) == 0:
+            return []
+        
+        pairs = [[query, doc] for doc in documents]
+        scores = self.cross_encoder.predict(pairs)
+        return self.rank_by_scores(candidates, scores, n_results, threshold)
+    
+    def rank_by_scores(self, candidates: Dict[str, List[Any]], scores, n_results: int,
+                       threshold: float = 0.3) -> List[Dict[str, Any]]:
+        """Ordenar los primeros len(scores) candidatos por score del cross-encoder"""
+        documents = candidates['documents'][:len(scores)]
+        
+        # Combinar documentos con scores
+        doc_scores = list(zip(candidates['ids'], documents, scores, candidates['metadatas']))
+        doc_scores.sort(key=lambda x: x[2], reverse=True)
+        
+        # Retornar los mejores resultados con umbral más bajo
+        top_results = []
+        for chunk_id, doc, score, metadata in doc_scores[:n_results]:
+            # Umbral más bajo para capturar más resultados útiles
+            if score > threshold:  # Reducido de 0.5 a 0.3
+                top_results.append({
+                    'id': chunk_id,
+                    'content': doc,
+                    'score': score,
+                    'metadata': metadata
+                })
+        
+        return top_results
+    
+    def dense_ranking(self, candidates: Dict[str, List[Any]], n_results: int) -> List[Dict[str, Any]]:
+        """Ranking solo denso (sin cross-encoder) usando la similitud coseno"""
+        return [
+            {'id': chunk_id, 'content': doc, 'score': score, 'metadata': metadata}
+            for chunk_id, doc, score, metadata in zip(
+                candidates['ids'], candidates['documents'], candidates['scores'], candidates['metadatas']
+            )
+        ][:n_results]
+    
+    def retrieve_relevant_chunks(self, query: str, n_results: int = 5,
+                                 collection: str = None) -> List[Dict[str, Any]]:
         """Recuperar chunks relevantes usando embeddings - MEJORADO"""
+        # Resolver la colección una sola vez para toda la consulta
+        index = self.index_manager.get(collection)
+        
         # Generar embedding de la consulta
-        query_embedding = self.embedding_model.encode(query).tolist()
+        query_embedding = self.embedding_model.encode(query)
         
         # Búsqueda inicial con más resultados
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results * 3  # Obtener más resultados para re-ranking
+        candidates = self.dense_candidates(
+            query_embedding,
+            n_results * 3,  # Obtener más resultados para re-ranking
+            index=index
         )
         
         # Re-ranking con cross-encoder
-        if len(results['documents'][0]) > 0:
-            pairs = [[query, doc] for doc in results['documents'][0]]
-            scores = self.cross_encoder.predict(pairs)
-            
-            # Combinar documentos con scores
-            doc_scores = list(zip(results['documents'][0], scores, results['metadatas'][0]))
-            doc_scores.sort(key=lambda x: x[1], reverse=True)
-            
-            # Retornar los mejores resultados con umbral más bajo
-            top_results = []
-            for doc, score, metadata in doc_scores[:n_results]:
-                # Umbral más bajo para capturar más resultados útiles
-                if score > 0.3:  # Reducido de 0.5 a 0.3
-                    top_results.append({
-                        'content': doc,
-                        'score': score,
-                        'metadata': metadata
-                    })
-            
-            return top_results
+        return self.rerank_candidates(query, candidates, n_results)
+    
+    def search(self, queries: List[str], top_k: int = 5, where: Dict[str, Any] = None,
+               rerank: bool = True, threshold: float = None, pool_size: int = None,
+               collection: str = None) -> Dict[str, Any]:
+        """Solo recuperación para un lote de consultas: embedding, búsqueda y re-ranking opcional
+        
+        No clasifica, no limpia contexto, no genera ni traduce. Los embeddings se calculan en
+        un solo batch y el cross-encoder puntúa los pares de todas las consultas en una llamada.
+        Sin `threshold`, el re-ranking usa 0.3 y el ranking denso no filtra; con umbral, ambos
+        rankings se quedan con los chunks de score estrictamente mayor (como `rank_by_scores`).
+        """
+        index = self.index_manager.get(collection)
+        timings = {}
+        pool_size = pool_size or top_k * 3
+        
+        with stage_timer(timings, 'embed'):
+            embeddings = self.embedding_model.encode(queries, batch_size=len(queries))
         
-        return []
+        with stage_timer(timings, 'search'):
+            candidates = [
+                self.dense_candidates(embedding, pool_size if rerank else top_k, index=index, where=where)
+                for embedding in embeddings
+            ]
+        
+        if rerank:
+            with stage_timer(timings, 'rerank'):
+                pools = [pool['documents'][:pool_size] for pool in candidates]
+                pairs = [[query, doc] for query, docs in zip(queries, pools) for doc in docs]
+                scores = self.cross_encoder.predict(pairs) if pairs else []
+                results, offset = [], 0
+                for pool, docs in zip(candidates, pools):
+                    results.append(self.rank_by_scores(
+                        pool, scores[offset:offset + len(docs)], top_k,
+                        0.3 if threshold is None else threshold
+                    ))
+                    offset += len(docs)
+        else:
+            results = [
+                [chunk for chunk in self.dense_ranking(pool, top_k)
+                 if threshold is None or chunk['score'] > threshold]
+                for pool in candidates
+            ]
+        
+        return {'results': results, 'collection': index.name, 'timings_ms': timings}
     
-    def clean_context(self, chunks: List[Dict[str, Any]]) -> str:
+    def title_index(self, index: IndexHandle) -> TitleIndex:
+        """Índice léxico de títulos de la colección (uno por colección abierta)
+
+        Se construye en el warm-up y en swap_index; aquí solo se construye si la colección
+        se abrió después (otra colección o reapertura tras desalojo LRU).
+        """
+        with self._title_index_lock:
+            if index.title_index is None:
+                index.title_index = TitleIndex.from_collection(index.collection)
+            return index.title_index
+    
+    def lexical_candidates(self, question: str, index: IndexHandle, n_results: int) -> Dict[str, List[Any]]:
+        """Candidatos por coincidencia de términos con los títulos (no necesita embedding)"""
+        hits = self.title_index(index).match(question, n_results)
+        if not hits:
+            return {'ids': [], 'documents': [], 'metadatas': [], 'scores': []}
+        fetched = index.collection.get(ids=[chunk_id for chunk_id, _ in hits], include=['documents', 'metadatas'])
+        by_id = {
+            chunk_id: (doc, metadata)
+            for chunk_id, doc, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas'])
+        }
+        hits = [(chunk_id, score) for chunk_id, score in hits if chunk_id in by_id]
+        return {
+            'ids': [chunk_id for chunk_id, _ in hits],
+            'documents': [by_id[chunk_id][0] for chunk_id, _ in hits],
+            'metadatas': [by_id[chunk_id][1] for chunk_id, _ in hits],
+            'scores': [score for _, score in hits]
+        }
+    
+    @property
+    def speculative_pool(self) -> ThreadPoolExecutor:
+        """Hilos de la fuente especulativa, creados con la primera petición que la usa"""
+        if self._speculative_pool is None:
+            with self._title_index_lock:
+                if self._speculative_pool is None:
+                    self._speculative_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+        return self._speculative_pool
+    
+    def score_speculative(self, question: str, index: IndexHandle, n_results: int) -> Dict[str, Any]:
+        """Fuente léxica y sus scores del cross-encoder, calculados antes de tener los densos"""
+        candidates = self.lexical_candidates(question, index, n_results)
+        scores = self.cross_encoder.predict([[question, doc] for doc in candidates['documents']]) \
+            if candidates['documents'] else []
+        return {'candidates': candidates, 'scores': dict(zip(candidates['ids'], scores))}
+    
+    def rerank_with_speculative(self, query: str, candidates: Dict[str, List[Any]], n_results: int,
+                                pool_size: int, speculative) -> Tuple[List[Dict[str, Any]], int]:
+        """Re-ranking incremental: se puntúan los candidatos densos mientras termina la fuente
+        léxica y luego se unen ambos pools sin repetir pares ya puntuados
+        
+        Los scores del cross-encoder son independientes por par, así que el resultado es el mismo
+        que puntuar el pool unido de una vez. Devuelve el ranking y los pares puntuados aquí.
+        """
+        dense_pool = {key: values[:pool_size] for key, values in candidates.items()}
+        dense_scores = self.cross_encoder.predict([[query, doc] for doc in dense_pool['documents']]) \
+            if dense_pool['documents'] else []
+        known = dict(zip(dense_pool['ids'], dense_scores))
+        scored = len(dense_pool['ids'])
+        
+        lexical = speculative.result()
+        known.update(lexical['scores'])
+        pool = self.merge_candidates(dense_pool, lexical['candidates'])
+        return self.rank_by_scores(pool, [known[chunk_id] for chunk_id in pool['ids']], n_results), scored
+    
+    def clean_chunk_text(self, content: str) -> str:
+        """Remover caracteres extraños y normalizar espacios de un chunk"""
+        content = re.sub(r'[^\w\s\.\,\;\:\!\?\(\)\[\]\{\}\+\-\*\/\=\<\>\"\'\n\r\t]', '', content)
+        content = re.sub(r'\s+', ' ', content)
+        return content.strip()
+    
+    def clean_context(self, chunks: List[Dict[str, Any]], budget_tokens: int = None) -> str:
         """Limpiar y preparar el contexto para el prompt - MEJORADO"""
-        context_parts = []
+        if budget_tokens is None:
+            return "\n\n".join(self.clean_chunk_text(chunk['content']) for chunk in self.useful_chunks(chunks))
         
-        for chunk in chunks:
-            # Limpiar el contenido del chunk
-            content = chunk['content']
-            
-            # Remover caracteres extraños y normalizar
-            content = re.sub(r'[^\w\s\.\,\;\:\!\?\(\)\[\]\{\}\+\-\*\/\=\<\>\"\'\n\r\t]', '', content)
-            content = re.sub(r'\s+', ' ', content)
-            content = content.strip()
-            
-            # Umbral más bajo para incluir más contenido
-            if chunk['score'] > 0.3 and len(content) > 20:  # Reducido de 0.5 a 0.3
-                context_parts.append(content)
+        return self.pack_context(chunks, budget_tokens).text
+    
+    def useful_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Umbral más bajo para incluir más contenido
+        return [
+            chunk for chunk in chunks
+            if chunk['score'] > 0.3 and len(self.clean_chunk_text(chunk['content'])) > 20  # Reducido de 0.5 a 0.3
+        ]
+    
+    def pack_context(self, chunks: List[Dict[str, Any]], budget_tokens: int) -> PackedContext:
+        """Contexto dentro del presupuesto junto con los ids de los chunks que entraron"""
+        # Llenar el presupuesto con los chunks completos de mayor score
+        return self.context_packer.pack(self.useful_chunks(chunks), budget_tokens, transform=self.clean_chunk_text)
+    
+    def context_budget(self, question: str, question_type: str) -> int:
+        """Tokens de contexto que necesita la etapa de generación"""
+        if self.generator is None:
+            return RETRIEVAL_CONTEXT_BUDGETS.get(question_type, RETRIEVAL_CONTEXT_BUDGETS['general_help'])
         
-        return "\n\n".join(context_parts)
+        # Con LLM: lo que queda de la ventana tras el template, la pregunta y los tokens nuevos
+        prompt_tokens = self.prompts[question_type].count_tokens(self.tokenizer, context="", question=question)
+        return budget_for_window(self.generator.max_input_tokens, self.generator.max_new_tokens, prompt_tokens)
     
-    def generate_response(self, context: str, question: str, question_type: str) -> str:
-        """Generar respuesta usando el modelo LLM o modo de recuperación - MEJORADO"""
+    def generate_response(self, context: str, question: str, question_type: str,
+                          context_tokens: int = None) -> str:
+        """Generar respuesta usando el modelo LLM o modo de recuperación - MEJORADO
+        
+        `context_tokens` es el conteo que ya calculó el empaquetado (PackedContext.tokens);
+        sin él, el contexto se tokeniza de nuevo.
+        """
         if self.model is None:
             # Modo de solo recuperación - proporcionar respuestas estructuradas
             if not context:
@@ -350,54 +642,34 @@ public class MiClase
                 else:
                     return "No encontré información específica para tu pregunta. ¿Podrías reformularla o ser más específico?"
             
+            # El contexto llega empaquetado por tokens; acotar solo si viene sin empaquetar
+            budget = RETRIEVAL_CONTEXT_BUDGETS.get(question_type, RETRIEVAL_CONTEXT_BUDGETS['general_help'])
+            if context_tokens is None:
+                context_tokens = count_tokens(context, self.context_packer.tokenizer)
+            if context_tokens > budget:
+                context = self.context_packer.pack_text(context, budget)
+            
             # Crear respuesta estructurada basada en el contexto
             if question_type == 'code_example':
                 # Para ejemplos de código - respuesta más específica
-                return f"Aquí tienes información relevante con ejemplos de código:\n\n{context[:800]}..."
+                return f"Aquí tienes información relevante con ejemplos de código:\n\n{context}"
             elif question_type == 'concept_explanation':
                 # Para explicaciones de conceptos
-                return f"Basándome en la información disponible:\n\n{context[:600]}..."
+                return f"Basándome en la información disponible:\n\n{context}"
             elif question_type == 'syntax_help':
                 # Para ayuda de sintaxis
-                return f"Información sobre sintaxis:\n\n{context[:600]}..."
+                return f"Información sobre sintaxis:\n\n{context}"
             else:
                 # Respuesta general
-                return f"Información relevante:\n\n{context[:600]}..."
+                return f"Información relevante:\n\n{context}"
         
         try:
             # Seleccionar prompt apropiado
             prompt_template = self.prompts[question_type]
             prompt = prompt_template.format(context=context, question=question)
             
-            # Tokenizar con attention mask explícito
-            inputs = self.tokenizer(
-                prompt, 
-                return_tensors="pt", 
-                truncation=True, 
-                max_length=1024,
-                padding=True,
-                return_attention_mask=True
-            )
-            
-            # Generar respuesta
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    input_ids=inputs['input_ids'],
-                    attention_mask=inputs['attention_mask'],
-                    max_length=inputs['input_ids'].shape[1] + 100,  # Respuestas más cortas
-                    temperature=0.7,  # Balance entre creatividad y precisión
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.pad_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id,
-                    repetition_penalty=1.1,  # Evitar repeticiones
-                    no_repeat_ngram_size=3   # Evitar repetición de frases
-                )
-            
-            # Decodificar respuesta
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            # Extraer solo la parte generada (después del prompt)
-            response = response[len(prompt):].strip()
+            # Generación acotada reutilizando el KV cache del prefijo del template
+            response = self.generator.generate(prompt, prefix_key=question_type).strip()
             
             # Limpiar respuesta
             response = re.sub(r'^Respuesta:\s*', '', response)
@@ -407,7 +679,7 @@ public class MiClase
             # Si la respuesta está vacía o es muy corta, usar fallback
             if not response or len(response) < 20:
                 if context:
-                    return f"Basándome en la información disponible:\n\n{context[:300]}..."
+                    return f"Basándome en la información disponible:\n\n{self.context_packer.pack_text(context, FALLBACK_CONTEXT_BUDGET)}"
                 else:
                     return "No pude generar una respuesta específica. ¿Podrías reformular tu pregunta?"
             
@@ -416,44 +688,223 @@ public class MiClase
         except Exception as e:
             print(f"Error en generación: {e}")
             if context:
-                return f"Basándome en la información disponible:\n\n{context[:300]}..."
+                return f"Basándome en la información disponible:\n\n{self.context_packer.pack_text(context, FALLBACK_CONTEXT_BUDGET)}"
             else:
                 return "Error generando respuesta. ¿Podrías reformular tu pregunta?"
     
+    def needs_translation(self, response: str) -> bool:
+        """Detectar si la respuesta no está en español"""
+        spanish_words = ['es', 'son', 'está', 'están', 'para', 'con', 'por', 'que', 'como', 'cuando', 'una', 'las', 'los']
+        spanish_count = sum(1 for word in spanish_words if word in response.lower())
+        
+        # Si tiene al menos 2 palabras en español, no hace falta traducir
+        return spanish_count < 2
+    
     def translate_response(self, response: str) -> str:
         """Traducir respuesta al español si es necesario"""
         try:
             # Detectar si ya está en español
-            spanish_words = ['es', 'son', 'está', 'están', 'para', 'con', 'por', 'que', 'como', 'cuando', 'una', 'las', 'los']
-            spanish_count = sum(1 for word in spanish_words if word in response.lower())
-            
-            if spanish_count >= 2:  # Si tiene al menos 2 palabras en español
+            if not self.needs_translation(response):
                 return response
             
-            # Traducir solo si es necesario
-            translated = self.translator(response[:400])[0]["translation_text"]
+            # Traducir solo oraciones completas dentro del presupuesto del traductor
+            to_translate = self.context_packer.pack_text(
+                response, TRANSLATION_BUDGET_TOKENS, tokenizer=self.translator.tokenizer
+            )
+            translated = self.translator(to_translate)[0]["translation_text"]
             return translated
         except:
             return response
     
-    def chat(self, question: str) -> str:
+    def chat(self, question: str, collection: str = None, session_id: str = None) -> str:
         """Proceso completo de chat RAG - versión MEJORADA"""
+        return self.chat_detailed(question, collection=collection, session_id=session_id)['response']
+    
+    def merge_candidates(self, *sources: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        """Unir listas de candidatos sin repetir ids, respetando el orden de llegada"""
+        merged = {'ids': [], 'documents': [], 'metadatas': [], 'scores': []}
+        seen = set()
+        for source in sources:
+            for chunk_id, doc, metadata, score in zip(
+                source['ids'], source['documents'], source['metadatas'], source['scores']
+            ):
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                merged['ids'].append(chunk_id)
+                merged['documents'].append(doc)
+                merged['metadatas'].append(metadata)
+                merged['scores'].append(score)
+        return merged
+    
+    def chat_detailed(self, question: str, collection: str = None,
+                      latency_budget_ms: float = None, n_results: int = 3,
+                      session_id: str = None, use_answer_store: bool = True) -> Dict[str, Any]:
+        """Chat RAG con presupuesto de latencia; reporta degradaciones y tiempos por etapa"""
+        if latency_budget_ms is None and os.environ.get("CHAT_LATENCY_BUDGET_MS"):
+            latency_budget_ms = float(os.environ["CHAT_LATENCY_BUDGET_MS"])
+        budget = LatencyBudget(latency_budget_ms)
+        timings = {}
+        
+        index = self.index_manager.get(collection)
+        session = self.sessions.get_or_create(session_id) if session_id else None
+        
+        # Pregunta frecuente con respuesta precalculada y vigente: se sirve sin pipeline
+        # (no en sesiones, donde el contexto del turno anterior cambia la respuesta)
+        if self.answer_store is not None and use_answer_store and session is None:
+            with stage_timer(timings, 'answer_store'):
+                stored = self.answer_store.get(
+                    question, index.name, lambda name: self.index_manager.get(name).collection
+                )
+            if stored is not None:
+                return {
+                    'response': stored['response'],
+                    'question_type': stored['question_type'],
+                    'route': PRECOMPUTED,
+                    'chunks': stored['chunks'],
+                    'context_chunk_ids': [chunk['id'] for chunk in stored['chunks']],
+                    'extractive': False,
+                    'session_id': None,
+                    'follow_up': False,
+                    'degradations': budget.degradations,
+                    'latency_budget_ms': latency_budget_ms,
+                    'timings_ms': timings,
+                    'total_ms': budget.elapsed_ms()
+                }
+        
+        if session is None:
+            return self.answer_turn(question, index, None, budget, timings, latency_budget_ms, n_results)
+        
+        # Peticiones concurrentes con el mismo session_id se atienden de a una: leer el último
+        # turno, decidir si es seguimiento y registrar el turno nuevo no se intercalan
+        with session.lock:
+            return self.answer_turn(question, index, session, budget, timings, latency_budget_ms, n_results)
+    
+    def answer_turn(self, question: str, index: IndexHandle, session: Optional[ChatSession],
+                    budget: LatencyBudget, timings: Dict[str, float], latency_budget_ms: Optional[float],
+                    n_results: int) -> Dict[str, Any]:
+        """Pipeline completo de una pregunta (con la sesión, si la hay, ya bloqueada)"""
+        # Fuente léxica especulativa: arranca antes de clasificar y de calcular el embedding.
+        # Un seguimiento no la usa, así que no se lanza si la sesión ya tiene turnos
+        speculative = None
+        if self.speculative and (session is None or session.last_turn is None):
+            speculative = self.speculative_pool.submit(
+                carry_scope(self.score_speculative), question, index, n_results
+            )
+        
         # 1. Clasificar pregunta
-        question_type = self.classify_question(question)
+        with stage_timer(timings, 'classify'):
+            question_type = self.classify_question(question)
+        
+        # 2. Recuperar contexto relevante (embedding + búsqueda densa son obligatorios)
+        with stage_timer(timings, 'embed'):
+            query_embedding = self.embedding_model.encode(question)
         
-        # 2. Recuperar contexto relevante
-        relevant_chunks = self.retrieve_relevant_chunks(question, n_results=3)
+        follow_up = session is not None and session.is_follow_up(question, query_embedding, index.name)
+        
+        # Consultas triviales o fuera de dominio: respuesta fija sin búsqueda ni re-ranking
+        route = self.router.route(query_embedding) if self.router is not None and not follow_up else None
+        if route is not None and route.skip_retrieval:
+            if speculative is not None:
+                speculative.cancel()
+            self.stage_costs.observe('embed', timings['embed'] / 1000.0)
+            return {
+                'response': self.router.answer(route),
+                'question_type': question_type,
+                'route': route.route,
+                'chunks': [],
+                'context_chunk_ids': [],
+                'extractive': False,
+                'session_id': session.session_id if session else None,
+                'follow_up': False,
+                'degradations': budget.degradations,
+                'latency_budget_ms': latency_budget_ms,
+                'timings_ms': timings,
+                'total_ms': budget.elapsed_ms()
+            }
+        
+        rerank_query = question
+        with stage_timer(timings, 'search'):
+            if follow_up:
+                # Seguimiento: re-rankear solo los mejores chunks del turno anterior más una
+                # recuperación pequeña con la consulta combinada (a lo sumo el pool de una consulta
+                # nueva), en vez de pagar la búsqueda completa o todo el pool de la sesión
+                last_turn = session.last_turn
+                rerank_query = f"{last_turn.question} {question}"
+                combined_embedding = query_embedding / (np.linalg.norm(query_embedding) + 1e-12) \
+                    + last_turn.query_embedding / (np.linalg.norm(last_turn.query_embedding) + 1e-12)
+                fresh = self.dense_candidates(combined_embedding, n_results, index=index)
+                merged = self.merge_candidates(fresh, session.cached_candidates(last_turn.chunk_ids))
+                candidates = {key: values[:n_results * 3] for key, values in merged.items()}
+            else:
+                candidates = self.dense_candidates(query_embedding, n_results * 3, index=index)
+        
+        # Las etapas opcionales se recortan según el presupuesto restante
+        # Los pares léxicos que la fuente especulativa todavía no puntuó también cuestan
+        plan = budget.plan_optional_stages(
+            self.stage_costs, len(candidates['documents']), min_pool=n_results,
+            extra_pairs=n_results if speculative is not None and not speculative.done() else 0
+        )
+        if not plan['rerank'] and speculative is not None:
+            speculative.cancel()
+        if plan['rerank']:
+            with stage_timer(timings, 'rerank'):
+                if speculative is not None:
+                    relevant_chunks, scored_pairs = self.rerank_with_speculative(
+                        rerank_query, candidates, n_results, plan['pool_size'], speculative
+                    )
+                else:
+                    relevant_chunks = self.rerank_candidates(
+                        rerank_query, candidates, n_results, pool_size=plan['pool_size']
+                    )
+                    scored_pairs = min(plan['pool_size'], len(candidates['documents']))
+            self.stage_costs.observe('rerank_pair', timings['rerank'] / 1000.0, scored_pairs)
+        else:
+            relevant_chunks = self.dense_ranking(candidates, n_results)
+        
+        if session is not None:
+            session.add_turn(question, query_embedding, [chunk['id'] for chunk in relevant_chunks],
+                             candidates, index.name)
         
         # 3. Preparar contexto limpio
-        context = self.clean_context(relevant_chunks)
+        with stage_timer(timings, 'clean'):
+            packed = self.pack_context(relevant_chunks, self.context_budget(question, question_type))
+            context = packed.text
         
         # 4. Generar respuesta
-        response = self.generate_response(context, question, question_type)
+        with stage_timer(timings, 'generate'):
+            response = self.generate_response(context, question, question_type, packed.tokens)
+        
+        # 5. Traducir si es necesario (y si todavía hay presupuesto)
+        translated = False
+        if self.needs_translation(response):
+            if plan['translate'] and budget.remaining() >= self.stage_costs.estimate('translate'):
+                with stage_timer(timings, 'translate'):
+                    response = self.translate_response(response)
+                translated = True
+                self.stage_costs.observe('translate', timings['translate'] / 1000.0)
+            else:
+                budget.degrade(SKIP_TRANSLATION)
         
-        # 5. Traducir si es necesario
-        response = self.translate_response(response)
+        for stage in ('embed', 'search', 'generate'):
+            self.stage_costs.observe(stage, timings[stage] / 1000.0)
         
-        return response
+        return {
+            'response': response,
+            'question_type': question_type,
+            'route': route.route if route is not None else IN_DOMAIN,
+            'chunks': relevant_chunks,
+            # Chunks que entraron al contexto y si la respuesta es solo su texto extraído
+            # (sin LLM ni traducción: el cliente la puede reconstruir desde los chunks)
+            'context_chunk_ids': packed.chunk_ids,
+            'extractive': self.generator is None and not translated,
+            'session_id': session.session_id if session else None,
+            'follow_up': follow_up,
+            'degradations': budget.degradations,
+            'latency_budget_ms': latency_budget_ms,
+            'timings_ms': timings,
+            'total_ms': budget.elapsed_ms()
+        }
     
     def interactive_chat(self):
         """Modo interactivo de chat - versión limpia"""
@@ -461,6 +912,9 @@ public class MiClase
         print("Escribe 'salir' para terminar")
         print("-" * 40)
         
+        # Sesión local para que las preguntas de seguimiento reutilicen el contexto
+        session_id = self.sessions.get_or_create().session_id
+        
         while True:
             try:
                 question = input("\n👤 Tú: ").strip()
@@ -473,7 +927,7 @@ public class MiClase
                     continue
                 
                 # Procesar pregunta y mostrar respuesta limpia
-                response = self.chat(question)
+                response = self.chat(question, session_id=session_id)
                 print(f"\n🤖 {response}")
                 
             except KeyboardInterrupt:
@@ -0,0 +1,219 @@
+import json
+import time
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional
+from query_log import iter_query_log
+from inference_runtime import percentile
+
+
+class HttpTarget:
+    def __init__(self, base_url: str, timeout_s: float = 60.0):
+        """Servidor en ejecución (api_server.py)"""
+        self.base_url = base_url.rstrip("/")
+        self.timeout_s = timeout_s
+
+    def chat(self, message: str, collection: str = None, session_id: str = None) -> Tuple[int, Dict[str, Any]]:
+        body = {"message": message}
+        if collection:
+            body["collection"] = collection
+        if session_id is not None:
+            body["session_id"] = session_id
+        return self._post("/chat", body)
+
+    def search(self, query: str, collection: str = None) -> Tuple[int, Dict[str, Any]]:
+        body = {"query": query}
+        if collection:
+            body["collection"] = collection
+        return self._post("/search", body)
+
+    def _post(self, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        request = urllib.request.Request(
+            f"{self.base_url}{path}", data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Accept": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_s) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+        except (urllib.error.URLError, TimeoutError):
+            return 0, {}
+
+
+class InProcessTarget:
+    def __init__(self, chatbot):
+        """RAGChatbot en este mismo proceso (sin HTTP ni serialización)"""
+        self.chatbot = chatbot
+
+    def chat(self, message: str, collection: str = None, session_id: str = None) -> Tuple[int, Dict[str, Any]]:
+        if session_id == "":
+            session_id = self.chatbot.sessions.get_or_create().session_id
+        try:
+            with self.chatbot.runtime.admit() as admitted:
+                if not admitted:
+                    return 503, {}
+                return 200, self.chatbot.chat_detailed(message, collection=collection, session_id=session_id)
+        except Exception:
+            return 500, {}
+
+    def search(self, query: str, collection: str = None) -> Tuple[int, Dict[str, Any]]:
+        try:
+            with self.chatbot.runtime.admit() as admitted:
+                if not admitted:
+                    return 503, {}
+                return 200, self.chatbot.search([query], collection=collection)
+        except Exception:
+            return 500, {}
+
+
+def distribution(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values)
+    }
+
+
+def replay(entries: List[Dict[str, Any]], target, speed: float = 1.0, workers: int = 32) -> Dict[str, Any]:
+    """Reproducir el log respetando los intervalos de llegada (divididos por `speed`)
+
+    Es de lazo abierto: cada consulta sale a su hora aunque las anteriores no hayan
+    terminado, como el tráfico real. Con speed=0 se envían todas sin esperar. Las consultas
+    de una misma sesión del log comparten una sesión nueva en el destino. Las de `/search`
+    se envían de a una (el log guarda una entrada por consulta del lote).
+    """
+    entries = sorted(entries, key=lambda entry: entry["t"])
+    results: List[Dict[str, Any]] = []
+    sessions: Dict[str, str] = {}
+    lock = threading.Lock()
+
+    def send(entry: Dict[str, Any], due: float, start: float):
+        kind = entry.get("k", "chat")
+        tag = entry.get("s") if kind == "chat" else None
+        with lock:
+            session_id = sessions.get(tag, "") if tag else None
+        sent = time.perf_counter()
+        if kind == "search":
+            status, body = target.search(entry["q"], entry.get("c"))
+        else:
+            status, body = target.chat(entry["q"], entry.get("c"), session_id)
+        latency = (time.perf_counter() - sent) * 1000.0
+        if tag and session_id == "" and body.get("session_id"):
+            with lock:
+                sessions.setdefault(tag, body["session_id"])
+        with lock:
+            results.append({
+                "kind": kind,
+                "status": status,
+                "latency_ms": latency,
+                "lag_ms": (sent - start - due) * 1000.0,
+                "route": "search" if kind == "search" else body.get("route"),
+                "timings_ms": body.get("timings_ms") or {},
+                "logged_ms": entry.get("ms")
+            })
+
+    t0 = entries[0]["t"] if entries else 0.0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for entry in entries:
+            due = (entry["t"] - t0) / speed if speed > 0 else 0.0
+            delay = due - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, entry, due, start)
+    duration = time.perf_counter() - start
+
+    ok = [result for result in results if result["status"] == 200]
+    statuses: Dict[str, int] = {}
+    kinds: Dict[str, int] = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+        kinds[result["kind"]] = kinds.get(result["kind"], 0) + 1
+    by_route: Dict[str, List[float]] = {}
+    stages: Dict[str, List[float]] = {}
+    for result in ok:
+        by_route.setdefault(result["route"] or "unknown", []).append(result["latency_ms"])
+        for stage, ms in result["timings_ms"].items():
+            stages.setdefault(stage, []).append(ms)
+
+    return {
+        "requests": len(results),
+        "statuses": statuses,
+        "kinds": kinds,
+        "speed": speed,
+        "duration_s": duration,
+        "achieved_rps": len(results) / duration if duration else 0.0,
+        "latency_ms": distribution([result["latency_ms"] for result in ok]),
+        "logged_latency_ms": distribution([result["logged_ms"] for result in ok if result["logged_ms"] is not None]),
+        "schedule_lag_ms": distribution([result["lag_ms"] for result in results]),
+        "by_route_ms": {route: distribution(values) for route, values in by_route.items()},
+        "stage_ms": {stage: distribution(values) for stage, values in stages.items()}
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    latency = report["latency_ms"]
+    print(f"⚡ {report['requests']} consultas en {report['duration_s']:.1f} s "
+          f"({report['achieved_rps']:.2f} req/s, velocidad x{report['speed']:g})")
+    print(f"   Estados: {report['statuses']}  Tipos: {report.get('kinds', {})}")
+    if latency:
+        print(f"   Latencia: p50 {latency['p50']:.0f} ms  p90 {latency['p90']:.0f}  p95 {latency['p95']:.0f}  "
+              f"p99 {latency['p99']:.0f}  máx {latency['max']:.0f}")
+    if report["logged_latency_ms"]:
+        print(f"   Latencia registrada en el log: p50 {report['logged_latency_ms']['p50']:.0f} ms  "
+              f"p95 {report['logged_latency_ms']['p95']:.0f} ms")
+    for stage, values in sorted(report["stage_ms"].items()):
+        print(f"   - {stage:<12} p50 {values['p50']:.1f} ms  p95 {values['p95']:.1f} ms")
+    if baseline and baseline.get("latency_ms") and latency:
+        for key in ("p50", "p95", "p99"):
+            before, after = baseline["latency_ms"][key], latency[key]
+            change = (after - before) / before * 100.0 if before else 0.0
+            print(f"   {key} vs base: {before:.0f} -> {after:.0f} ms ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproducir un log de consultas y medir la distribución de latencias")
+    parser.add_argument("--log", required=True, help="Log escrito con CODEHELPER_QUERY_LOG")
+    parser.add_argument("--target", default="http://localhost:5000", help="URL del servidor")
+    parser.add_argument("--in-process", action="store_true", help="Usar un RAGChatbot local en vez de HTTP")
+    parser.add_argument("--speed", type=float, default=1.0, help="Factor de velocidad (2 = el doble de rápido, 0 = sin pausas)")
+    parser.add_argument("--kind", choices=["chat", "search"], help="Reproducir solo un tipo de consulta (por defecto, todas)")
+    parser.add_argument("--limit", type=int, help="Máximo de consultas a reproducir")
+    parser.add_argument("--workers", type=int, default=32, help="Consultas simultáneas como máximo")
+    parser.add_argument("--baseline", help="Reporte JSON de otro build para comparar")
+    parser.add_argument("--output", help="Guardar el reporte en JSON")
+    args = parser.parse_args()
+
+    entries = list(iter_query_log(args.log, kind=args.kind))
+    if args.limit:
+        entries = entries[:args.limit]
+
+    if args.in_process:
+        from rag_chatbot import RAGChatbot
+        from warmup import warm_up
+        chatbot = RAGChatbot()
+        warm_up(chatbot, full_queries=1)
+        target = InProcessTarget(chatbot)
+    else:
+        target = HttpTarget(args.target)
+
+    report = replay(entries, target, speed=args.speed, workers=args.workers)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Reporte guardado en {args.output}")
@@ -0,0 +1,309 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional, Tuple
+
+FORMATS = ("collapsed", "speedscope")
+
+# Intervalo de muestreo permitido: por debajo de 1 ms el muestreador es un bucle ocupado
+MIN_INTERVAL_MS = 1.0
+MAX_INTERVAL_MS = 1000.0
+
+# Perfilado de la petición que corre en este hilo: `sampler` (muestreo de pila) y `active`
+# (torch.profiler activo, para etiquetar las etapas)
+_torch_scope = threading.local()
+
+# torch.profiler es global al proceso: una sola sesión a la vez, el resto solo muestrea pilas
+_torch_session = threading.Lock()
+
+Frame = Tuple[str, str, int]
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, interval_s: float = 0.005):
+        """Muestreo periódico de la pila de un hilo (sin instrumentar cada llamada)
+
+        Los workers de las etapas se agregan con `attach` mientras ejecutan trabajo de la
+        petición; sus pilas quedan bajo un marco raíz con el nombre del hilo.
+        """
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks: Dict[Tuple[Frame, ...], int] = {}
+        self.samples = 0
+        self._workers: Dict[int, str] = {}
+        self._workers_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def attach(self, thread_id: int, name: str):
+        with self._workers_lock:
+            self._workers[thread_id] = name
+
+    def detach(self, thread_id: int):
+        with self._workers_lock:
+            self._workers.pop(thread_id, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frames = sys._current_frames()
+            with self._workers_lock:
+                targets = [(self.thread_id, None)] + list(self._workers.items())
+            for thread_id, name in targets:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, frame.f_lineno))
+                    frame = frame.f_back
+                if name is not None:
+                    stack.append((f"[{name}]", "", 0))
+                # De la raíz a la hoja, como esperan los flamegraphs
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """Formato de pilas colapsadas (flamegraph.pl, speedscope, inferno)"""
+        lines = []
+        for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+            frames = ";".join(f"{name} ({os.path.basename(filename)}:{line})" if filename else name
+                              for name, filename, line in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """Perfil muestreado en el formato JSON de speedscope"""
+        frame_index: Dict[Tuple[str, str], int] = {}
+        frames, samples, weights = [], [], []
+        for stack, count in self.stacks.items():
+            sample = []
+            for function, filename, line in stack:
+                key = (function, filename)
+                if key not in frame_index:
+                    frame_index[key] = len(frames)
+                    frames.append({"name": function, "file": filename, "line": line})
+                sample.append(frame_index[key])
+            samples.append(sample)
+            weights.append(count * self.interval_s * 1000.0)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            }],
+            "name": name,
+            "exporter": "codehelper-request-profiler"
+        }
+
+
+def check_interval_ms(value) -> float:
+    """Intervalo de muestreo validado (ValueError si no es un número entre 1 y 1000 ms)"""
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        interval_ms = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("interval_ms debe ser numérico")
+    if not MIN_INTERVAL_MS <= interval_ms <= MAX_INTERVAL_MS:
+        raise ValueError(f"interval_ms debe estar entre {MIN_INTERVAL_MS:g} y {MAX_INTERVAL_MS:g}")
+    return interval_ms
+
+
+def stage_scope(stage: str):
+    """Etiquetar una etapa en el perfil de torch si el hilo actual se está perfilando"""
+    if not getattr(_torch_scope, "active", False):
+        return nullcontext()
+    from torch.profiler import record_function
+    return record_function(f"stage::{stage}")
+
+
+def carry_scope(fn: Callable) -> Callable:
+    """Envolver `fn` para que el hilo que la ejecute (un worker de etapa) herede el perfilado
+    de la petición actual: se muestrea su pila y se etiquetan sus etapas en torch"""
+    sampler = getattr(_torch_scope, "sampler", None)
+    active = getattr(_torch_scope, "active", False)
+    if sampler is None and not active:
+        return fn
+
+    def scoped(*args, **kwargs):
+        previous = (getattr(_torch_scope, "sampler", None), getattr(_torch_scope, "active", False))
+        _torch_scope.sampler, _torch_scope.active = sampler, active
+        thread = threading.current_thread()
+        if sampler is not None:
+            sampler.attach(thread.ident, thread.name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if sampler is not None:
+                sampler.detach(thread.ident)
+            _torch_scope.sampler, _torch_scope.active = previous
+
+    return scoped
+
+
+class RequestProfiler:
+    def __init__(self, output_dir: str = None, sample_every: int = None, interval_ms: float = None,
+                 torch_ops: bool = None, output_format: str = None):
+        """Perfilado opcional de peticiones: 1 de cada N, o todas durante una ventana de tiempo"""
+        self.output_dir = output_dir or os.environ.get("CODEHELPER_PROFILE_DIR", "./profiles")
+        self.sample_every = sample_every if sample_every is not None else int(os.environ.get("CODEHELPER_PROFILE_EVERY", 0))
+        self.interval_ms = check_interval_ms(interval_ms or os.environ.get("CODEHELPER_PROFILE_INTERVAL_MS", 5))
+        self.torch_ops = torch_ops if torch_ops is not None else os.environ.get("CODEHELPER_PROFILE_TORCH") == "1"
+        self.output_format = output_format or os.environ.get("CODEHELPER_PROFILE_FORMAT", "collapsed")
+        if self.output_format not in FORMATS:
+            raise ValueError(f"Formato de perfil no soportado: {self.output_format} (usa uno de {FORMATS})")
+
+        self.window_until: Optional[float] = None
+        self.requests_seen = 0
+        self.profiles_written = 0
+        self.last_profile: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def configure(self, sample_every: int = None, window_s: float = None, interval_ms: float = None,
+                  torch_ops: bool = None, output_format: str = None):
+        """Cambiar la configuración en caliente (endpoint de administración)"""
+        if output_format is not None and output_format not in FORMATS:
+            raise ValueError(f"Formato de perfil no soportado: {output_format} (usa uno de {FORMATS})")
+        if interval_ms is not None:
+            interval_ms = check_interval_ms(interval_ms)
+        if torch_ops is not None and not isinstance(torch_ops, bool):
+            raise ValueError("torch_ops debe ser true o false")
+        with self._lock:
+            if sample_every is not None:
+                self.sample_every = max(0, int(sample_every))
+            if window_s is not None:
+                self.window_until = time.time() + float(window_s) if window_s > 0 else None
+            if interval_ms is not None:
+                self.interval_ms = interval_ms
+            if torch_ops is not None:
+                self.torch_ops = torch_ops
+            if output_format is not None:
+                self.output_format = output_format
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_every > 0 or self.window_active
+
+    @property
+    def window_active(self) -> bool:
+        return self.window_until is not None and time.time() < self.window_until
+
+    def should_profile(self) -> bool:
+        """Decidir si la petición actual se perfila"""
+        with self._lock:
+            self.requests_seen += 1
+            if self.window_active:
+                return True
+            return self.sample_every > 0 and self.requests_seen % self.sample_every == 0
+
+    @contextmanager
+    def profile(self, label: str):
+        """Perfilar el bloque si la petición fue seleccionada; entrega la ruta del perfil o None"""
+        if not self.should_profile():
+            yield None
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{label}")
+        result: Dict[str, Optional[str]] = {"path": None}
+
+        # torch primero: si falla, todavía no hay hilo de muestreo que quede colgado
+        torch_profiler = self._start_torch_profiler()
+        sampler = SamplingProfiler(threading.get_ident(), self.interval_ms / 1000.0).start()
+        _torch_scope.sampler = sampler
+        start = time.perf_counter()
+        try:
+            yield result
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            _torch_scope.sampler = None
+            sampler.stop()
+            if torch_profiler is not None:
+                _torch_scope.active = False
+                try:
+                    torch_profiler.__exit__(None, None, None)
+                    self._write_torch_ops(torch_profiler, base + ".torch_ops.json")
+                finally:
+                    _torch_session.release()
+
+            if self.output_format == "speedscope":
+                path = base + ".speedscope.json"
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(sampler.speedscope(f"{label} ({elapsed_ms:.0f} ms)"), f)
+            else:
+                path = base + ".collapsed"
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(sampler.collapsed())
+
+            result["path"] = path
+            with self._lock:
+                self.profiles_written += 1
+                self.last_profile = path
+
+    def _start_torch_profiler(self):
+        """Sesión de torch.profiler o None (desactivado, otra petición ya la tiene o no arrancó)
+
+        La traza es de todo el proceso: incluye los operadores de las peticiones concurrentes.
+        """
+        if not self.torch_ops or not _torch_session.acquire(blocking=False):
+            return None
+        try:
+            from torch.profiler import profile, ProfilerActivity
+            torch_profiler = profile(activities=[ProfilerActivity.CPU])
+            torch_profiler.__enter__()
+        except Exception:
+            # Sin torch o con un profiler de torch ya activo: solo muestreo de pila
+            _torch_session.release()
+            return None
+        _torch_scope.active = True
+        return torch_profiler
+
+    def _write_torch_ops(self, torch_profiler, path: str):
+        """Tiempos por operador de torch (las etapas aparecen como stage::<nombre>)"""
+        ops = [
+            {
+                "name": event.key,
+                "calls": event.count,
+                "cpu_time_total_ms": event.cpu_time_total / 1000.0,
+                "self_cpu_time_total_ms": event.self_cpu_time_total / 1000.0
+            }
+            for event in torch_profiler.key_averages()
+        ]
+        ops.sort(key=lambda op: op["self_cpu_time_total_ms"], reverse=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(ops, f, indent=2)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_every": self.sample_every,
+            "window_remaining_s": max(0.0, self.window_until - time.time()) if self.window_active else 0.0,
+            "interval_ms": self.interval_ms,
+            "torch_ops": self.torch_ops,
+            "format": self.output_format,
+            "output_dir": self.output_dir,
+            "requests_seen": self.requests_seen,
+            "profiles_written": self.profiles_written,
+            "last_profile": self.last_profile
+        }
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple
+import numpy as np
+from evaluation_metrics import RAGEvaluator
+from golden_set import DEFAULT_GOLDEN_SET, iter_golden_set, matched_labels
+from index_manager import IndexHandle
+
+# Valor por defecto de ef en el índice HNSW de ChromaDB
+DEFAULT_SEARCH_EF = 10
+
+
+def get_search_ef(collection) -> int:
+    """ef de búsqueda actual de la colección (API de configuración o metadatos hnsw:*)"""
+    configuration = getattr(collection, 'configuration', None)
+    if isinstance(configuration, dict) and configuration.get('hnsw', {}).get('ef_search'):
+        return int(configuration['hnsw']['ef_search'])
+    return int((collection.metadata or {}).get('hnsw:search_ef', DEFAULT_SEARCH_EF))
+
+
+def set_search_ef(collection, ef: int):
+    """Cambiar el ef de búsqueda HNSW (según la versión de ChromaDB instalada)"""
+    try:
+        collection.modify(configuration={'hnsw': {'ef_search': ef}})
+    except Exception:
+        metadata = dict(collection.metadata or {})
+        metadata['hnsw:search_ef'] = ef
+        collection.modify(metadata=metadata)
+
+
+def timed(fn: Callable, repeats: int) -> Tuple[Any, float]:
+    """Resultado de fn y la mediana de `repeats` ejecuciones en ms (una sola muestra es ruido)"""
+    samples = []
+    for _ in range(max(1, repeats)):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return result, float(np.median(samples))
+
+
+class RetrievalSweep:
+    def __init__(self, chatbot, evaluator: RAGEvaluator = None, repeats: int = 5):
+        """Barrido de parámetros de recuperación con cachés entre puntos de la grilla
+        
+        Cada medición de tiempo (embedding, búsqueda, re-ranking) es la mediana de `repeats`
+        ejecuciones; se repite solo al llenar la caché, no en cada punto de la grilla.
+        """
+        self.chatbot = chatbot
+        self.evaluator = evaluator or RAGEvaluator()
+        self.repeats = repeats
+        self.index = chatbot.index_manager.get()
+
+        # Cachés: embedding por consulta, candidatos por (consulta, ef, pool),
+        # scores del cross-encoder por (consulta, chunk) y tiempo de re-ranking por pool exacto
+        self._embeddings: Dict[int, Tuple[np.ndarray, float]] = {}
+        self._candidates: Dict[Tuple[int, Optional[int], int], Tuple[Dict[str, List[Any]], float]] = {}
+        self._scores: Dict[Tuple[int, str], float] = {}
+        self._rerank_ms: Dict[Tuple[int, Tuple[str, ...]], float] = {}
+        self._relevant: Dict[int, set] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def embed(self, query_index: int, query: str) -> Tuple[np.ndarray, float]:
+        if query_index not in self._embeddings:
+            self._embeddings[query_index] = timed(lambda: self.chatbot.embedding_model.encode(query), self.repeats)
+        return self._embeddings[query_index]
+
+    def candidates(self, query_index: int, query: str, ef: Optional[int],
+                   pool_size: int) -> Tuple[Dict[str, List[Any]], float]:
+        key = (query_index, ef, pool_size)
+        if key not in self._candidates:
+            embedding, _ = self.embed(query_index, query)
+            self._candidates[key] = timed(
+                lambda: self.chatbot.dense_candidates(embedding, pool_size, index=self.index), self.repeats
+            )
+        return self._candidates[key]
+
+    def rerank(self, query_index: int, query: str,
+               candidates: Dict[str, List[Any]]) -> Tuple[List[Tuple[str, float]], float]:
+        """Scores del cross-encoder para el pool; el tiempo se mide una vez por pool exacto"""
+        ids = tuple(candidates['ids'])
+        time_key = (query_index, ids)
+        if time_key in self._rerank_ms:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            pairs = [[query, doc] for doc in candidates['documents']]
+            scores, self._rerank_ms[time_key] = timed(
+                lambda: self.chatbot.cross_encoder.predict(pairs) if ids else [], self.repeats
+            )
+            for chunk_id, score in zip(ids, scores):
+                self._scores[(query_index, chunk_id)] = float(score)
+        return [(chunk_id, self._scores[(query_index, chunk_id)]) for chunk_id in ids], self._rerank_ms[time_key]
+
+    def mark_relevant(self, query_index: int, query_data: Dict[str, Any], candidates: Dict[str, List[Any]]):
+        """Acumular los chunks relevantes vistos (ideal del NDCG con etiquetas por tema)"""
+        relevant = self._relevant.setdefault(query_index, set())
+        for chunk_id, content, metadata in zip(candidates['ids'], candidates['documents'],
+                                               candidates['metadatas']):
+            relevant.update(matched_labels(query_data, chunk_id, content, metadata))
+
+    def evaluate_point(self, queries: List[Dict[str, Any]], pool_size: int, threshold: float,
+                       top_k: int, ef: Optional[int]) -> Dict[str, Any]:
+        ndcg_scores, recall_scores, precision_scores, latencies = [], [], [], []
+        for query_index, query_data in enumerate(queries):
+            query = query_data['query']
+            _, embed_ms = self.embed(query_index, query)
+            candidates, search_ms = self.candidates(query_index, query, ef, pool_size)
+            scored, rerank_ms = self.rerank(query_index, query, candidates)
+
+            # Misma selección que RAGChatbot.rerank_candidates: top-k y luego umbral
+            scored.sort(key=lambda item: item[1], reverse=True)
+            by_id = dict(zip(candidates['ids'], zip(candidates['documents'], candidates['metadatas'])))
+            retrieved = [
+                {'id': chunk_id, 'content': by_id[chunk_id][0], 'metadata': by_id[chunk_id][1]}
+                for chunk_id, score in scored[:top_k] if score > threshold
+            ]
+
+            # Con ids etiquetados el ideal es el golden set; con temas, lo relevante ya visto
+            scores = self.evaluator.score_ranking(
+                query_data, retrieved, k=top_k, known_relevant=len(self._relevant.get(query_index, ()))
+            )
+            ndcg_scores.append(scores['ndcg'])
+            recall_scores.append(scores['recall'])
+            precision_scores.append(scores['precision'])
+            latencies.append(embed_ms + search_ms + rerank_ms)
+
+        return {
+            'pool_size': pool_size,
+            'threshold': threshold,
+            'top_k': top_k,
+            'search_ef': ef,
+            'ndcg': float(np.mean(ndcg_scores)),
+            'recall': float(np.mean(recall_scores)),
+            'precision': float(np.mean(precision_scores)),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95))
+        }
+
+    def run(self, queries: List[Dict[str, Any]], pool_sizes: Sequence[int], thresholds: Sequence[float],
+            top_ks: Sequence[int], search_efs: Sequence[Optional[int]] = (None,)) -> List[Dict[str, Any]]:
+        """Evaluar toda la grilla; ef es el bucle externo porque cambia el índice
+        
+        Con valores de ef se barre una copia temporal del índice abierta con otro cliente: el
+        índice que sirve el servidor nunca se modifica, ni siquiera si el barrido se interrumpe.
+        """
+        if self.index.compact_store is not None:
+            # La búsqueda compacta no usa HNSW: ef no tiene efecto
+            search_efs = (None,)
+
+        copy_dir = None
+        if any(ef is not None for ef in search_efs):
+            manager = self.chatbot.index_manager
+            copy_dir = tempfile.mkdtemp(prefix="retrieval_sweep_")
+            shutil.copytree(manager.db_path, copy_dir, dirs_exist_ok=True)
+            collection = manager.open_client(copy_dir).get_collection(self.index.name)
+            self.index = IndexHandle(self.index.name, collection, None, 0)
+            original_ef = get_search_ef(collection)
+        else:
+            original_ef = None
+
+        # Primera pasada (etiquetas por tema): chunks relevantes entre los candidatos del pool más grande
+        for query_index, query_data in enumerate(queries):
+            if 'relevant_ids' in query_data:
+                continue
+            candidates, _ = self.candidates(query_index, query_data['query'], None, max(pool_sizes))
+            self.mark_relevant(query_index, query_data, candidates)
+
+        points = []
+        try:
+            for ef in search_efs:
+                if original_ef is not None:
+                    set_search_ef(collection, ef if ef is not None else original_ef)
+                for pool_size in pool_sizes:
+                    for top_k in top_ks:
+                        if top_k > pool_size:
+                            continue
+                        for threshold in thresholds:
+                            points.append(self.evaluate_point(queries, pool_size, threshold, top_k, ef))
+        finally:
+            if copy_dir is not None:
+                self.index = self.chatbot.index_manager.get()
+                shutil.rmtree(copy_dir, ignore_errors=True)
+        return points
+
+
+def pareto_frontier(points: List[Dict[str, Any]], quality: str = 'ndcg',
+                    latency: str = 'p95_ms') -> List[Dict[str, Any]]:
+    """Puntos no dominados: ningún otro tiene más calidad con igual o menor latencia"""
+    frontier = []
+    best_quality = -1.0
+    for point in sorted(points, key=lambda p: (p[latency], -p[quality])):
+        if point[quality] > best_quality:
+            frontier.append(point)
+            best_quality = point[quality]
+    return frontier
+
+
+def choose_for_sla(frontier: List[Dict[str, Any]], sla_ms: float,
+                   latency: str = 'p95_ms') -> Optional[Dict[str, Any]]:
+    """Mejor punto de la frontera que cumple el SLA de latencia"""
+    within = [point for point in frontier if point[latency] <= sla_ms]
+    return within[-1] if within else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Barrido de parámetros de recuperación (NDCG@k vs p95)")
+    parser.add_argument("--queries", type=str, default=None,
+                        help="Golden set JSONL o JSON con consultas etiquetadas "
+                             "(por defecto golden_set.jsonl o el dataset de RAGEvaluator)")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[5, 9, 15, 25, 40])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.0, 0.3, 0.5])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=None,
+                        help="Valores de ef de HNSW a probar (sobre una copia temporal del índice)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Repeticiones por medición de tiempo (se usa la mediana)")
+    parser.add_argument("--sla-ms", type=float, default=None)
+    parser.add_argument("--output", type=str, default="retrieval_sweep_results.json")
+    args = parser.parse_args()
+
+    from rag_chatbot import RAGChatbot
+
+    chatbot = RAGChatbot()
+    evaluator = RAGEvaluator()
+    queries_path = args.queries or (DEFAULT_GOLDEN_SET if os.path.exists(DEFAULT_GOLDEN_SET) else None)
+    if queries_path and queries_path.endswith(".jsonl"):
+        queries = list(iter_golden_set(queries_path))
+    elif queries_path:
+        with open(queries_path, "r", encoding="utf-8") as f:
+            queries = json.load(f)
+    else:
+        queries = evaluator.create_test_dataset()
+
+    sweep = RetrievalSweep(chatbot, evaluator, repeats=args.repeats)
+    points = sweep.run(queries, args.pool_sizes, args.thresholds, args.top_k, args.search_ef or [None])
+    frontier = pareto_frontier(points)
+
+    print(f"🔬 {len(points)} configuraciones evaluadas sobre {len(queries)} consultas "
+          f"(re-rankings cacheados: {sweep.cache_hits}, calculados: {sweep.cache_misses})")
+    print("📈 Frontera de Pareto (NDCG@k vs latencia p95):")
+    for point in frontier:
+        print(f"   - pool={point['pool_size']:>3} top_k={point['top_k']} umbral={point['threshold']:.2f} "
+              f"ef={point['search_ef'] or '-'}: NDCG {point['ndcg']:.3f}, recall {point['recall']:.3f}, "
+              f"p95 {point['p95_ms']:.1f} ms")
+
+    chosen = None
+    if args.sla_ms is not None:
+        chosen = choose_for_sla(frontier, args.sla_ms)
+        if chosen:
+            print(f"🎯 Para p95 <= {args.sla_ms:.0f} ms: pool={chosen['pool_size']}, top_k={chosen['top_k']}, "
+                  f"umbral={chosen['threshold']}, ef={chosen['search_ef'] or '-'}")
+        else:
+            print(f"⚠️  Ninguna configuración cumple p95 <= {args.sla_ms:.0f} ms")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({'points': points, 'frontier': frontier, 'sla_choice': chosen}, f, indent=2)
+    print(f"✅ Resultados guardados en '{args.output}'")
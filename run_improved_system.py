@@ -15,11 +15,13 @@ def check_dependencies():
         'chromadb', 
         'transformers',
         'torch',
-        'langchain',
         'numpy',
         'sklearn'
     ]
     
+    # LangChain ya no es necesario para el pipeline; solo para quien use cadenas propias
+    optional_packages = ['langchain']
+    
     missing_packages = []
     for package in required_packages:
         try:
@@ -35,12 +37,22 @@ def check_dependencies():
         print("   pip install -r requirements.txt")
         return False
     
+    for package in optional_packages:
+        try:
+            __import__(package)
+        except ImportError:
+            print(f"ℹ️  Dependencia opcional no instalada: {package}")
+    
     print("✅ Todas las dependencias están instaladas")
     return True
 
-def check_data_files():
+def check_data_files(data_source: str = "./data"):
     """Verificar que existan archivos de datos"""
-    data_dir = Path("./data")
+    data_dir = Path(data_source)
+    if data_dir.is_file():
+        # Archivo comprimido (.zip, .tar.gz, .tar.zst): se lee sin extraer
+        print(f"✅ Usando el archivo de datos {data_dir}")
+        return True
     if not data_dir.exists():
         print("❌ No se encontró el directorio 'data/'")
         return False
@@ -53,15 +65,26 @@ def check_data_files():
     print(f"✅ Encontrados {len(txt_files)} archivos de datos")
     return True
 
-def build_vector_database():
+def build_vector_database(versioned: bool = False, data_source: str = "./data"):
     """Construir la base de datos vectorial mejorada"""
     print("\n🔨 Construyendo base de datos vectorial mejorada...")
     
     try:
-        from improved_vector_db import ImprovedVectorDBGenerator
-        
-        generator = ImprovedVectorDBGenerator()
-        generator.generate_vector_db()
+        from improved_vector_db import ImprovedVectorDBGenerator, build_index_version
+        
+        if versioned:
+            # Build blue/green: el servidor en ejecución cambia con /admin/swap-index
+            build_index_version(data_dir=data_source)
+        else:
+            generator = ImprovedVectorDBGenerator()
+            generator.generate_vector_db(data_source)
+            
+            # Respuestas precalculadas cuyos chunks cambiaron con la reconstrucción
+            from answer_store import AnswerStore
+            answer_store = AnswerStore.from_env()
+            if answer_store is not None:
+                removed = answer_store.purge_stale(generator.client.get_collection)
+                print(f"🧹 {removed} respuestas precalculadas desactualizadas borradas")
         
         print("✅ Base de datos vectorial construida exitosamente")
         return True
@@ -126,6 +149,10 @@ def main():
     parser.add_argument("--query", type=str, help="Consulta para modo test")
     parser.add_argument("--skip-checks", action="store_true", 
                        help="Saltar verificaciones iniciales")
+    parser.add_argument("--versioned", action="store_true",
+                       help="Construir en vector_db/versions/ y publicar en vector_db/CURRENT")
+    parser.add_argument("--data", type=str, default="./data",
+                       help="Directorio o archivo .zip / .tar.gz / .tar.zst con el corpus")
     
     args = parser.parse_args()
     
@@ -137,12 +164,12 @@ def main():
         if not check_dependencies():
             sys.exit(1)
         
-        if not check_data_files():
+        if not check_data_files(args.data):
             sys.exit(1)
     
     # Ejecutar según el modo
     if args.mode == "build":
-        if not build_vector_database():
+        if not build_vector_database(versioned=args.versioned, data_source=args.data):
             sys.exit(1)
         print("\n✅ Sistema listo para usar")
         
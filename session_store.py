@@ -0,0 +1,142 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+# Expresiones típicas de preguntas de seguimiento ("¿y cómo lo uso con async?")
+FOLLOW_UP_CUES = [
+    'y ', 'también', 'entonces', 'además', 'eso', 'esto', 'lo ', 'y si',
+    'otro ejemplo', 'más ejemplos', 'cómo lo', 'cómo la', 'con eso', 'en ese caso'
+]
+
+
+class SessionTurn:
+    def __init__(self, question: str, query_embedding: np.ndarray, chunk_ids: List[str]):
+        """Turno de conversación con su embedding y los chunks recuperados"""
+        self.question = question
+        self.query_embedding = query_embedding
+        self.chunk_ids = chunk_ids
+        self.timestamp = time.time()
+
+
+class ChatSession:
+    def __init__(self, session_id: str, max_turns: int = 5, max_pool: int = 30):
+        """Historial reciente y pool de candidatos reutilizable de una sesión"""
+        self.session_id = session_id
+        self.turns: deque = deque(maxlen=max_turns)
+        self.max_pool = max_pool
+        self.collection: Optional[str] = None
+        # id -> (documento, metadatos, score denso); el más reciente al final
+        self.candidate_pool: "OrderedDict[str, tuple]" = OrderedDict()
+        self.last_active = time.time()
+        # Serializa los turnos de la sesión (lectura del último turno -> add_turn)
+        self.lock = threading.Lock()
+
+    @property
+    def last_turn(self) -> Optional[SessionTurn]:
+        return self.turns[-1] if self.turns else None
+
+    def is_follow_up(self, question: str, query_embedding: np.ndarray, collection: str,
+                     min_similarity: float = 0.5) -> bool:
+        """Decidir si la pregunta continúa el tema del turno anterior"""
+        last = self.last_turn
+        if last is None or collection != self.collection or not self.candidate_pool:
+            return False
+
+        question_lower = question.lower().strip('¿? ')
+        if any(question_lower.startswith(cue) for cue in FOLLOW_UP_CUES):
+            return True
+
+        similarity = float(np.dot(query_embedding, last.query_embedding) / (
+            np.linalg.norm(query_embedding) * np.linalg.norm(last.query_embedding) + 1e-12
+        ))
+        return similarity >= min_similarity
+
+    def cached_candidates(self, ids: List[str] = None) -> Dict[str, List[Any]]:
+        """Pool de candidatos de turnos anteriores, del más reciente al más antiguo
+        
+        Con `ids` solo se devuelven esos chunks (p. ej. los mejores del turno anterior), en ese orden.
+        """
+        if ids is not None:
+            items = [(chunk_id, self.candidate_pool[chunk_id]) for chunk_id in ids if chunk_id in self.candidate_pool]
+        else:
+            items = list(reversed(self.candidate_pool.items()))
+        return {
+            'ids': [chunk_id for chunk_id, _ in items],
+            'documents': [entry[0] for _, entry in items],
+            'metadatas': [entry[1] for _, entry in items],
+            'scores': [entry[2] for _, entry in items]
+        }
+
+    def add_turn(self, question: str, query_embedding: np.ndarray, chunk_ids: List[str],
+                 candidates: Dict[str, List[Any]], collection: str):
+        """Registrar un turno y refrescar el pool de candidatos acotado"""
+        if collection != self.collection:
+            self.candidate_pool.clear()
+            self.collection = collection
+
+        self.turns.append(SessionTurn(question, query_embedding, chunk_ids))
+
+        # Insertar primero los menos relevantes para que los recuperados queden al final
+        for chunk_id, doc, metadata, score in reversed(list(zip(
+            candidates['ids'], candidates['documents'], candidates['metadatas'], candidates['scores']
+        ))):
+            self.candidate_pool.pop(chunk_id, None)
+            self.candidate_pool[chunk_id] = (doc, metadata, score)
+        for chunk_id in reversed(chunk_ids):
+            if chunk_id in self.candidate_pool:
+                self.candidate_pool.move_to_end(chunk_id)
+
+        while len(self.candidate_pool) > self.max_pool:
+            self.candidate_pool.popitem(last=False)
+
+        self.last_active = time.time()
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = None, idle_ttl_s: float = None,
+                 max_turns: int = 5, max_pool: int = 30):
+        """Sesiones de chat en memoria con tamaño acotado y expiración por inactividad"""
+        self.max_sessions = max_sessions or int(os.environ.get("CHAT_MAX_SESSIONS", 1000))
+        self.idle_ttl_s = idle_ttl_s or float(os.environ.get("CHAT_SESSION_TTL_S", 1800))
+        self.max_turns = max_turns
+        self.max_pool = max_pool
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def expire_idle(self):
+        """Eliminar sesiones inactivas (las más antiguas están al principio)"""
+        now = time.time()
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_active < self.idle_ttl_s:
+                break
+            del self._sessions[session.session_id]
+
+    def get_or_create(self, session_id: str = None) -> ChatSession:
+        """Obtener una sesión activa o crear una nueva"""
+        with self._lock:
+            self.expire_idle()
+
+            session_id = session_id or uuid.uuid4().hex
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ChatSession(session_id, max_turns=self.max_turns, max_pool=self.max_pool)
+                self._sessions[session_id] = session
+                # Desalojar la sesión menos reciente si se supera el límite
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+            session.last_active = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,150 @@
+import os
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Optional
+
+# Muestras recientes de tiempos por etapa para los percentiles
+STATS_WINDOW = 1000
+
+
+class StageExecutor:
+    def __init__(self, stage: str, workers: int = 1, initializer: Callable = None,
+                 initargs: tuple = (), max_queue: int = 0):
+        """Cola y workers de una etapa del pipeline
+
+        Cada etapa atiende su propia cola, así que peticiones distintas pueden estar en
+        etapas distintas a la vez (una en embedding, otra en re-ranking, otra traduciendo).
+        Se mide el tiempo en cola y el tiempo de servicio por separado.
+        """
+        self.stage = stage
+        self.workers = workers
+        self.queue: "queue.Queue" = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._wait_s = deque(maxlen=STATS_WINDOW)
+        self._service_s = deque(maxlen=STATS_WINDOW)
+        self.in_service = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_s = 0.0
+        self.started_at = time.perf_counter()
+
+        self._threads = [
+            threading.Thread(target=self._worker, args=(initializer, initargs),
+                             name=f"{stage}-worker_{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        self.queue.put((future, fn, args, kwargs, time.perf_counter()))
+        return future
+
+    def _worker(self, initializer: Optional[Callable], initargs: tuple):
+        if initializer is not None:
+            initializer(*initargs)
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            future, fn, args, kwargs, enqueued = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started = time.perf_counter()
+            with self._lock:
+                self.in_service += 1
+            ok = True
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                ok = False
+                future.set_exception(e)
+            finally:
+                service = time.perf_counter() - started
+                with self._lock:
+                    self.in_service -= 1
+                    self.completed += ok
+                    self.failed += not ok
+                    self.busy_s += service
+                    self._wait_s.append(started - enqueued)
+                    self._service_s.append(service)
+
+    def reset_stats(self):
+        with self._lock:
+            self._wait_s.clear()
+            self._service_s.clear()
+            self.completed = 0
+            self.failed = 0
+            self.busy_s = 0.0
+            self.started_at = time.perf_counter()
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidad de cola, tiempos y capacidad estimada (workers / servicio medio)"""
+        with self._lock:
+            waits = sorted(self._wait_s)
+            services = sorted(self._service_s)
+            busy_s, completed, failed, in_service = self.busy_s, self.completed, self.failed, self.in_service
+        elapsed = time.perf_counter() - self.started_at
+        mean_service = sum(services) / len(services) if services else 0.0
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "in_service": in_service,
+            "completed": completed,
+            "failed": failed,
+            "wait_ms_mean": 1000.0 * sum(waits) / len(waits) if waits else 0.0,
+            "wait_ms_p95": 1000.0 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            "service_ms_mean": 1000.0 * mean_service,
+            "service_ms_p95": 1000.0 * services[int(0.95 * (len(services) - 1))] if services else 0.0,
+            "utilization": busy_s / (self.workers * elapsed) if elapsed and self.workers else 0.0,
+            "capacity_rps": self.workers / mean_service if mean_service else None
+        }
+
+    def shutdown(self, wait: bool = True):
+        for _ in self._threads:
+            self.queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def bottleneck(stage_stats: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """Etapa con menor capacidad estimada (la que limita el throughput del pipeline)"""
+    measured = {stage: stats["capacity_rps"] for stage, stats in stage_stats.items() if stats["capacity_rps"]}
+    return min(measured, key=measured.get) if measured else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga concurrente con ejecución por etapas y estadísticas por etapa")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=8, help="Peticiones por cliente")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CODEHELPER_STAGED", "1")
+
+    from rag_chatbot import RAGChatbot
+    from warmup import warmup_questions, warm_up
+    from inference_runtime import benchmark_clients
+
+    chatbot = RAGChatbot()
+    warm_up(chatbot, full_queries=1)
+    chatbot.runtime.reset_stage_stats()
+
+    result = benchmark_clients(chatbot.chat_detailed, warmup_questions(), [args.clients], args.requests)[0]
+    print(f"⚡ {result['clients']} clientes: {result['throughput_rps']:.2f} req/s, "
+          f"p50 {result['p50_ms']:.0f} ms, p95 {result['p95_ms']:.0f} ms")
+
+    stage_stats = chatbot.runtime.stage_stats()
+    for stage, stats in stage_stats.items():
+        capacity = f"{stats['capacity_rps']:.1f} llamadas/s" if stats['capacity_rps'] else "-"
+        print(f"   - {stage:<10} workers {stats['workers']}  cola {stats['queue_depth']}  "
+              f"espera {stats['wait_ms_mean']:.1f} ms  servicio {stats['service_ms_mean']:.1f} ms "
+              f"(p95 {stats['service_ms_p95']:.1f})  uso {stats['utilization']:.0%}  capacidad {capacity}")
+    print(f"   Cuello de botella: {bottleneck(stage_stats)}")
+    chatbot.runtime.shutdown()
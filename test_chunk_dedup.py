@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la deduplicación de chunks casi idénticos con MinHash + LSH
+"""
+
+from chunk_dedup import MinHashDeduplicator
+
+LINQ = ("LINQ permite consultar colecciones en C# con una sintaxis integrada en el lenguaje. "
+        "Los operadores Where, Select y OrderBy se encadenan y la consulta se ejecuta de forma diferida "
+        "cuando se enumera el resultado con foreach o se llama a ToList.")
+# Mismo texto con un cambio menor (otra copia del archivo en otra carpeta)
+LINQ_COPY = LINQ.replace("ToList.", "ToList().")
+ASYNC = ("async y await simplifican la programación asíncrona en .NET. Un método async devuelve Task "
+         "o Task<T> y await libera el hilo mientras espera la operación de entrada y salida, por ejemplo "
+         "una consulta a la base de datos con Entity Framework Core.")
+
+
+def document(chunk_id: str, text: str, file: str) -> dict:
+    return {"id": chunk_id, "text": text, "metadata": {"file": file}}
+
+
+def test_near_duplicates_collapse_into_first():
+    """La copia casi idéntica se absorbe en el primer chunk y combina los archivos de origen"""
+    documents = [
+        document("linq.txt_0", LINQ, "linq.txt"),
+        document("async.txt_0", ASYNC, "async.txt"),
+        document("copia/linq.txt_0", LINQ_COPY, "copia/linq.txt"),
+    ]
+    kept, report = MinHashDeduplicator().deduplicate(documents)
+
+    assert [doc["id"] for doc in kept] == ["linq.txt_0", "async.txt_0"]
+    assert kept[0]["metadata"]["source_files"] == "copia/linq.txt|linq.txt"
+    assert kept[0]["metadata"]["duplicate_count"] == 2
+    assert "duplicate_ids" not in kept[1]["metadata"]
+    assert report["chunks_before"] == 3 and report["chunks_after"] == 2
+    assert report["duplicate_groups"] == 1
+
+
+def test_distinct_chunks_are_kept():
+    """Textos distintos no se consideran duplicados"""
+    deduplicator = MinHashDeduplicator()
+    assert deduplicator.offer(document("linq.txt_0", LINQ, "linq.txt"))
+    assert deduplicator.offer(document("async.txt_0", ASYNC, "async.txt"))
+    assert deduplicator.report()["chunks_removed"] == 0
+
+
+if __name__ == "__main__":
+    test_near_duplicates_collapse_into_first()
+    test_distinct_chunks_are_kept()
+    print("✅ Deduplicación: casi duplicados colapsados, chunks distintos conservados")
@@ -7,6 +7,7 @@ con todos los nuevos temas agregados
 import sys
 import time
 from pathlib import Path
+from domain_questions import TEST_QUESTIONS, SPECIFIC_QUESTIONS
 
 def test_chatbot():
     """Ejecutar pruebas comprehensivas del chatbot"""
@@ -21,52 +22,8 @@ def test_chatbot():
         print("🤖 Inicializando chatbot...")
         chatbot = RAGChatbot()
         
-        # Lista de preguntas de prueba organizadas por categorías
-        test_questions = {
-            "Fundamentos de .NET": [
-                "¿Qué es .NET Core y cuáles son sus características principales?",
-                "¿Cuál es la diferencia entre .NET Framework y .NET Core?",
-                "¿Qué es el Common Language Runtime (CLR)?"
-            ],
-            "ASP.NET Core": [
-                "¿Cómo funciona el middleware en ASP.NET Core?",
-                "¿Qué es la inyección de dependencias en .NET?",
-                "¿Cómo configurar el logging en ASP.NET Core?"
-            ],
-            "Entity Framework": [
-                "¿Qué es Entity Framework Core?",
-                "¿Cómo usar migrations en EF Core?",
-                "¿Cuáles son las mejores prácticas para EF Core?"
-            ],
-            "Patrones y Arquitectura": [
-                "¿Qué es la arquitectura de microservicios?",
-                "¿Cómo implementar el patrón Repository?",
-                "¿Qué son los patrones de diseño más comunes en .NET?"
-            ],
-            "Testing y Calidad": [
-                "¿Cómo escribir unit tests en .NET?",
-                "¿Qué es TDD y cómo aplicarlo?",
-                "¿Cuáles son las mejores prácticas de testing?"
-            ],
-            "DevOps y CI/CD": [
-                "¿Cómo configurar CI/CD para aplicaciones .NET?",
-                "¿Qué herramientas usar para DevOps en .NET?",
-                "¿Cómo hacer deployment de aplicaciones .NET?"
-            ],
-            "Machine Learning": [
-                "¿Cómo usar ML.NET para machine learning?",
-                "¿Qué algoritmos están disponibles en ML.NET?",
-                "¿Cómo integrar modelos de ML en aplicaciones .NET?"
-            ],
-            "Desarrollo Cloud": [
-                "¿Cómo desplegar aplicaciones .NET en Azure?",
-                "¿Qué servicios de Azure son útiles para .NET?",
-                "¿Cómo usar Azure DevOps con .NET?"
-            ]
-        }
-        
         # Ejecutar pruebas por categoría
-        for category, questions in test_questions.items():
+        for category, questions in TEST_QUESTIONS.items():
             print(f"\n📚 {category}")
             print("-" * 30)
             
@@ -101,18 +58,7 @@ def test_specific_topics():
         from rag_chatbot import RAGChatbot
         chatbot = RAGChatbot()
         
-        specific_questions = [
-            "¿Qué es la serialización JSON en .NET y cómo usarla?",
-            "¿Cómo implementar caching en aplicaciones .NET?",
-            "¿Qué es Blazor y cómo funciona?",
-            "¿Cómo usar .NET MAUI para desarrollo multiplataforma?",
-            "¿Qué son los servicios en segundo plano en .NET?",
-            "¿Cómo implementar internacionalización en .NET?",
-            "¿Qué estrategias de migración existen para .NET?",
-            "¿Cómo optimizar el rendimiento de aplicaciones .NET?"
-        ]
-        
-        for i, question in enumerate(specific_questions, 1):
+        for i, question in enumerate(SPECIFIC_QUESTIONS, 1):
             print(f"\n🔍 Pregunta {i}: {question}")
             print("🤖 Respuesta:")
             
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Pruebas del empaquetado de contexto: chunks completos dentro del presupuesto de tokens
+"""
+
+from context_packer import ContextPacker
+from prompt_templates import count_tokens
+
+# Sin tokenizer los tokens se estiman como ~4 caracteres por token
+CHUNKS = [
+    {"id": "linq.txt_0", "score": 0.9, "content": "L" * 400},     # 100 tokens
+    {"id": "async.txt_0", "score": 0.8, "content": "A" * 800},    # 200 tokens
+    {"id": "ef.txt_0", "score": 0.7, "content": "E" * 200},       # 50 tokens
+]
+
+
+def test_pack_keeps_whole_chunks_within_budget():
+    """Se llena el presupuesto por score sin cortar chunks; uno corto puede entrar después"""
+    packed = ContextPacker().pack(CHUNKS, budget_tokens=160)
+    assert packed.chunk_ids == ["linq.txt_0", "ef.txt_0"]
+    assert packed.tokens == 150 and packed.tokens <= packed.budget
+    assert packed.text == "L" * 400 + "\n\n" + "E" * 200
+
+
+def test_precomputed_counts_only_for_same_tokenizer():
+    """El conteo de la ingesta se usa solo si lo hizo el mismo tokenizer"""
+    chunk = {"id": "x", "score": 1.0, "content": "X" * 40,
+             "metadata": {"token_count": 3, "tokenizer": "all-MiniLM-L6-v2"}}
+    assert ContextPacker().chunk_tokens(chunk) == 3
+    assert ContextPacker(tokenizer_name="otro-modelo").chunk_tokens(chunk) == 10
+
+
+def test_oversized_best_chunk_is_trimmed_at_sentence():
+    """Si ni el mejor chunk cabe, se recorta en un límite de oración"""
+    text = "Primera oración corta. " + "Segunda oración mucho más larga " * 10 + "."
+    packed = ContextPacker().pack([{"id": "largo", "score": 1.0, "content": text}], budget_tokens=10)
+    assert packed.text == "Primera oración corta."
+    assert packed.chunk_ids == ["largo"]
+    assert packed.tokens == count_tokens(packed.text) <= 10
+
+
+if __name__ == "__main__":
+    test_pack_keeps_whole_chunks_within_budget()
+    test_precomputed_counts_only_for_same_tokenizer()
+    test_oversized_best_chunk_is_trimmed_at_sentence()
+    print("✅ Empaquetado de contexto: chunks completos dentro del presupuesto")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché de embeddings: solo se recalculan los chunks cuyo texto cambió
+"""
+
+import tempfile
+import numpy as np
+from embedding_cache import EmbeddingCache
+
+DIM = 4
+
+
+class FakeModel:
+    """Modelo de embeddings determinista que cuenta los textos que codifica"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(text), text.count("a"), text.count("e"), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_hit_miss_on_content_change():
+    """Un texto sin cambios es hit; el texto modificado es miss y se recalcula"""
+    with tempfile.TemporaryDirectory() as path:
+        model = FakeModel()
+        cache = EmbeddingCache(path, "fake-model", DIM)
+        first = cache.encode(["LINQ y lambdas", "async y await"], model.encode)
+        assert (cache.hits, cache.misses) == (0, 2)
+
+        # Reabrir (otro build): el chunk sin cambios sale de disco, el editado se recalcula
+        model.encoded.clear()
+        cache = EmbeddingCache(path, "fake-model", DIM)
+        second = cache.encode(["LINQ y lambdas", "async y await en EF Core"], model.encode)
+        assert model.encoded == ["async y await en EF Core"]
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert np.array_equal(second[0], first[0])
+        assert np.array_equal(second[1], FakeModel().encode(["async y await en EF Core"])[0])
+
+
+def test_repeated_text_in_batch_is_encoded_once():
+    """Textos repetidos dentro de un lote llaman al modelo una sola vez"""
+    with tempfile.TemporaryDirectory() as path:
+        model = FakeModel()
+        cache = EmbeddingCache(path, "fake-model", DIM)
+        vectors = cache.encode(["mismo texto", "mismo texto"], model.encode)
+        assert model.encoded == ["mismo texto"]
+        assert len(cache) == 1 and np.array_equal(vectors[0], vectors[1])
+
+
+def test_other_model_dim_is_rejected():
+    """La caché de un modelo no se reutiliza con otra dimensión"""
+    with tempfile.TemporaryDirectory() as path:
+        EmbeddingCache(path, "fake-model", DIM)
+        try:
+            EmbeddingCache(path, "fake-model", DIM * 2)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("se esperaba ValueError")
+
+
+if __name__ == "__main__":
+    test_hit_miss_on_content_change()
+    test_repeated_text_in_batch_is_encoded_once()
+    test_other_model_dim_is_rejected()
+    print("✅ Caché de embeddings: hits en textos sin cambios, misses en los editados")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la ingesta en paralelo: los resultados salen en orden de envío por la cola acotada
+"""
+
+import os
+import time
+from parallel_ingest import iter_chunked_tasks, iter_chunked_files, list_corpus_files
+
+
+def slow_chunks(index: int, delay: float) -> list:
+    """Tarea de chunking simulada (a nivel de módulo para poder enviarla a otro proceso)"""
+    time.sleep(delay)
+    return [{"id": f"doc{index}_0", "text": f"chunk {index}"}]
+
+
+def failing_chunks(index: int) -> list:
+    raise ValueError(f"archivo {index} ilegible")
+
+
+def tasks(count: int):
+    # Las primeras tareas tardan más: terminan después que las siguientes
+    return [(f"doc{i}", slow_chunks, (i, 0.05 * (count - i) / count)) for i in range(count)]
+
+
+def test_parallel_keeps_submission_order():
+    """Con varios procesos y una cola más chica que el total, el orden es el de envío"""
+    names = [name for name, _ in iter_chunked_tasks(tasks(8), workers=3, queue_size=2)]
+    assert names == [f"doc{i}" for i in range(8)]
+
+
+def test_parallel_matches_serial():
+    """La ruta paralela entrega los mismos chunks que la serial"""
+    serial = list(iter_chunked_tasks(tasks(5), workers=1))
+    parallel = list(iter_chunked_tasks(tasks(5), workers=2, queue_size=2))
+    assert parallel == serial
+
+
+def test_worker_error_is_raised_to_consumer():
+    """Un error en un proceso llega al consumidor en vez de cortar la ingesta en silencio"""
+    try:
+        list(iter_chunked_tasks([("doc0", failing_chunks, (0,))], workers=2))
+    except ValueError as e:
+        assert "ilegible" in str(e)
+    else:
+        raise AssertionError("se esperaba ValueError")
+
+
+def test_corpus_files_same_ids_serial_and_parallel():
+    """Sobre el corpus real, los ids de los chunks no dependen de la cantidad de procesos"""
+    paths = list_corpus_files(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))[:4]
+    assert paths
+    serial = [doc["id"] for docs in iter_chunked_files(paths, workers=1) for doc in docs]
+    parallel = [doc["id"] for docs in iter_chunked_files(paths, workers=2, queue_size=2) for doc in docs]
+    assert parallel == serial
+
+
+if __name__ == "__main__":
+    test_parallel_keeps_submission_order()
+    test_parallel_matches_serial()
+    test_worker_error_is_raised_to_consumer()
+    test_corpus_files_same_ids_serial_and_parallel()
+    print("✅ Ingesta en paralelo: orden de envío y mismos ids que la ruta serial")
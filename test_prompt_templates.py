@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los templates de prompts precompilados: deben renderizar igual que str.format
+"""
+
+from prompt_templates import PromptTemplate
+
+# Templates con llaves escapadas (código C#), variables repetidas, formato y conversiones
+TEMPLATES = [
+    "A {context} B {question} C {{lit}}",
+    "{{inicio}} {context}",
+    "Contexto:\n{context}\n\nCódigo:\n```csharp\npublic class A {{ int X {{ get; set; }} }}\n```\nPregunta: {question}",
+    "{context}{question}",
+    "Sin variables {{ni}} una",
+    "{question!r} y {context:>8}|",
+    "{context} otra vez {context}",
+]
+
+
+def test_format_matches_str_format():
+    """El render precompilado coincide con str.format"""
+    values = {"context": "X", "question": "¿Qué es LINQ?"}
+    for template in TEMPLATES:
+        prompt = PromptTemplate(["context", "question"], template)
+        expected = template.format(**values)
+        rendered = prompt.format(**values)
+        assert rendered == expected, f"{template!r}: {rendered!r} != {expected!r}"
+
+
+def test_prefix_is_text_before_first_variable():
+    """El prefijo (usado para el KV cache) es el texto fijo ya sin escapes"""
+    prompt = PromptTemplate(["context"], "Ejemplo {{ }} fijo\n{context} fin")
+    assert prompt.prefix == "Ejemplo { } fijo\n"
+
+
+if __name__ == "__main__":
+    test_format_matches_str_format()
+    test_prefix_is_text_before_first_variable()
+    print("✅ Templates de prompts: render idéntico a str.format")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Pruebas del anonimizado del log de consultas: las preguntas de código no deben alterarse
+"""
+
+import secrets
+from query_log import scrub
+
+# Preguntas reales de .NET: identificadores largos, rutas, versiones y literales numéricos
+CODE_QUESTIONS = [
+    "¿Cómo registro Microsoft.Extensions.DependencyInjection.ServiceCollectionServiceExtensions en .NET 8.0.100?",
+    "Error CS0246 en src/Controllers/WeatherForecastControllerIntegrationTests.cs",
+    "¿Por qué Dictionary<string, List<int>> con 2147483647 elementos lanza OutOfMemoryException?",
+    "long.MaxValue es 9223372036854775807, ¿cómo lo comparo con decimal?",
+    "ConfigureServicesWithDependencyInjectionForAspNetCore2023 no compila",
+    "Utf8JsonReaderAndSystemTextJson2SerializerOptions ignora PropertyNamingPolicy",
+    "DateTime.Parse(\"2024-01-15 10:30:00\") devuelve otra zona horaria",
+    "new[] { 1, 2, 3, 4, 5, 6, 7, 8, 9, 10 }.Where(x => x % 2 == 0)",
+    "TimeSpan.FromTicks(1000000000) en EF Core 7.0.14",
+    "Guid.Parse(\"3f2504e0-4f89-11d3-9a0c-0305e82c3301\") falla",
+]
+
+
+def test_code_questions_unchanged():
+    """Identificadores, rutas, versiones y números del código se conservan"""
+    for question in CODE_QUESTIONS:
+        assert scrub(question) == question, f"{question!r} -> {scrub(question)!r}"
+
+
+def test_secrets_and_contacts_scrubbed():
+    """Claves aleatorias, credenciales, emails y teléfonos se reemplazan"""
+    key = secrets.token_urlsafe(32)
+    assert scrub(f"mi clave {key} no funciona") == "mi clave <key> no funciona"
+    assert scrub(f"hash {secrets.token_hex(32)}") == "hash <key>"
+    assert scrub("password=hunter2 y correo ana@ejemplo.com") == "password=<secret> y correo <email>"
+    assert scrub("llámame al +34 612 345 678 o al (555) 123-4567") == "llámame al <number> o al <number>"
+
+
+if __name__ == "__main__":
+    test_code_questions_unchanged()
+    test_secrets_and_contacts_scrubbed()
+    print("✅ Log de consultas: anonimizado sin alterar preguntas de código")
@@ -0,0 +1,97 @@
+import os
+import time
+from typing import List, Dict, Any, Sequence
+import numpy as np
+from domain_questions import all_questions
+
+# Texto en inglés para ejercitar el traductor (las respuestas en español no lo usan)
+_TRANSLATION_SAMPLE = "Dependency injection lets you register services and resolve them at runtime."
+
+
+def warmup_questions() -> List[str]:
+    """Preguntas representativas de todos los temas del corpus"""
+    return all_questions()
+
+
+def batch_sizes_from_env(default: Sequence[int] = (1, 4, 16)) -> List[int]:
+    value = os.environ.get("CODEHELPER_WARMUP_BATCH_SIZES")
+    if not value:
+        return list(default)
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def preload_index(chatbot, block_rows: int = 65536) -> int:
+    """Cargar el índice en memoria: segmento HNSW de Chroma y páginas del índice compacto"""
+    index = chatbot.index_manager.get()
+
+    # La primera consulta carga el segmento HNSW completo desde disco
+    index.collection.query(query_embeddings=[[0.0] * chatbot.index_manager.embedding_dim], n_results=1)
+
+    touched = 0
+    if index.compact_store is not None:
+        # Recorrer los códigos compactos para que el memmap quede en la caché de páginas
+        codes = index.compact_store.codes
+        for start in range(0, codes.shape[0], block_rows):
+            block = np.asarray(codes[start:start + block_rows])
+            block.view(np.uint8).max()
+            touched += block.nbytes
+    return touched
+
+
+def warm_up(chatbot, questions: List[str] = None, batch_sizes: Sequence[int] = None,
+            full_queries: int = 3) -> Dict[str, Any]:
+    """Pasar consultas representativas por cada etapa antes de aceptar tráfico"""
+    questions = questions or warmup_questions()
+    batch_sizes = batch_sizes or batch_sizes_from_env()
+    start = time.perf_counter()
+    stages: Dict[str, float] = {}
+
+    def timed(stage: str, function, *args, **kwargs):
+        stage_start = time.perf_counter()
+        result = function(*args, **kwargs)
+        stages[stage] = stages.get(stage, 0.0) + (time.perf_counter() - stage_start) * 1000.0
+        return result
+
+    preloaded_bytes = timed('preload_index', preload_index, chatbot)
+    index = chatbot.index_manager.get()
+
+    # Índice léxico de títulos (recorre toda la colección): aquí y no en la primera petición
+    if getattr(chatbot, 'speculative', False):
+        timed('title_index', chatbot.title_index, index)
+
+    for batch_size in batch_sizes:
+        batch = (questions * (batch_size // len(questions) + 1))[:batch_size]
+
+        # Embeddings y búsqueda densa (asigna los buffers de torch para este tamaño de lote)
+        embeddings = timed('embed', chatbot.embedding_model.encode, batch, batch_size=batch_size)
+        timed('search', index.collection.query,
+              query_embeddings=np.asarray(embeddings).tolist(), n_results=9)
+
+        # Cross-encoder con pares (pregunta, chunk) reales del índice
+        candidates = chatbot.dense_candidates(embeddings[0], batch_size, index=index)
+        pairs = [[batch[0], document] for document in candidates['documents']]
+        if pairs:
+            timed('rerank', chatbot.cross_encoder.predict, pairs, batch_size=len(pairs))
+
+        timed('translate', chatbot.translator, [_TRANSLATION_SAMPLE] * batch_size, batch_size=batch_size)
+
+    if chatbot.generator is not None:
+        timed('generate', chatbot.generator.generate, questions[0])
+
+    # Peticiones completas: calibran además los costos del presupuesto de latencia
+    full_ms = []
+    for question in questions[:full_queries]:
+        full_ms.append(timed('full_queries', chatbot.chat_detailed, question)['total_ms'])
+
+    # Las consultas de warm-up no cuentan en las métricas del router
+    if getattr(chatbot, 'router', None) is not None:
+        chatbot.router.reset_stats()
+
+    return {
+        'warmup_ms': (time.perf_counter() - start) * 1000.0,
+        'batch_sizes': list(batch_sizes),
+        'questions': len(questions),
+        'preloaded_bytes': preloaded_bytes,
+        'stages_ms': stages,
+        'full_query_ms': full_ms
+    }
@@ -0,0 +1,63 @@
+import gzip
+import json
+from typing import Any, Tuple
+
+# Dependencias opcionales: sin ellas se responde JSON compacto y gzip
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Respuestas más chicas que esto no compensan el costo de comprimir
+MIN_COMPRESS_BYTES = 1024
+
+
+def wants_msgpack(accept: str) -> bool:
+    return msgpack is not None and any(mimetype in (accept or "") for mimetype in MSGPACK_MIMETYPES)
+
+
+def encode_payload(payload: Any, accept: str = "") -> Tuple[bytes, str]:
+    """Serializar según el header Accept: MessagePack si se pide y está instalado, si no JSON compacto"""
+    if wants_msgpack(accept):
+        return msgpack.packb(payload, use_bin_type=True, default=_to_builtin), MSGPACK_MIMETYPES[0]
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_to_builtin)
+    return body.encode("utf-8"), JSON_MIMETYPE
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Mejor codificación aceptada por el cliente: br > gzip > identity"""
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in (accept_encoding or "").split(",")
+        if part.strip() and not part.strip().endswith("q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def _to_builtin(value: Any) -> Any:
+    # Arrays y escalares de numpy (scores del cross-encoder, similitudes)
+    if getattr(value, "ndim", 0) and hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")